@@ -4,6 +4,7 @@ from datetime import datetime
 import keyword
 import os
 import re
+from core.line_index import LineStartIndex
 
 LANG = {
     'en': {
@@ -327,17 +328,16 @@ class MiniBlocNotes:
         }
         self.text.insert(tk.INSERT, snippets.get(nom, ""))
     def coloration_html_css(self, event=None):
-        self.text.tag_remove("htmltag", "1.0", tk.END)
-        for m in re.finditer(r'<[^>]+>', self.text.get(1.0, tk.END)):
-            start = "1.0 + %dc" % m.start()
-            end = "1.0 + %dc" % m.end()
-            self.text.tag_add("htmltag", start, end)
+        contenu = self.text.get(1.0, tk.END)
+        lignes = LineStartIndex(contenu)
+        for tag, motif in (("htmltag", r'<[^>]+>'), ("csstag", r'\.[\w\-]+\s*{')):
+            self.text.tag_remove(tag, "1.0", tk.END)
+            indices = []
+            for m in re.finditer(motif, contenu):
+                indices += [lignes.index(m.start()), lignes.index(m.end())]
+            if indices:
+                self.text.tag_add(tag, *indices)
         self.text.tag_config("htmltag", foreground="darkred")
-        self.text.tag_remove("csstag", "1.0", tk.END)
-        for m in re.finditer(r'\.[\w\-]+\s*{', self.text.get(1.0, tk.END)):
-            start = "1.0 + %dc" % m.start()
-            end = "1.0 + %dc" % m.end()
-            self.text.tag_add("csstag", start, end)
         self.text.tag_config("csstag", foreground="darkblue")
     def coloration_syntaxique(self, event=None):
         self.text.tag_remove("pykeyword", "1.0", tk.END)
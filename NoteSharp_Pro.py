@@ -17,7 +17,11 @@ from config import Config
 from ui.themes import theme_manager
 from ui.toolbar import ModernToolbar
 from ui.sidebar import FileExplorer
+from ui.outline import OutlinePanel
+from syntax.ranking import completion_stats
+from syntax.workspace_index import workspace_index
 from core.editor import EnhancedTextEditor
+from core.journal import find_orphaned_journals, replay_journal
 from features.terminal import IntegratedTerminal
 from features.git_integration import GitIntegration
 
@@ -42,12 +46,14 @@ LANG = {
         'tools': "Tools",
         'find_replace': "Find/Replace... (Ctrl+F)",
         'goto_line': "Go to Line (Ctrl+G)",
+        'goto_symbol': "Go to Symbol... (Ctrl+Shift+O)",
         'view': "View",
         'theme': "Theme",
         'font': "Font...",
         'fontsize': "Font Size...",
         'language': "Language",
         'sidebar': "Toggle Sidebar",
+        'outline': "Outline",
         'terminal': "Toggle Terminal",
         'word_wrap': "Word Wrap",
         'line_numbers': "Line Numbers",
@@ -83,12 +89,14 @@ LANG = {
         'tools': "Outils",
         'find_replace': "Rechercher/remplacer... (Ctrl+F)",
         'goto_line': "Aller à la ligne (Ctrl+G)",
+        'goto_symbol': "Aller au symbole... (Ctrl+Shift+O)",
         'view': "Affichage",
         'theme': "Thème",
         'font': "Police...",
         'fontsize': "Taille de police...",
         'language': "Langue",
         'sidebar': "Basculer la barre latérale",
+        'outline': "Structure",
         'terminal': "Basculer le terminal",
         'word_wrap': "Retour à la ligne",
         'line_numbers': "Numéros de ligne",
@@ -126,6 +134,7 @@ class NoteSharpPro:
         self.notebook = None
         self.toolbar = None
         self.sidebar = None
+        self.outline = None
         self.terminal = None
         self.git_integration = None
         self.status_bar = None
@@ -139,6 +148,9 @@ class NoteSharpPro:
         # Create first tab
         self.add_new_tab()
         
+        # Offer to restore buffers left unsaved by a crash
+        self.root.after_idle(self.recover_unsaved_tabs)
+        
         # Bind window events
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         
@@ -159,15 +171,20 @@ class NoteSharpPro:
         content_frame.pack(fill='both', expand=True)
         
         # Create sidebar
-        self.sidebar = FileExplorer(content_frame, self.on_file_selected)
+        self.sidebar = FileExplorer(content_frame, self.on_file_selected, workspace_index.refresh)
         
         # Create editor area
         editor_frame = tk.Frame(content_frame)
         editor_frame.pack(side='right', fill='both', expand=True)
+        self.editor_frame = editor_frame
+        
+        # Outline panel (shown from the View menu, right of the editor area)
+        self.outline = OutlinePanel(content_frame, self.on_symbol_selected)
         
         # Create notebook for tabs
         self.notebook = ttk.Notebook(editor_frame)
         self.notebook.pack(fill='both', expand=True)
+        self.notebook.bind('<<NotebookTabChanged>>', lambda e: self.refresh_outline())
         
         # Create terminal
         self.terminal = IntegratedTerminal(editor_frame)
@@ -239,6 +256,7 @@ class NoteSharpPro:
         tools_menu = tk.Menu(menubar, tearoff=0)
         tools_menu.add_command(label=L['find_replace'], command=self.show_find_dialog, accelerator="Ctrl+F")
         tools_menu.add_command(label=L['goto_line'], command=lambda: self.current_editor().goto_line(), accelerator="Ctrl+G")
+        tools_menu.add_command(label=L['goto_symbol'], command=self.show_symbol_picker, accelerator="Ctrl+Shift+O")
         tools_menu.add_separator()
         tools_menu.add_checkbutton(label=L['auto_save'], command=self.toggle_auto_save)
         tools_menu.add_checkbutton(label=L['read_only'], command=self.toggle_read_only)
@@ -250,6 +268,7 @@ class NoteSharpPro:
         view_menu = tk.Menu(menubar, tearoff=0)
         view_menu.add_checkbutton(label=L['sidebar'], command=self.toggle_sidebar, accelerator="Ctrl+B")
         view_menu.add_checkbutton(label=L['terminal'], command=self.toggle_terminal, accelerator="Ctrl+`")
+        view_menu.add_checkbutton(label=L['outline'], command=self.toggle_outline)
         view_menu.add_separator()
         view_menu.add_checkbutton(label=L['word_wrap'], command=lambda: self.current_editor().toggle_word_wrap())
         view_menu.add_checkbutton(label=L['line_numbers'], command=lambda: self.current_editor().toggle_line_numbers())
@@ -297,6 +316,7 @@ class NoteSharpPro:
             '<Control-f>': self.show_find_dialog,
             '<Control-h>': self.show_replace_dialog,
             '<Control-g>': lambda e: self.current_editor().goto_line(),
+            '<Control-Shift-O>': self.show_symbol_picker,
             '<Control-b>': lambda e: self.toggle_sidebar(),
             '<Control-grave>': lambda e: self.toggle_terminal(),
             '<F11>': self.toggle_fullscreen
@@ -314,7 +334,8 @@ class NoteSharpPro:
         editor = EnhancedTextEditor(
             tab_frame,
             on_tab_title_change=lambda title: self.update_tab_title(tab_frame, title),
-            on_file_change=self.on_file_changed
+            on_file_change=self.on_file_changed,
+            on_outline_change=self.on_outline_changed
         )
         
         # Add tab to notebook
@@ -348,6 +369,16 @@ class NoteSharpPro:
         if not current_editor.ask_save_changes():
             return
         
+        # Stop background loading and release mapped files
+        current_editor.cancel_loading()
+        current_editor.close_large_file()
+        current_editor.journal.discard()
+        
+        # Closed tabs no longer follow theme changes
+        theme_manager.remove_observer(current_editor.on_theme_change)
+        theme_manager.remove_observer(current_editor.syntax_highlighter.on_theme_change)
+        current_editor.auto_complete.close()
+        
         # Remove tab
         current_index = self.notebook.index(self.notebook.select())
         self.notebook.forget(current_index)
@@ -416,6 +447,10 @@ class NoteSharpPro:
         # Update git status if applicable
         if self.git_integration:
             self.git_integration.update_git_status()
+        
+        # A saved file is recounted alone by the workspace completion index
+        if not has_changes and file_path:
+            workspace_index.update_file(file_path)
     
     def add_to_recent_files(self, file_path):
         """Add file to recent files list"""
@@ -459,6 +494,82 @@ class NoteSharpPro:
         if self.sidebar:
             return self.sidebar.toggle_visibility()
     
+    def toggle_outline(self):
+        """Toggle the outline panel"""
+        if self.outline:
+            visible = self.outline.toggle_visibility(before=self.editor_frame)
+            if visible:
+                self.refresh_outline()
+            return visible
+    
+    def refresh_outline(self):
+        """Show the symbols of the current editor in the outline panel"""
+        if self.outline and self.outline.visible:
+            editor = self.current_editor()
+            self.outline.show_outline(editor.symbols.outline() if editor else [])
+    
+    def on_outline_changed(self, editor):
+        """An editor's symbols changed (called at most once per refresh cycle)"""
+        if editor is self.current_editor():
+            self.refresh_outline()
+    
+    def on_symbol_selected(self, line, column):
+        """Jump to a symbol picked in the outline panel"""
+        editor = self.current_editor()
+        if editor:
+            editor.show_position(line, column)
+    
+    def show_symbol_picker(self):
+        """Pick a symbol of the current document by name and jump to it"""
+        editor = self.current_editor()
+        if not editor:
+            return
+        
+        picker = tk.Toplevel(self.root)
+        picker.title("Go to Symbol")
+        picker.geometry("420x320")
+        picker.transient(self.root)
+        
+        query = tk.StringVar()
+        entry = tk.Entry(picker, textvariable=query, font=('Segoe UI', 10))
+        entry.pack(fill='x', padx=5, pady=5)
+        listbox = tk.Listbox(picker, font=('Consolas', 10), activestyle='none')
+        listbox.pack(fill='both', expand=True, padx=5, pady=(0, 5))
+        matches = []
+        
+        def update(*args):
+            matches[:] = editor.symbols.find(query.get())
+            listbox.delete(0, 'end')
+            for line, kind, name, column, depth in matches:
+                listbox.insert('end', f"{name}  ({kind}, line {line})")
+            if matches:
+                listbox.selection_set(0)
+        
+        def move(step):
+            if matches:
+                current = listbox.curselection()
+                index = max(0, min(len(matches) - 1, (current[0] if current else -1) + step))
+                listbox.selection_clear(0, 'end')
+                listbox.selection_set(index)
+                listbox.see(index)
+            return 'break'
+        
+        def accept(event=None):
+            current = listbox.curselection()
+            if current:
+                line, kind, name, column, depth = matches[current[0]]
+                picker.destroy()
+                editor.show_position(line, column)
+        
+        query.trace_add('write', update)
+        entry.bind('<Down>', lambda e: move(1))
+        entry.bind('<Up>', lambda e: move(-1))
+        entry.bind('<Return>', accept)
+        listbox.bind('<Double-1>', accept)
+        picker.bind('<Escape>', lambda e: picker.destroy())
+        update()
+        entry.focus_set()
+    
     def toggle_terminal(self):
         """Toggle terminal visibility"""
         if self.terminal:
@@ -491,9 +602,10 @@ class NoteSharpPro:
         if search_term:
             editor = self.current_editor()
             if editor:
-                pos = editor.find_text(search_term)
-                if not pos:
-                    messagebox.showinfo("Find", "Text not found")
+                def report(pos):
+                    if not pos:
+                        messagebox.showinfo("Find", "Text not found")
+                editor.find_text(search_term, callback=report)
     
     def show_replace_dialog(self):
         """Show replace dialog"""
@@ -547,8 +659,7 @@ class NoteSharpPro:
             for editor in self.tabs:
                 editor.font_family = font_name
                 editor.text.config(font=(font_name, editor.font_size + editor.zoom_level))
-                if editor.show_line_numbers:
-                    editor.line_numbers.config(font=(font_name, editor.font_size + editor.zoom_level))
+                editor.line_numbers.set_font(font_name, editor.font_size + editor.zoom_level)
     
     def change_font_size(self):
         """Change font size"""
@@ -565,8 +676,7 @@ class NoteSharpPro:
             for editor in self.tabs:
                 editor.font_size = size
                 editor.text.config(font=(editor.font_family, size + editor.zoom_level))
-                if editor.show_line_numbers:
-                    editor.line_numbers.config(font=(editor.font_family, size + editor.zoom_level))
+                editor.line_numbers.set_font(editor.font_family, size + editor.zoom_level)
     
     def set_language(self, language):
         """Set application language"""
@@ -619,17 +729,45 @@ Built with Python and Tkinter
     
     def on_closing(self):
         """Handle application closing"""
-        # Check for unsaved changes in all tabs
+        # Check for unsaved changes in all tabs; this also waits for
+        # background saves, so a failed one keeps the application open
         for editor in self.tabs:
-            if editor.text_changed:
-                if not editor.ask_save_changes():
-                    return
+            if not editor.ask_save_changes():
+                return
         
         # Save application state
         # In a full implementation, you'd save settings, recent files, etc.
+        completion_stats.save()
+        
+        # A clean exit leaves nothing to recover
+        for editor in self.tabs:
+            editor.journal.discard()
         
         self.root.destroy()
     
+    def recover_unsaved_tabs(self):
+        """Restore buffers from edit journals left by a previous crash"""
+        journals = find_orphaned_journals()
+        if not journals:
+            return
+        
+        recover = messagebox.askyesno(
+            "Recover Unsaved Work",
+            f"NoteSharp did not close properly. Recover {len(journals)} unsaved tab(s)?"
+        )
+        for journal_path in journals:
+            try:
+                recovered = replay_journal(journal_path) if recover else None
+                if recovered:
+                    file_path, content = recovered
+                    editor = self.current_editor()
+                    if editor.file_path or editor.text_changed:
+                        editor = self.add_new_tab()
+                    editor.restore_buffer(file_path, content)
+                os.remove(journal_path)
+            except Exception as e:
+                print(f"Error recovering {journal_path}: {e}")
+    
     def run(self):
         """Start the application"""
         self.root.mainloop()
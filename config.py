@@ -1,4 +1,5 @@
 # NoteSharp Configuration
+import os
 import tkinter as tk
 from tkinter import font
 
@@ -19,6 +20,24 @@ class Config:
     MAX_RECENT_FILES = 15
     AUTO_SAVE_INTERVAL = 120  # seconds
     MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+    STREAM_OPEN_SIZE = 1024 * 1024  # larger files are loaded in the background
+    LOAD_CHUNK_SIZE = 256 * 1024  # bytes read and inserted per loading step
+    
+    # Crash recovery settings
+    CACHE_DIR = os.path.join(os.path.expanduser('~'), '.notesharp', 'cache')
+    JOURNAL_FLUSH_INTERVAL = 1000  # ms between journal appends
+    JOURNAL_COMPACT_SIZE = 1024 * 1024  # rewrite a journal once it grows past this
+    
+    # Editor refresh settings
+    REFRESH_FRAME_BUDGET = 0.012  # seconds of refresh work per idle cycle
+    PARALLEL_HIGHLIGHT_SIZE = 4 * 1024 * 1024  # larger documents are lexed in a process pool
+    PARALLEL_HIGHLIGHT_WORKERS = None  # lexing processes (None: one per CPU)
+    TAG_BUDGET_SIZE = 2 * 1024 * 1024  # above this many characters operators and brackets are not tagged
+    
+    # Completion settings
+    COMPLETION_MAX_ITEMS = 50  # results listed in the popup (8 rows visible, scrollable)
+    WORKSPACE_MAX_FILES = 5000  # source files indexed under the explorer root
+    WORKSPACE_MAX_FILE_SIZE = 1024 * 1024  # larger files are left out of the workspace index
     
     # UI settings
     SIDEBAR_WIDTH = 250
@@ -167,6 +186,7 @@ class Config:
         'find': '<Control-f>',
         'replace': '<Control-h>',
         'goto_line': '<Control-g>',
+        'goto_symbol': '<Control-Shift-O>',
         'select_all': '<Control-a>',
         'undo': '<Control-z>',
         'redo': '<Control-y>',
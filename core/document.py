@@ -0,0 +1,589 @@
+# Piece-table document model mirroring the editor's Tk Text widget
+import tkinter as tk
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from core.line_index import LineStartIndex
+
+def line_breaks(text):
+    """Return the offsets just after every newline in text"""
+    parts = text.split('\n')
+    if len(parts) == 1:
+        return array('q')
+    return array('q', accumulate(len(part) + 1 for part in parts[:-1]))
+
+def join_snapshot(spans):
+    """Rebuild the text of a PieceTable.snapshot()"""
+    return ''.join(buffer[start:end] for buffer, start, end in spans)
+
+def common_prefix_length(a, b):
+    """Length of the common prefix of two strings (binary search on slices)"""
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[low:mid] == b[low:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+def common_suffix_length(a, b, limit):
+    """Length of the common suffix of two strings, not overlapping limit chars"""
+    low, high = 0, min(len(a), len(b)) - limit
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[len(a) - mid:len(a) - low] == b[len(b) - mid:len(b) - low]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+class TextEdit:
+    """A single edit delta: `removed` was replaced by `inserted` at `offset`"""
+    
+    __slots__ = ('offset', 'removed', 'inserted', 'start_line', 'version')
+    
+    def __init__(self, offset, removed, inserted, start_line, version):
+        self.offset = offset
+        self.removed = removed
+        self.inserted = inserted
+        self.start_line = start_line
+        self.version = version
+    
+    @property
+    def removed_lines(self):
+        """Number of line breaks removed by the edit"""
+        return self.removed.count('\n')
+    
+    @property
+    def inserted_lines(self):
+        """Number of line breaks inserted by the edit"""
+        return self.inserted.count('\n')
+    
+    @property
+    def line_delta(self):
+        """Change in the document's line count"""
+        return self.inserted_lines - self.removed_lines
+    
+    def __repr__(self):
+        return (f"TextEdit(offset={self.offset}, removed={len(self.removed)}, "
+                f"inserted={len(self.inserted)}, line={self.start_line}, v{self.version})")
+
+class PieceTable:
+    """Text stored as spans (pieces) over immutable buffers.
+    
+    Pieces are grouped in blocks of about BLOCK_SIZE entries. Each block keeps
+    its length and newline count, and the prefix sums over blocks turn offset
+    and line lookups into a binary search followed by a short scan.
+    """
+    
+    BLOCK_SIZE = 64
+    MAX_ADD_BUFFER = 64 * 1024
+    COMPACT_THRESHOLD = 8192
+    SMALL_PIECE = 4096
+    
+    def __init__(self, text=''):
+        self.load(text)
+    
+    def load(self, text):
+        """Replace the whole content"""
+        self._buffers = {}
+        self._breaks = {}
+        self._next_buffer = 0
+        self._last_add = None
+        self._blocks = []
+        self._block_lengths = []
+        self._block_newlines = []
+        if text:
+            buf = self._add_buffer(text)
+            self._blocks.append([(buf, 0, len(text), len(self._breaks[buf]))])
+            self._block_lengths.append(len(text))
+            self._block_newlines.append(len(self._breaks[buf]))
+        self._compact_at = self.COMPACT_THRESHOLD
+        self._reindex()
+    
+    @property
+    def line_count(self):
+        """Number of lines in the document"""
+        return self.newline_count + 1
+    
+    @property
+    def piece_count(self):
+        """Number of pieces currently describing the text"""
+        return sum(map(len, self._blocks))
+    
+    def __len__(self):
+        return self.length
+    
+    # Internal bookkeeping
+    
+    def _add_buffer(self, text):
+        buf = self._next_buffer
+        self._next_buffer += 1
+        self._buffers[buf] = text
+        self._breaks[buf] = line_breaks(text)
+        return buf
+    
+    def _span_newlines(self, buf, start, length):
+        """Count newlines inside a span of a buffer"""
+        breaks = self._breaks[buf]
+        return bisect_right(breaks, start + length) - bisect_right(breaks, start)
+    
+    def _reindex(self):
+        """Recompute the prefix sums over blocks"""
+        self._block_offsets = list(accumulate(self._block_lengths, initial=0))
+        self._block_lines = list(accumulate(self._block_newlines, initial=0))
+        self.length = self._block_offsets[-1]
+        self.newline_count = self._block_lines[-1]
+    
+    def _refresh(self, first, last):
+        """Resum blocks first..last, drop empty ones and split oversized ones"""
+        for b in range(last, first - 1, -1):
+            block = self._blocks[b]
+            if not block:
+                del self._blocks[b]
+                del self._block_lengths[b]
+                del self._block_newlines[b]
+                continue
+            if len(block) > 2 * self.BLOCK_SIZE:
+                half = len(block) // 2
+                self._blocks[b:b + 1] = [block[:half], block[half:]]
+                self._block_lengths[b:b + 1] = [0, 0]
+                self._block_newlines[b:b + 1] = [0, 0]
+                parts = (b, b + 1)
+            else:
+                parts = (b,)
+            for p in parts:
+                self._block_lengths[p] = sum(piece[2] for piece in self._blocks[p])
+                self._block_newlines[p] = sum(piece[3] for piece in self._blocks[p])
+        self._reindex()
+    
+    def _locate(self, offset):
+        """Return (block, piece index, piece start offset) for offset < length"""
+        b = bisect_right(self._block_offsets, offset) - 1
+        pos = self._block_offsets[b]
+        for i, piece in enumerate(self._blocks[b]):
+            if offset < pos + piece[2]:
+                return b, i, pos
+            pos += piece[2]
+        raise IndexError(offset)
+    
+    def _split(self, offset):
+        """Make sure a piece starts at offset and return (block, piece index)"""
+        if offset >= self.length:
+            if not self._blocks:
+                self._blocks.append([])
+                self._block_lengths.append(0)
+                self._block_newlines.append(0)
+            return len(self._blocks) - 1, len(self._blocks[-1])
+        b, i, pos = self._locate(offset)
+        if pos == offset:
+            return b, i
+        block = self._blocks[b]
+        buf, start, length, newlines = block[i]
+        delta = offset - pos
+        left = self._span_newlines(buf, start, delta)
+        block[i:i + 1] = [(buf, start, delta, left), (buf, start + delta, length - delta, newlines - left)]
+        return b, i + 1
+    
+    # Editing
+    
+    def insert(self, offset, text):
+        """Insert text at offset"""
+        if not text:
+            return
+        b, i = self._split(max(0, min(offset, self.length)))
+        if i == 0 and b > 0:
+            b, i = b - 1, len(self._blocks[b - 1])
+        block = self._blocks[b]
+        
+        # Typing usually continues right after the last insert: grow that buffer
+        if i > 0:
+            buf, start, length, newlines = block[i - 1]
+            buffer = self._buffers[buf]
+            if (buf == self._last_add and start + length == len(buffer)
+                    and len(buffer) + len(text) <= self.MAX_ADD_BUFFER):
+                added = line_breaks(text)
+                self._buffers[buf] = buffer + text
+                self._breaks[buf].extend(len(buffer) + pos for pos in added)
+                block[i - 1] = (buf, start, length + len(text), newlines + len(added))
+                self._refresh(b, b)
+                return
+        
+        buf = self._add_buffer(text)
+        self._last_add = buf
+        block.insert(i, (buf, 0, len(text), len(self._breaks[buf])))
+        self._refresh(b, b)
+        
+        if self.piece_count > self._compact_at:
+            self.compact()
+    
+    def delete(self, offset, length):
+        """Delete length characters at offset and return the removed text"""
+        offset = max(0, offset)
+        end = min(offset + length, self.length)
+        if end <= offset:
+            return ''
+        b1, i1 = self._split(offset)
+        b2, i2 = self._split(end)
+        removed = ''.join(self.iter_chunks(offset, end))
+        if b1 == b2:
+            del self._blocks[b1][i1:i2]
+            self._refresh(b1, b1)
+        else:
+            del self._blocks[b2][:i2]
+            del self._blocks[b1][i1:]
+            del self._blocks[b1 + 1:b2]
+            del self._block_lengths[b1 + 1:b2]
+            del self._block_newlines[b1 + 1:b2]
+            self._refresh(b1, b1 + 1)
+        return removed
+    
+    def compact(self):
+        """Merge runs of small adjacent pieces into fresh buffers"""
+        pieces = []
+        run = []
+        
+        def flush():
+            if len(run) > 1:
+                text = ''.join(self._buffers[buf][start:start + size] for buf, start, size, _ in run)
+                buf = self._add_buffer(text)
+                pieces.append((buf, 0, len(text), len(self._breaks[buf])))
+            else:
+                pieces.extend(run)
+            run.clear()
+        
+        for block in self._blocks:
+            for piece in block:
+                if piece[2] < self.SMALL_PIECE:
+                    run.append(piece)
+                else:
+                    flush()
+                    pieces.append(piece)
+        flush()
+        
+        # Release buffers no longer referenced by any piece
+        used = {piece[0] for piece in pieces}
+        for buf in [buf for buf in self._buffers if buf not in used]:
+            del self._buffers[buf]
+            del self._breaks[buf]
+        self._last_add = None
+        
+        size = self.BLOCK_SIZE
+        self._blocks = [pieces[i:i + size] for i in range(0, len(pieces), size)]
+        self._block_lengths = [sum(p[2] for p in block) for block in self._blocks]
+        self._block_newlines = [sum(p[3] for p in block) for block in self._blocks]
+        self._reindex()
+        self._compact_at = max(self.COMPACT_THRESHOLD, 2 * len(pieces))
+    
+    # Reading
+    
+    def get_text(self, start=0, end=None):
+        """Return the text between two offsets"""
+        return ''.join(self.iter_chunks(start, end))
+    
+    def iter_chunks(self, start=0, end=None):
+        """Yield the text between two offsets one piece at a time"""
+        if end is None or end > self.length:
+            end = self.length
+        start = max(0, start)
+        if start >= end:
+            return
+        b, i, pos = self._locate(start)
+        while b < len(self._blocks):
+            block = self._blocks[b]
+            while i < len(block):
+                buf, pstart, length, _ = block[i]
+                lo = max(start, pos) - pos
+                hi = min(end, pos + length) - pos
+                yield self._buffers[buf][pstart + lo:pstart + hi]
+                pos += length
+                if pos >= end:
+                    return
+                i += 1
+            b, i = b + 1, 0
+    
+    def snapshot(self):
+        """Return the text as (buffer, start, end) spans that stay valid.
+        
+        Buffers are immutable strings (growing one rebinds it), so the spans
+        can be joined later, or on another thread, while editing continues.
+        """
+        return [(self._buffers[buf], start, start + length)
+                for block in self._blocks for buf, start, length, _ in block]
+    
+    def line_start(self, line):
+        """Offset of the first character of a 1-based line"""
+        if line <= 1:
+            return 0
+        k = line - 2  # index of the newline ending the previous line
+        if k >= self.newline_count:
+            return self.length
+        b = bisect_right(self._block_lines, k) - 1
+        k -= self._block_lines[b]
+        pos = self._block_offsets[b]
+        for buf, start, length, newlines in self._blocks[b]:
+            if k < newlines:
+                breaks = self._breaks[buf]
+                return pos + breaks[bisect_right(breaks, start) + k] - start
+            k -= newlines
+            pos += length
+        raise IndexError(line)
+    
+    def line_end(self, line):
+        """Offset of the end of a 1-based line (before its newline)"""
+        if line >= self.line_count:
+            return self.length
+        return self.line_start(line + 1) - 1
+    
+    def get_line(self, line):
+        """Return the text of a 1-based line without its newline"""
+        return self.get_text(self.line_start(line), self.line_end(line))
+    
+    def offset_to_position(self, offset):
+        """Convert an offset to a (1-based line, column) pair"""
+        offset = max(0, min(offset, self.length))
+        if offset == self.length:
+            line = self.line_count
+            return line, offset - self.line_start(line)
+        b, i, pos = self._locate(offset)
+        block = self._blocks[b]
+        lines = self._block_lines[b] + sum(piece[3] for piece in block[:i])
+        buf, start, _, _ = block[i]
+        lines += self._span_newlines(buf, start, offset - pos)
+        line = lines + 1
+        return line, offset - self.line_start(line)
+    
+    def position_to_offset(self, line, column):
+        """Convert a 1-based line and column to an offset"""
+        return min(self.line_start(line) + column, self.line_end(line))
+    
+    def find(self, sub, start=0, end=None):
+        """Find sub between two offsets without joining the whole text"""
+        if not sub:
+            return start
+        carry = ''
+        carry_offset = max(0, start)
+        for chunk in self.iter_chunks(start, end):
+            window = carry + chunk
+            pos = window.find(sub)
+            if pos != -1:
+                return carry_offset + pos
+            keep = min(len(window), len(sub) - 1)
+            carry_offset += len(window) - keep
+            carry = window[len(window) - keep:] if keep else ''
+        return -1
+
+class TextDocument:
+    """Document model kept in sync with a Tk Text widget.
+    
+    The widget's Tcl command is wrapped so that every insert, delete and
+    replace is applied to a piece table and broadcast as a TextEdit to the
+    listeners. Readers use the document instead of copying the widget.
+    
+    The wrapper is a Tcl proc around a Python hook. A Python command
+    cannot raise a Tcl error without Tkinter re-raising it later from the
+    main loop, so the hook leaves the widget's error message in a Tcl
+    variable and the proc raises it: callers see the same TclError as
+    with the bare widget (e.g. index of sel.first without a selection).
+    """
+    
+    def __init__(self, text_widget=None):
+        self.table = PieceTable()
+        self.lines = LineStartIndex()  # line starts for offset <-> index conversion
+        self.version = 0
+        self.listeners = []
+        self.text_widget = None
+        self._orig = None
+        self._error_var = None
+        if text_widget is not None:
+            self.attach(text_widget)
+    
+    def attach(self, text_widget):
+        """Install the edit-delta hook on a Text widget"""
+        self.text_widget = text_widget
+        self._tk = text_widget.tk
+        self._orig = text_widget._w + '_notesharp_orig'
+        hook = text_widget._w + '_notesharp_hook'
+        self._error_var = '::notesharp_error_' + str(id(self))
+        self._tk.call('rename', text_widget._w, self._orig)
+        self._tk.createcommand(hook, self._dispatch)
+        body = (f'set result [{hook} {{*}}$args]\n'
+                f'if {{[info exists {self._error_var}]}} {{\n'
+                f'    set message [set {self._error_var}]\n'
+                f'    unset {self._error_var}\n'
+                f'    return -code error $message\n'
+                f'}}\n'
+                f'return $result')
+        self._tk.call('proc', text_widget._w, 'args', body)
+        
+        # Let Tkinter drop our commands when the widget is destroyed
+        if text_widget._tclCommands is None:
+            text_widget._tclCommands = []
+        text_widget._tclCommands.extend([hook, text_widget._w])
+        
+        text = str(self._call('get', '1.0', 'end-1c'))
+        self.table.load(text)
+        self.lines.reset(text)
+    
+    def add_listener(self, callback):
+        """Add a callback receiving a TextEdit after every change"""
+        self.listeners.append(callback)
+    
+    def remove_listener(self, callback):
+        """Remove an edit listener"""
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+    
+    # Read access
+    
+    def __len__(self):
+        return self.table.length
+    
+    @property
+    def line_count(self):
+        """Number of lines in the document"""
+        return self.table.line_count
+    
+    def get_text(self, start=0, end=None):
+        """Return the document text (or a slice of it by offsets)"""
+        return self.table.get_text(start, end)
+    
+    def get_line(self, line):
+        """Return a 1-based line without its newline"""
+        return self.table.get_line(line)
+    
+    def get_lines(self, first, last):
+        """Return lines first..last (inclusive) as one string"""
+        return self.table.get_text(self.lines.line_start(first), self.lines.line_end(last))
+    
+    def find(self, sub, start=0, end=None):
+        """Find a substring by offset, or -1"""
+        return self.table.find(sub, start, end)
+    
+    def snapshot(self):
+        """Capture the current text cheaply (see PieceTable.snapshot)"""
+        return self.table.snapshot()
+    
+    def offset_to_index(self, offset):
+        """Convert an offset to a Tk 'line.col' index"""
+        return self.lines.index(offset)
+    
+    def index_to_offset(self, index):
+        """Convert any Tk index to an offset"""
+        if self.text_widget is not None:
+            index = str(self._call('index', index))
+        line, column = map(int, str(index).split('.'))
+        return self.lines.offset(line, column)
+    
+    # Widget hook
+    
+    def _call(self, *args):
+        return self._tk.call((self._orig,) + args)
+    
+    def _dispatch(self, operation, *args):
+        """Hook behind the widget's command: mirror edits, pass the rest on"""
+        try:
+            if operation in ('insert', 'delete', 'replace') and not self._disabled():
+                return getattr(self, '_on_' + operation)(*args)
+            result = self._call(operation, *args)
+            if operation == 'edit' and args and args[0] in ('undo', 'redo'):
+                self._mirror(self.resync)
+            return result
+        except tk.TclError as e:
+            # Raised to the caller by the wrapping proc (see attach)
+            self._tk.call('set', self._error_var, str(e))
+            return ''
+    
+    def _mirror(self, update, *args):
+        """Apply a widget edit to the model; a mirroring bug falls back to a diff"""
+        try:
+            update(*args)
+        except Exception:
+            self.resync()
+            self._report_exception()
+    
+    def _report_exception(self):
+        """Report the exception being handled the way Tk reports callback errors"""
+        if self.text_widget is None:
+            raise
+        self.text_widget._report_exception()
+    
+    def _disabled(self):
+        return str(self._call('cget', '-state')) == 'disabled'
+    
+    def _clamp(self, index):
+        """Resolve an index, clamped before the widget's trailing newline"""
+        index = str(self._call('index', index))
+        if self._tk.getboolean(self._call('compare', index, '>', 'end-1c')):
+            index = str(self._call('index', 'end-1c'))
+        return index
+    
+    def _offset(self, index):
+        line, column = map(int, index.split('.'))
+        return self.lines.line_start(line) + column
+    
+    def _on_insert(self, index, *args):
+        index = self._clamp(index)
+        offset = self._offset(index)
+        result = self._call('insert', index, *args)
+        chars = ''.join(args[0::2])
+        if chars:
+            self._mirror(self.apply_edit, offset, 0, chars)
+        return result
+    
+    def _on_delete(self, index1, index2=None, *more):
+        if more:
+            # Multiple ranges are rare: let Tk handle them and diff afterwards
+            result = self._call('delete', index1, index2, *more)
+            self._mirror(self.resync)
+            return result
+        first = self._clamp(index1)
+        last = self._clamp(index2 if index2 is not None else first + '+1c')
+        start = self._offset(first)
+        end = self._offset(last)
+        result = self._call('delete', first, last)
+        if end > start:
+            self._mirror(self.apply_edit, start, end - start, '')
+        return result
+    
+    def _on_replace(self, index1, index2, *args):
+        first = self._clamp(index1)
+        last = self._clamp(index2)
+        start = self._offset(first)
+        end = max(start, self._offset(last))
+        result = self._call('replace', first, last, *args)
+        self._mirror(self.apply_edit, start, end - start, ''.join(args[0::2]))
+        return result
+    
+    # Mutation
+    
+    def apply_edit(self, offset, length, inserted):
+        """Apply an edit to the model and notify the listeners"""
+        start_line = self.lines.position(offset)[0]
+        removed = self.table.delete(offset, length) if length else ''
+        if inserted:
+            self.table.insert(offset, inserted)
+        if not removed and not inserted:
+            return None
+        self.lines.update(offset, removed, inserted)
+        self.version += 1
+        edit = TextEdit(offset, removed, inserted, start_line, self.version)
+        for callback in list(self.listeners):
+            try:
+                callback(edit)
+            except Exception:
+                self._report_exception()  # the model is fine: keep notifying
+        return edit
+    
+    def resync(self):
+        """Re-read the widget after changes the hook cannot see (undo/redo)"""
+        if self.text_widget is None:
+            return None
+        new = str(self._call('get', '1.0', 'end-1c'))
+        old = self.table.get_text()
+        if new == old:
+            return None
+        prefix = common_prefix_length(old, new)
+        suffix = common_suffix_length(old, new, prefix)
+        return self.apply_edit(prefix, len(old) - prefix - suffix, new[prefix:len(new) - suffix])
@@ -8,13 +8,25 @@ from pathlib import Path
 
 from config import Config
 from ui.themes import theme_manager
-from syntax.highlighter import SyntaxHighlighter, CodeFolding
+from syntax.highlighter import SyntaxHighlighter
+from syntax.folding import CodeFolding
+from syntax.brackets import BracketIndex
+from syntax.symbols import SymbolIndex
 from syntax.autocomplete import AutoComplete
+from core.document import TextDocument
+from core.statistics import DocumentStatistics
+from core.scheduler import RefreshScheduler
+from core.large_file import LargeFileView
+from core.file_loader import FileLoader
+from core.save_service import save_service
+from core.ui_queue import ui_queue
+from core.journal import EditJournal
+from ui.gutter import LineNumberGutter
 
 class EnhancedTextEditor:
     """Enhanced text editor with modern features"""
     
-    def __init__(self, root, on_tab_title_change=None, on_file_change=None):
+    def __init__(self, root, on_tab_title_change=None, on_file_change=None, on_outline_change=None):
         self.root = root
         self.file_path = None
         self.text_changed = False
@@ -22,6 +34,7 @@ class EnhancedTextEditor:
         self.font_size = Config.DEFAULT_FONT_SIZE
         self.on_tab_title_change = on_tab_title_change
         self.on_file_change = on_file_change
+        self.on_outline_change = on_outline_change
         self.locked = False
         self.read_only = False
         self.wrap_mode = 'word'
@@ -29,14 +42,26 @@ class EnhancedTextEditor:
         self.auto_save_enabled = False
         self._auto_save_job = None
         self.zoom_level = 0
+        self.large_file = None
+        self.loader = None
+        self.status_message = None
+        self._status_message_job = None
         
         # Create the editor interface
         self.create_editor()
         
         # Initialize advanced features
-        self.syntax_highlighter = SyntaxHighlighter(self.text)
-        self.code_folding = CodeFolding(self.text)
-        self.auto_complete = AutoComplete(self.text)
+        self.syntax_highlighter = SyntaxHighlighter(self.text, self.document, self.scheduler)
+        self.brackets = BracketIndex(self.document, self.text)
+        self.code_folding = CodeFolding(self.text, self.document, self.brackets)
+        self.symbols = SymbolIndex(self.document, self.text)
+        self.symbols.on_change = lambda: self.scheduler.mark('outline')
+        self.auto_complete = AutoComplete(self.text, self.document, self.scheduler)
+        self.scheduler.register('highlight', self.refresh_highlighting)
+        self.scheduler.register('viewport', lambda payload: self.syntax_highlighter.highlight_visible())
+        self.scheduler.register('brackets', lambda payload: self.update_bracket_match())
+        self.scheduler.register('outline', lambda payload: self.on_outline_change and self.on_outline_change(self))
+        self.text.tag_configure('bracket_match', underline=True)
         
         # Register for theme changes
         theme_manager.add_observer(self.on_theme_change)
@@ -56,18 +81,6 @@ class EnhancedTextEditor:
         editor_frame = tk.Frame(self.main_frame)
         editor_frame.pack(fill='both', expand=True)
         
-        # Line numbers
-        self.line_numbers = tk.Text(
-            editor_frame,
-            width=4,
-            padx=4,
-            takefocus=0,
-            border=0,
-            state='disabled',
-            font=(self.font_family, self.font_size),
-            wrap='none'
-        )
-        
         # Main text area
         self.text = tk.Text(
             editor_frame,
@@ -78,13 +91,33 @@ class EnhancedTextEditor:
             tabs=('4c',)  # Set tab width to 4 characters
         )
         
+        # Document model mirroring the text widget (read this instead of text.get)
+        self.document = TextDocument(self.text)
+        self.statistics = DocumentStatistics(self.document)
+        
+        # Refresh work is coalesced and flushed once per idle cycle
+        self.scheduler = RefreshScheduler(self.text)
+        self.scheduler.register('gutter', lambda payload: self.update_line_numbers())
+        self.scheduler.register('status', lambda payload: self.update_status())
+        self.journal = EditJournal(self.document, self.text)
+        
+        # Line numbers (only the visible lines are drawn)
+        self.line_numbers = LineNumberGutter(
+            editor_frame,
+            self.text,
+            self.document,
+            self.font_family,
+            self.font_size,
+            on_fold_click=self.toggle_fold
+        )
+        
         # Scrollbars
         v_scrollbar = tk.Scrollbar(editor_frame, orient='vertical')
         h_scrollbar = tk.Scrollbar(editor_frame, orient='horizontal')
+        self.v_scrollbar = v_scrollbar
         
         # Configure scrolling
-        self.text.config(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
-        self.line_numbers.config(yscrollcommand=v_scrollbar.set)
+        self.text.config(yscrollcommand=self.on_text_scroll, xscrollcommand=h_scrollbar.set)
         v_scrollbar.config(command=self.sync_scroll)
         h_scrollbar.config(command=self.text.xview)
         
@@ -110,19 +143,16 @@ class EnhancedTextEditor:
     
     def bind_events(self):
         """Bind keyboard and mouse events"""
-        # Text change events
+        # Text change events (each handler refreshes the status bar once)
         self.text.bind('<KeyRelease>', self.on_text_change)
         self.text.bind('<<Modified>>', self.on_modified)
         self.text.bind('<ButtonRelease-1>', self.on_cursor_change)
-        self.text.bind('<Configure>', lambda e: self.update_line_numbers())
-        
-        # Selection and cursor events
-        self.text.bind('<<Selection>>', self.update_status)
-        self.text.bind('<KeyRelease>', self.update_status)
-        self.text.bind('<ButtonRelease-1>', self.update_status)
+        self.text.bind('<Configure>', lambda e: self.scheduler.mark('gutter'))
+        self.text.bind('<Escape>', lambda e: self.cancel_loading())
+        self.document.add_listener(self.on_document_edit)
         
-        # Scrolling synchronization
-        self.text.bind('<MouseWheel>', self.sync_scrollbar)
+        # Selection events
+        self.text.bind('<<Selection>>', lambda e: self.scheduler.mark('status'))
         
         # Keyboard shortcuts
         self.text.bind('<Control-d>', lambda e: self.duplicate_line())
@@ -137,63 +167,91 @@ class EnhancedTextEditor:
         self.text.bind('<Alt-Down>', lambda e: self.move_line_down())
         self.text.bind('<Control-j>', lambda e: self.join_lines())
         self.text.bind('<Control-l>', lambda e: self.select_line())
+        self.text.bind('<Control-bracketright>', lambda e: self.jump_to_bracket())
+        self.text.bind('<Control-bracketleft>', lambda e: self.select_enclosing_block())
     
     def sync_scroll(self, *args):
-        """Synchronize scrolling between text and line numbers"""
-        self.text.yview(*args)
-        if self.show_line_numbers:
-            self.line_numbers.yview(*args)
+        """Scroll the text from the scrollbar (the gutter follows via on_text_scroll)"""
+        if self.large_file:
+            self.large_file.scrollbar_command(*args)
+        else:
+            self.text.yview(*args)
     
-    def sync_scrollbar(self, event):
-        """Synchronize scrollbar with line numbers"""
-        if self.show_line_numbers:
-            self.line_numbers.yview_moveto(self.text.yview()[0])
-        return 'break'
+    def on_text_scroll(self, first, last):
+        """yscrollcommand hook: update the scrollbar and the visible-range views"""
+        if self.large_file:
+            self.v_scrollbar.set(*self.large_file.file_fraction(first, last))
+            self.large_file.on_scroll(first, last)
+        else:
+            self.v_scrollbar.set(first, last)
+        self.scheduler.mark('gutter')
+        self.scheduler.mark('viewport')
+    
+    def on_document_edit(self, edit):
+        """Handle an edit delta from the document model"""
+        self.scheduler.mark('gutter')
+        self.scheduler.mark('status')
+        if self.loader:
+            return  # a file is streaming in; it is highlighted once complete
+        self.text_changed = True
+        self.scheduler.mark('highlight', (edit.start_line, edit.start_line + edit.inserted_lines))
+    
+    def refresh_highlighting(self, line_range):
+        """Scheduler handler: re-highlight the lines touched since the last flush"""
+        if hasattr(self, 'syntax_highlighter') and line_range:
+            self.syntax_highlighter.highlight_lines(*line_range)
     
     def update_line_numbers(self):
         """Update line numbers display"""
         if not self.show_line_numbers:
             return
         
-        self.line_numbers.config(state='normal')
-        self.line_numbers.delete(1.0, tk.END)
-        
-        # Get number of lines
-        line_count = int(self.text.index('end-1c').split('.')[0])
-        
-        # Generate line numbers
-        line_numbers = '\n'.join(str(i) for i in range(1, line_count + 1))
-        self.line_numbers.insert(1.0, line_numbers)
-        
-        self.line_numbers.config(state='disabled')
+        if hasattr(self, 'code_folding'):
+            first = int(self.text.index('@0,0').split('.')[0])
+            last = int(self.text.index(f"@0,{self.text.winfo_height()}").split('.')[0])
+            self.line_numbers.fold_markers = self.code_folding.add_fold_markers(first, last)
+        self.line_numbers.redraw()
+    
+    def toggle_fold(self, line):
+        """Fold or unfold the region starting at a line (gutter fold markers)"""
+        self.code_folding.toggle_fold(line)
+        self.scheduler.mark('gutter')
+        self.scheduler.mark('viewport')
     
     def update_status(self, event=None):
         """Update status bar information"""
         try:
-            # Get text content
-            content = self.text.get(1.0, tk.END)
+            if self.large_file:
+                self.update_large_file_status()
+                return
+            if self.loader:
+                name = os.path.basename(self.loader.path)
+                self.status_left.config(text=f"Loading {name}... {self.loader.progress:.0%} (Esc to cancel)")
+                self.status_right.config(text="")
+                return
             
-            # Calculate statistics
-            char_count = len(content.rstrip('\n'))
-            line_count = int(self.text.index('end-1c').split('.')[0])
-            word_count = len(content.split())
-            paragraph_count = content.count('\n\n') + 1
+            # Statistics are kept up to date from the edit deltas
+            stats = self.statistics
             
-            # Get selection info
-            try:
-                selection = self.text.get(tk.SEL_FIRST, tk.SEL_LAST)
-                selection_count = len(selection)
-            except tk.TclError:
-                selection_count = 0
+            # Get selection info (counted from the document, not copied out of Tk)
+            selection = self.text.tag_ranges(tk.SEL)
+            if selection:
+                selection_count, selection_words = stats.selection_counts(str(selection[0]), str(selection[-1]))
+            else:
+                selection_count, selection_words = 0, None
             
             # Get cursor position
             cursor_pos = self.text.index(tk.INSERT)
             line_num, col_num = cursor_pos.split('.')
             
             # Update status bar
-            left_status = f"Lines: {line_count} | Words: {word_count} | Characters: {char_count}"
+            left_status = f"Lines: {stats.lines} | Words: {stats.words} | Characters: {stats.chars}"
             if selection_count > 0:
                 left_status += f" | Selected: {selection_count}"
+                if selection_words is not None:
+                    left_status += f" ({selection_words} words)"
+            if self.status_message:
+                left_status = f"{self.status_message} | {left_status}"
             
             right_status = f"Ln {line_num}, Col {int(col_num) + 1}"
             if self.file_path:
@@ -213,22 +271,15 @@ class EnhancedTextEditor:
     
     def on_text_change(self, event=None):
         """Handle text change events"""
-        self.text_changed = True
-        self.update_line_numbers()
-        self.update_status()
-        
-        # Update syntax highlighting
-        if hasattr(self, 'syntax_highlighter'):
-            self.syntax_highlighter.on_text_change(event)
-        
-        # Update auto-complete
-        if hasattr(self, 'auto_complete'):
-            # Only show auto-complete for certain key events
-            if event and hasattr(event, 'keysym') and len(event.keysym) == 1:
-                pass  # Auto-complete handles its own key events
+        # text_changed, gutter, highlighting and completion are marked by the edit itself;
+        # the cursor may have moved, so only the status bar and bracket match are refreshed here
+        self.scheduler.mark('status')
+        self.scheduler.mark('brackets')
     
     def on_modified(self, event=None):
         """Handle text modified event"""
+        if self.loader:
+            return  # reset once the file has finished loading
         if self.text.edit_modified():
             self.text_changed = True
             if self.on_file_change:
@@ -237,8 +288,8 @@ class EnhancedTextEditor:
     
     def on_cursor_change(self, event=None):
         """Handle cursor position changes"""
-        self.update_status()
-        self.update_line_numbers()
+        self.scheduler.mark('status')
+        self.scheduler.mark('brackets')
     
     def open_file(self, file_path=None):
         """Open a file"""
@@ -263,24 +314,41 @@ class EnhancedTextEditor:
         try:
             # Check file size
             file_size = os.path.getsize(file_path)
+            large_mode = False
             if file_size > Config.MAX_FILE_SIZE:
-                if not messagebox.askyesno(
+                large_mode = messagebox.askyesnocancel(
                     "Large File",
-                    f"File is {file_size // (1024*1024)}MB. This may affect performance. Continue?"
-                ):
+                    f"File is {file_size // (1024*1024)}MB.\n\n"
+                    "Open it read-only in large-file mode?\n"
+                    "(No loads the whole file in the background.)"
+                )
+                if large_mode is None:
                     return False
             
-            # Read file content
-            with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-                content = f.read()
-            
-            # Clear current content and insert new
-            self.text.delete(1.0, tk.END)
-            self.text.insert(1.0, content)
+            self.cancel_loading()
+            self.close_large_file()
+            self.journal.paused = True  # the journal restarts from the file below
+            if large_mode:
+                # Memory-map the file and only load a window of lines
+                self.open_large_file(file_path)
+            elif file_size > Config.STREAM_OPEN_SIZE:
+                # Stream the file in without blocking the event loop
+                self.start_loading(file_path)
+            else:
+                # Read file content
+                with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+                    content = f.read()
+                
+                # Clear current content and insert new
+                self.text.delete(1.0, tk.END)
+                self.text.insert(1.0, content)
             
             # Update file info
             self.file_path = file_path
             self.text_changed = False
+            if not self.loader and not self.large_file:
+                self.journal.paused = False
+                self.journal.rebase(file_path)
             
             # Update tab title
             if self.on_tab_title_change:
@@ -293,7 +361,14 @@ class EnhancedTextEditor:
             if hasattr(self, 'syntax_highlighter'):
                 ext = Path(file_path).suffix
                 language = self.syntax_highlighter.detect_language_from_extension(ext)
+                if self.large_file:
+                    language = 'text'
                 self.syntax_highlighter.set_language(language)
+                self.scheduler.cancel('highlight')  # set_language already highlighted the viewport
+                if not self.loader:  # a streaming load builds them once it is done
+                    self.brackets.set_language(language)
+                    self.code_folding.set_language(language)
+                    self.symbols.set_language(language)
                 
                 if hasattr(self, 'auto_complete'):
                     self.auto_complete.set_language(language)
@@ -309,43 +384,201 @@ class EnhancedTextEditor:
             return True
             
         except Exception as e:
+            if not self.loader and not self.large_file:
+                self.journal.paused = False
+                self.journal.rebase()
             messagebox.showerror("Error", f"Cannot open file: {str(e)}")
             return False
     
-    def save_file(self, file_path=None):
-        """Save the current file"""
+    def start_loading(self, file_path):
+        """Load a file in chunks from a worker thread (see FileLoader)"""
+        self.pause_indexes()
+        self.text.delete(1.0, tk.END)
+        self.text.config(state=tk.DISABLED)
+        self.loader = FileLoader(self.text, file_path, self.on_load_chunk, self.on_load_done, self.on_load_error)
+        self.loader.start()
+    
+    def on_load_chunk(self, chunk):
+        """Append one decoded chunk of the file being loaded"""
+        self.text.config(state=tk.NORMAL)
+        self.text.insert(tk.END, chunk)
+        self.text.config(state=tk.DISABLED)
+    
+    def on_load_done(self):
+        """The whole file is in the buffer"""
+        self.loader = None
+        self.text.config(state=tk.DISABLED if self.read_only else tk.NORMAL)
+        self.text.edit_reset()
+        self.text.edit_modified(False)
+        self.text_changed = False
+        self.journal.paused = False
+        self.journal.rebase(self.file_path)
+        self.resume_indexes()
+        self.scheduler.mark('highlight', (1, self.document.line_count))
+        self.scheduler.mark('gutter')
+        self.scheduler.mark('status')
+    
+    def on_load_error(self, error):
+        """Reading the file failed part way"""
+        self.cancel_loading()
+        messagebox.showerror("Error", f"Cannot open file: {str(error)}")
+    
+    def cancel_loading(self):
+        """Stop a streaming open and drop the partial buffer"""
+        if not self.loader:
+            return False
+        self.loader.cancel()
+        self.loader = None
+        self.text.config(state=tk.NORMAL)
+        self.text.delete(1.0, tk.END)
+        self.text.edit_reset()
+        
+        # The partial buffer must never be saved over the file
+        self.file_path = None
+        self.text_changed = False
+        self.journal.paused = False
+        self.journal.file_path = None
+        self.journal.rebase()
+        self.resume_indexes()
+        if self.on_tab_title_change:
+            self.on_tab_title_change("Untitled")
+        self.scheduler.mark('status')
+        return True
+    
+    def open_large_file(self, file_path):
+        """Open a huge file read-only through a memory-mapped sliding window"""
+        self.journal.paused = True  # the window is never edited
+        self.large_file = LargeFileView(self.text, file_path, on_window_change=self.on_large_window_change)
+        self.read_only = True
+        self._poll_large_file_index()
+    
+    def close_large_file(self):
+        """Leave large-file mode"""
+        if not self.large_file:
+            return
+        self.large_file.close()
+        self.large_file = None
+        self.read_only = False
+        self.text.config(state=tk.NORMAL)
+        self.text.delete(1.0, tk.END)
+        self.text_changed = False
+        self.line_numbers.line_offset = 0
+        self.journal.paused = False
+        self.journal.file_path = None
+        self.journal.rebase()
+    
+    def on_large_window_change(self, view):
+        """A new window of the large file was loaded"""
+        self.text_changed = False
+        first_line = view.first_line_number
+        self.line_numbers.line_offset = first_line - 1 if first_line is not None else None
+        self.scheduler.mark('gutter')
+        self.scheduler.mark('status')
+    
+    def _poll_large_file_index(self):
+        """Refresh the status bar while the line index is being built"""
+        view = self.large_file
+        if not view:
+            return
+        if self.line_numbers.line_offset is None and view.first_line_number is not None:
+            self.on_large_window_change(view)
+        self.scheduler.mark('status')
+        if not view.index.complete:
+            self.text.after(500, self._poll_large_file_index)
+    
+    def update_large_file_status(self):
+        """Status bar for large-file mode"""
+        line_num, col_num = self.text.index(tk.INSERT).split('.')
+        first_line = self.large_file.first_line_number
+        right_status = f"Col {int(col_num) + 1}"
+        if first_line is not None:
+            right_status = f"Ln {first_line + int(line_num) - 1}, " + right_status
+        self.status_left.config(text=self.large_file.status_text())
+        self.status_right.config(text=right_status)
+    
+    def save_file(self, file_path=None, wait=False):
+        """Save the current file; with wait, return whether the write succeeded"""
+        if self.loader:
+            messagebox.showinfo("Loading", "Wait for the file to finish loading before saving.")
+            return False
+        
+        if self.large_file:
+            messagebox.showinfo("Read Only", "Files opened in large-file mode are read-only.")
+            return False
+        
         if not file_path and not self.file_path:
-            return self.save_file_as()
+            return self.save_file_as(wait)
         
         target_path = file_path or self.file_path
         
-        try:
-            content = self.text.get(1.0, tk.END)
-            with open(target_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            
-            self.file_path = target_path
-            self.text_changed = False
-            
-            # Update tab title
+        # The tab adopts a new path (and title) once the write succeeded
+        return self.write_file(target_path, wait=wait)
+    
+    def write_file(self, path, auto=False, wait=False):
+        """Snapshot the buffer and hand it to the background save service.
+        
+        With wait the snapshot is written before returning (closing a tab or
+        the application) and the result is returned; otherwise it is reported
+        to on_save_done later and True is returned.
+        """
+        version = self.document.version
+        self.text_changed = False
+        if wait:
+            ok, message = save_service.save_now(path, self.document.snapshot())
+            self.on_save_done(path, version, auto, ok, message)
+            return ok
+        save_service.save(
+            path, self.document.snapshot(), self.text,
+            lambda ok, message: self.on_save_done(path, version, auto, ok, message)
+        )
+        self.show_status_message("Saving...")
+        return True
+    
+    def on_save_done(self, path, version, auto, ok, message):
+        """Save service callback, run on the UI thread"""
+        filename = os.path.basename(path)
+        if not ok:
+            self.text_changed = True
+            self.show_status_message(f"Save failed: {message}")
+            if not auto:
+                messagebox.showerror("Error", f"Cannot save file: {message}")
+            return
+        
+        # Save As: the tab now refers to the written file
+        if not auto and path != self.file_path:
+            self.file_path = path
             if self.on_tab_title_change:
-                filename = os.path.basename(target_path)
-                if self.locked:
-                    filename += " 🔒"
-                self.on_tab_title_change(filename)
-            
-            # Notify file change
-            if self.on_file_change:
-                self.on_file_change(target_path, False)
-            
-            messagebox.showinfo("Success", "File saved successfully!")
-            return True
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Cannot save file: {str(e)}")
-            return False
+                title = filename + (" 🔒" if self.locked else "")
+                self.on_tab_title_change(title)
+        
+        if message == 'unchanged':
+            self.show_status_message(f"{filename} is up to date")
+        else:
+            self.show_status_message(f"{'Auto-saved' if auto else 'Saved'} {filename}")
+        
+        # The journal only needs the edits made after this snapshot
+        if path == self.file_path:
+            self.journal.rebase(path, version)
+        
+        # Notify file change unless the buffer was edited during the write
+        if self.on_file_change and path == self.file_path and self.document.version == version:
+            self.on_file_change(path, False)
+    
+    def show_status_message(self, message, duration=4000):
+        """Show a transient message at the start of the status bar"""
+        if self._status_message_job:
+            self.text.after_cancel(self._status_message_job)
+        self.status_message = message
+        self._status_message_job = self.text.after(duration, self.clear_status_message)
+        self.scheduler.mark('status')
     
-    def save_file_as(self):
+    def clear_status_message(self):
+        """Remove the transient status message"""
+        self.status_message = None
+        self._status_message_job = None
+        self.scheduler.mark('status')
+    
+    def save_file_as(self, wait=False):
         """Save file with a new name"""
         file_path = filedialog.asksaveasfilename(
             defaultextension=".txt",
@@ -362,11 +595,15 @@ class EnhancedTextEditor:
         )
         
         if file_path:
-            return self.save_file(file_path)
+            return self.save_file(file_path, wait)
         return False
     
     def ask_save_changes(self):
         """Ask user to save changes before closing"""
+        # A background save that failed leaves the buffer unsaved again
+        save_service.wait()
+        ui_queue.poll()
+        
         if not self.text_changed:
             return True
         
@@ -378,7 +615,7 @@ class EnhancedTextEditor:
         if result is None:  # Cancel
             return False
         elif result is True:  # Yes
-            return self.save_file()
+            return self.save_file(wait=True)
         else:  # No
             return True
     
@@ -399,6 +636,8 @@ class EnhancedTextEditor:
     
     def set_read_only(self, read_only=True):
         """Set read-only mode"""
+        if self.large_file:
+            read_only = True  # large-file windows are never editable
         self.read_only = read_only
         self.text.config(state=tk.DISABLED if read_only else tk.NORMAL)
     
@@ -499,8 +738,7 @@ class EnhancedTextEditor:
         self.zoom_level += 1
         new_size = self.font_size + self.zoom_level
         self.text.config(font=(self.font_family, new_size))
-        if self.show_line_numbers:
-            self.line_numbers.config(font=(self.font_family, new_size))
+        self.line_numbers.set_font(self.font_family, new_size)
         return 'break'
     
     def zoom_out(self):
@@ -508,16 +746,14 @@ class EnhancedTextEditor:
         self.zoom_level -= 1
         new_size = max(8, self.font_size + self.zoom_level)
         self.text.config(font=(self.font_family, new_size))
-        if self.show_line_numbers:
-            self.line_numbers.config(font=(self.font_family, new_size))
+        self.line_numbers.set_font(self.font_family, new_size)
         return 'break'
     
     def reset_zoom(self):
         """Reset font size to default"""
         self.zoom_level = 0
         self.text.config(font=(self.font_family, self.font_size))
-        if self.show_line_numbers:
-            self.line_numbers.config(font=(self.font_family, self.font_size))
+        self.line_numbers.set_font(self.font_family, self.font_size)
         return 'break'
     
     def move_line_up(self):
@@ -590,8 +826,74 @@ class EnhancedTextEditor:
         self.text.tag_add(tk.SEL, f"{line_num}.0", f"{line_num}.end")
         return 'break'
     
+    def bracket_pair_at_cursor(self):
+        """(bracket, match) offsets for a bracket just after or before the cursor, or None"""
+        offset = self.document.index_to_offset(tk.INSERT)
+        for bracket in (offset, offset - 1):
+            if bracket >= 0 and self.brackets.is_bracket(bracket):
+                match = self.brackets.match(bracket)
+                return (bracket, match) if match is not None else None
+        return None
+    
+    def update_bracket_match(self):
+        """Underline the bracket next to the cursor and its match"""
+        self.text.tag_remove('bracket_match', '1.0', 'end')
+        pair = self.bracket_pair_at_cursor()
+        if pair:
+            for offset in pair:
+                index = self.document.offset_to_index(offset)
+                self.text.tag_add('bracket_match', index, f"{index}+1c")
+    
+    def jump_to_bracket(self):
+        """Move the cursor to the matching bracket (or to the enclosing opening one)"""
+        pair = self.bracket_pair_at_cursor()
+        if pair:
+            target = pair[1]
+        else:
+            enclosing = self.brackets.enclosing(self.document.index_to_offset(tk.INSERT))
+            if not enclosing:
+                return 'break'
+            target = enclosing[0]
+        self.text.mark_set(tk.INSERT, self.document.offset_to_index(target))
+        self.text.see(tk.INSERT)
+        self.scheduler.mark('brackets')
+        self.scheduler.mark('status')
+        return 'break'
+    
+    def select_enclosing_block(self):
+        """Select inside the enclosing brackets; repeat to take the brackets, then the outer block"""
+        ranges = self.text.tag_ranges(tk.SEL)
+        if ranges:
+            start, end = (self.document.index_to_offset(index) for index in ranges[:2])
+        else:
+            start = end = self.document.index_to_offset(tk.INSERT)
+        pair = self.brackets.enclosing(start)
+        while pair and pair[1] is not None and pair[1] < end:
+            pair = self.brackets.enclosing(pair[0])
+        if not pair or pair[1] is None:
+            return 'break'
+        opening, closing = pair
+        if (start, end) == (opening + 1, closing):
+            opening, closing = opening - 1, closing + 1  # the brackets themselves
+        self.text.tag_remove(tk.SEL, '1.0', 'end')
+        self.text.tag_add(tk.SEL, self.document.offset_to_index(opening + 1), self.document.offset_to_index(closing))
+        self.text.mark_set(tk.INSERT, self.document.offset_to_index(closing))
+        return 'break'
+    
     def goto_line(self):
         """Go to a specific line number"""
+        if self.large_file:
+            line_num = simpledialog.askinteger(
+                "Go to Line",
+                "Enter line number:",
+                minvalue=1,
+                maxvalue=self.large_file.index.line_count
+            )
+            if line_num and not self.large_file.goto_line(line_num):
+                messagebox.showinfo("Go to Line", "That part of the file is still being indexed.")
+            self.text.focus_set()
+            return
+        
         line_num = simpledialog.askinteger(
             "Go to Line",
             "Enter line number:",
@@ -604,6 +906,19 @@ class EnhancedTextEditor:
             self.text.see(f"{line_num}.0")
             self.text.focus_set()
     
+    def show_position(self, line, column=0):
+        """Put the cursor at a line and column, unfolding it if needed, and scroll there"""
+        for start, end in list(self.code_folding.folded_regions.items()):
+            if start < line <= end:
+                self.code_folding.unfold_region(start)
+                self.scheduler.mark('gutter')
+        index = f"{line}.{column}"
+        self.text.mark_set(tk.INSERT, index)
+        self.text.see(index)
+        self.text.focus_set()
+        self.scheduler.mark('status')
+        self.scheduler.mark('brackets')
+    
     def insert_timestamp(self):
         """Insert current timestamp"""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -617,8 +932,7 @@ class EnhancedTextEditor:
         theme_manager.apply_theme_to_widget(self.text, 'text')
         
         # Apply to line numbers
-        if self.show_line_numbers:
-            theme_manager.apply_theme_to_widget(self.line_numbers, 'line_numbers')
+        self.line_numbers.apply_theme()
         
         # Apply to status bar
         theme_manager.apply_theme_to_widget(self.status_left, 'status')
@@ -629,12 +943,8 @@ class EnhancedTextEditor:
         theme_manager.apply_theme_to_widget(self.main_frame, 'frame')
     
     def on_theme_change(self, theme_name):
-        """Handle theme change"""
+        """Handle theme change (the highlighter restyles its own tags)"""
         self.apply_theme()
-        
-        # Update syntax highlighting colors
-        if hasattr(self, 'syntax_highlighter'):
-            self.syntax_highlighter.on_theme_change(theme_name)
     
     def enable_auto_save(self, interval=None):
         """Enable auto-save functionality"""
@@ -644,14 +954,8 @@ class EnhancedTextEditor:
         self.disable_auto_save()  # Stop any existing auto-save
         
         def auto_save():
-            if self.file_path and self.text_changed:
-                try:
-                    content = self.text.get(1.0, tk.END)
-                    with open(self.file_path, 'w', encoding='utf-8') as f:
-                        f.write(content)
-                    self.text_changed = False
-                except Exception as e:
-                    print(f"Auto-save error: {e}")
+            if self.file_path and self.text_changed and not self.loader and not self.large_file:
+                self.write_file(self.file_path, auto=True)
             
             # Schedule next auto-save
             self._auto_save_job = self.text.after(interval * 1000, auto_save)
@@ -668,19 +972,66 @@ class EnhancedTextEditor:
     
     def get_content(self):
         """Get the current text content"""
-        return self.text.get(1.0, tk.END)
+        return self.document.get_text()
     
     def set_content(self, content):
         """Set the text content"""
+        self.cancel_loading()
+        self.close_large_file()
         self.text.delete(1.0, tk.END)
         self.text.insert(1.0, content)
         self.text_changed = True
         self.update_line_numbers()
         self.update_status()
     
-    def find_text(self, search_term, start_pos='1.0'):
-        """Find text in the editor"""
-        pos = self.text.search(search_term, start_pos, stopindex=tk.END)
+    def pause_indexes(self):
+        """Switch the document indexes off while a file streams in.
+        
+        Every chunk is an edit: left on, each would restart a background
+        build (or rescan a whole chunk) that the next chunk throws away.
+        """
+        self.brackets.set_language(None)
+        self.code_folding.set_language(None)
+        self.symbols.set_language(None)
+        self.auto_complete.words.pause()
+    
+    def resume_indexes(self):
+        """Build the indexes paused by pause_indexes once, for the whole buffer"""
+        language = self.syntax_highlighter.language
+        self.brackets.set_language(language)
+        self.code_folding.set_language(language)
+        self.symbols.set_language(language)
+        self.auto_complete.words.build()
+    
+    def restore_buffer(self, file_path, content):
+        """Restore a buffer recovered from an edit journal (left unsaved)"""
+        self.set_content(content)
+        self.text.edit_reset()
+        self.file_path = file_path
+        self.journal.file_path = file_path
+        if file_path:
+            if self.on_tab_title_change:
+                self.on_tab_title_change(os.path.basename(file_path))
+            language = self.syntax_highlighter.detect_language_from_extension(Path(file_path).suffix)
+            self.syntax_highlighter.set_language(language)
+            self.auto_complete.set_language(language)
+            self.brackets.set_language(language)
+            self.code_folding.set_language(language)
+            self.symbols.set_language(language)
+        self.journal.compact()
+    
+    def find_text(self, search_term, start_pos='1.0', callback=None):
+        """Find text in the editor; the match index (or None) is also passed to callback.
+        
+        Large files are searched in the background: None is returned and
+        callback runs once the search is done.
+        """
+        if self.large_file:
+            self.large_file.find_text(search_term, callback)
+            return None
+        
+        offset = self.document.find(search_term, self.document.index_to_offset(start_pos))
+        pos = self.document.offset_to_index(offset) if offset != -1 else None
         if pos:
             end_pos = f"{pos}+{len(search_term)}c"
             self.text.tag_remove('found', '1.0', tk.END)
@@ -688,13 +1039,14 @@ class EnhancedTextEditor:
             self.text.tag_config('found', background='yellow', foreground='black')
             self.text.see(pos)
             self.text.mark_set(tk.INSERT, end_pos)
-            return pos
-        return None
+        if callback:
+            callback(pos)
+        return pos
     
     def replace_text(self, old_text, new_text, all_occurrences=False):
         """Replace text in the editor"""
         if all_occurrences:
-            content = self.text.get(1.0, tk.END)
+            content = self.document.get_text()
             new_content = content.replace(old_text, new_text)
             self.text.delete(1.0, tk.END)
             self.text.insert(1.0, new_content)
@@ -0,0 +1,112 @@
+# Streaming, cancellable file loading
+import codecs
+import io
+import os
+import queue
+import threading
+import time
+from config import Config
+
+_DONE = object()
+
+class FileLoader:
+    """Reads and decodes a file in a worker thread and hands it to the UI in slices.
+    
+    The worker pushes decoded chunks on a bounded queue. The UI side drains
+    it from widget.after() callbacks, passing as many chunks to on_chunk as
+    fit in the frame budget, so input events are processed between slices.
+    """
+    
+    QUEUE_SIZE = 8
+    POLL_INTERVAL = 15  # ms to wait when the worker has nothing ready
+    
+    def __init__(self, widget, path, on_chunk, on_done, on_error=None, encoding='utf-8', chunk_size=None):
+        self.widget = widget
+        self.path = path
+        self.on_chunk = on_chunk
+        self.on_done = on_done
+        self.on_error = on_error
+        self.encoding = encoding
+        self.chunk_size = chunk_size or Config.LOAD_CHUNK_SIZE
+        self.size = os.path.getsize(path)
+        self.bytes_read = 0
+        self.cancelled = False
+        self.finished = False
+        self._queue = queue.Queue(self.QUEUE_SIZE)
+        self._job = None
+    
+    @property
+    def progress(self):
+        """Fraction of the file read so far"""
+        return min(1.0, self.bytes_read / self.size) if self.size else 1.0
+    
+    def start(self):
+        """Start reading in a daemon thread and draining on the UI side"""
+        threading.Thread(target=self._read, daemon=True).start()
+        self._job = self.widget.after(self.POLL_INTERVAL, self._drain)
+    
+    def cancel(self):
+        """Stop reading; no callback is called afterwards"""
+        self.cancelled = True
+        if self._job is not None:
+            try:
+                self.widget.after_cancel(self._job)
+            except Exception:
+                pass  # widget already destroyed
+            self._job = None
+    
+    def _put(self, item):
+        while not self.cancelled:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+    
+    def _read(self):
+        """Worker: read, decode and normalise newlines chunk by chunk"""
+        try:
+            decoder = io.IncrementalNewlineDecoder(
+                codecs.getincrementaldecoder(self.encoding)(errors='replace'), translate=True
+            )
+            with open(self.path, 'rb') as f:
+                while not self.cancelled:
+                    data = f.read(self.chunk_size)
+                    text = decoder.decode(data, final=not data)
+                    self.bytes_read += len(data)
+                    if text:
+                        self._put(text)
+                    if not data:
+                        break
+            self._put(_DONE)
+        except Exception as e:
+            self._put(e)
+    
+    def _drain(self):
+        """UI side: hand queued chunks over until the frame budget is spent"""
+        self._job = None
+        deadline = time.perf_counter() + Config.REFRESH_FRAME_BUDGET
+        try:
+            while not self.cancelled and time.perf_counter() < deadline:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _DONE:
+                    self.finished = True
+                    self.on_done()
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                self.on_chunk(item)
+        except Exception as e:
+            self.cancel()
+            if self.on_error:
+                self.on_error(e)
+            else:
+                print(f"Error loading file: {e}")
+            return
+        
+        if not self.cancelled:
+            delay = 0 if not self._queue.empty() else self.POLL_INTERVAL
+            self._job = self.widget.after(delay, self._drain)
@@ -0,0 +1,208 @@
+# Append-only edit journal for crash recovery
+import json
+import os
+import sys
+import uuid
+from config import Config
+from core.document import PieceTable
+from core.save_service import write_atomic
+
+JOURNAL_SUFFIX = '.journal'
+
+def journal_dir():
+    """Directory holding the journals of open buffers"""
+    return os.path.join(Config.CACHE_DIR, 'journal')
+
+def _process_alive(pid):
+    """Whether a process is running, without signalling it"""
+    if sys.platform == 'win32':
+        # os.kill(pid, 0) would terminate the process on Windows
+        import ctypes
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        STILL_ACTIVE = 259
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return ctypes.GetLastError() == 5  # access denied: it exists
+        try:
+            code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)):
+                return True
+            return code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+def find_orphaned_journals(directory=None):
+    """Journals left behind by NoteSharp processes that are no longer running"""
+    directory = directory or journal_dir()
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    journals = []
+    for name in names:
+        if not name.endswith(JOURNAL_SUFFIX):
+            continue
+        pid = name.split('-', 1)[0]
+        if pid.isdigit() and (int(pid) == os.getpid() or _process_alive(int(pid))):
+            continue  # our own buffers, or another instance still running
+        journals.append(os.path.join(directory, name))
+    return sorted(journals, key=os.path.getmtime)
+
+def replay_journal(path):
+    """Rebuild (file_path, text) from a journal, or None if it cannot be replayed"""
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break  # torn final append
+    if not records or 'base' not in records[0]:
+        return None
+    
+    base = records[0]
+    if base['base'] == 'file':
+        # Only valid if the file is still exactly what the journal started from
+        try:
+            stat = os.stat(base['file'])
+        except OSError:
+            return None
+        if stat.st_size != base['size'] or stat.st_mtime != base['mtime']:
+            return None
+        with open(base['file'], 'r', encoding='utf-8', errors='replace') as f:
+            text = f.read()
+    else:
+        text = base['text']
+    
+    table = PieceTable(text)
+    for record in records[1:]:
+        if record['r']:
+            table.delete(record['o'], record['r'])
+        if record['i']:
+            table.insert(record['o'], record['i'])
+    return base.get('file'), table.get_text()
+
+class EditJournal:
+    """Append-only log of one buffer's edits, replayable after a crash.
+    
+    The first record is the base: either the file on disk (path, size and
+    mtime) or the buffer text itself. Each edit delta is then appended as
+    {"v", "o", "r", "i"} (version, offset, removed length, inserted text).
+    Appends are buffered and flushed every JOURNAL_FLUSH_INTERVAL ms, so the
+    cost follows the edit rate rather than the document size. Saves rebase
+    the journal on the file; past JOURNAL_COMPACT_SIZE it is rewritten with
+    the current text as its base. A clean buffer has no journal file.
+    """
+    
+    def __init__(self, document, widget, directory=None):
+        self.document = document
+        self.widget = widget
+        self.directory = directory or journal_dir()
+        self.path = os.path.join(self.directory, f"{os.getpid()}-{uuid.uuid4().hex}{JOURNAL_SUFFIX}")
+        self.file_path = None
+        self.paused = False  # set while a file is streaming in or mapped
+        self.base = None
+        self.records = []  # edits since the base, kept for rebasing
+        self._pending = []  # serialized records not yet appended
+        self._size = 0
+        self._job = None
+        document.add_listener(self.on_edit)
+        self.rebase()
+    
+    @staticmethod
+    def _line(record):
+        return json.dumps(record, ensure_ascii=False) + '\n'
+    
+    def on_edit(self, edit):
+        """Document listener: queue the edit for the next append"""
+        if self.paused:
+            return
+        record = {'v': edit.version, 'o': edit.offset, 'r': len(edit.removed), 'i': edit.inserted}
+        if not self._size and not self._pending:
+            self._pending.append(self._line(self.base))  # first record of a new journal
+        self.records.append(record)
+        self._pending.append(self._line(record))
+        if self._job is None:
+            self._job = self.widget.after(Config.JOURNAL_FLUSH_INTERVAL, self.flush)
+    
+    def flush(self):
+        """Append the queued records to the journal file"""
+        self._job = None
+        if not self._pending:
+            return
+        data = ''.join(self._pending).encode('utf-8')
+        self._pending = []
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.path, 'ab') as f:
+                f.write(data)
+            self._size += len(data)
+        except OSError as e:
+            print(f"Error writing edit journal: {e}")
+            return
+        if self._size > Config.JOURNAL_COMPACT_SIZE:
+            self.compact()
+    
+    def rebase(self, file_path=None, version=None):
+        """Restart from the file on disk as saved at version, or from the current text"""
+        if file_path:
+            self.file_path = os.path.abspath(file_path)
+            try:
+                stat = os.stat(self.file_path)
+                self.base = {'base': 'file', 'file': self.file_path, 'size': stat.st_size, 'mtime': stat.st_mtime}
+            except OSError:
+                file_path = None
+        if not file_path:
+            self.base = {'base': 'text', 'file': self.file_path, 'text': self.document.get_text()}
+            version = self.document.version
+        elif version is None:
+            version = self.document.version
+        self.records = [record for record in self.records if record['v'] > version]
+        self._rewrite()
+    
+    def compact(self):
+        """Replace the journal by one record holding the current text"""
+        self.records = []
+        self.base = {'base': 'text', 'file': self.file_path, 'text': self.document.get_text()}
+        self._rewrite()
+    
+    def _rewrite(self):
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+            self._job = None
+        self._pending = []
+        if not self.records and not (self.base['base'] == 'text' and self.base['text']):
+            self._remove()
+            return
+        data = ''.join(map(self._line, [self.base] + self.records)).encode('utf-8')
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            write_atomic(self.path, data)
+            self._size = len(data)
+        except OSError as e:
+            print(f"Error writing edit journal: {e}")
+    
+    def _remove(self):
+        self._size = 0
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+    
+    def discard(self):
+        """Delete the journal (the buffer was saved or deliberately dropped)"""
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+            self._job = None
+        self.paused = True
+        self.records = []
+        self._pending = []
+        self._remove()
@@ -0,0 +1,319 @@
+# Windowed, read-only large-file mode backed by mmap
+import mmap
+import os
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+import tkinter as tk
+from config import Config
+from core.ui_queue import ui_queue
+
+SEARCH_CHUNK = 4 * 1024 * 1024  # bytes searched between cancellation checks
+
+def find_bytes(data, needle, start, size, cancelled=None, chunk=SEARCH_CHUNK):
+    """Offset of needle in data[start:size], or -1, searched a chunk at a time.
+    
+    Chunks overlap by len(needle) - 1 bytes so no match is split; returns
+    -1 as soon as cancelled() is true.
+    """
+    pos = start
+    while True:
+        if cancelled is not None and cancelled():
+            return -1
+        hit = data.find(needle, pos, min(size, pos + chunk + len(needle) - 1))
+        if hit != -1:
+            return hit
+        pos += chunk
+        if pos >= size:
+            return -1
+
+class LineIndex:
+    """Line-offset index of a memory-mapped file, built in a background thread.
+    
+    The file is cut in fixed-size blocks and the number of newlines before
+    each block is recorded, so finding a line only scans one block.
+    """
+    
+    BLOCK_SIZE = 64 * 1024
+    
+    def __init__(self, data, size):
+        self.data = data
+        self.size = size
+        self.block_lines = array('q', [0])  # newlines before each block
+        self.indexed_bytes = 0
+        self.complete = size == 0
+        self.cancelled = False
+        self._thread = None
+    
+    def start(self):
+        """Start indexing in a daemon thread"""
+        self._thread = threading.Thread(target=self._build, daemon=True)
+        self._thread.start()
+    
+    def cancel(self):
+        """Stop indexing (the mapping is about to be closed)"""
+        self.cancelled = True
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=1)
+    
+    def _build(self):
+        lines = 0
+        start = 0
+        try:
+            while start < self.size and not self.cancelled:
+                end = min(start + self.BLOCK_SIZE, self.size)
+                lines += self.data[start:end].count(b'\n')
+                self.block_lines.append(lines)
+                self.indexed_bytes = end
+                start = end
+            self.complete = not self.cancelled
+        except (ValueError, OSError):
+            pass  # mapping closed under us
+    
+    @property
+    def progress(self):
+        """Fraction of the file indexed so far"""
+        return self.indexed_bytes / self.size if self.size else 1.0
+    
+    @property
+    def line_count(self):
+        """Number of lines, or None while indexing"""
+        return self.block_lines[-1] + 1 if self.complete else None
+    
+    def line_offset(self, line):
+        """Byte offset of a 1-based line, or None if not indexed yet"""
+        k = line - 1  # newlines before the line
+        if k <= 0:
+            return 0
+        b = bisect_left(self.block_lines, k) - 1
+        if b + 1 >= len(self.block_lines):
+            return None
+        pos = b * self.BLOCK_SIZE
+        for _ in range(k - self.block_lines[b]):
+            pos = self.data.find(b'\n', pos) + 1
+        return pos
+    
+    def line_of_offset(self, offset):
+        """1-based line containing a byte offset, or None if not indexed yet"""
+        if offset > self.indexed_bytes:
+            return None
+        b = min(offset // self.BLOCK_SIZE, len(self.block_lines) - 1)
+        start = b * self.BLOCK_SIZE
+        return self.block_lines[b] + self.data[start:offset].count(b'\n') + 1
+
+class LargeFileView:
+    """Read-only view that keeps only a sliding window of a huge file in Tk.
+    
+    The file is memory-mapped; the Text widget holds WINDOW_LINES lines
+    around the viewport and the window is moved when the view nears one of
+    its edges, on scrollbar jumps, goto_line and search hits.
+    """
+    
+    WINDOW_LINES = 3000
+    WINDOW_BYTES = 4 * 1024 * 1024
+    EDGE = 0.15  # slide when the view is this close to a window edge
+    
+    def __init__(self, text_widget, path, on_window_change=None):
+        self.text_widget = text_widget
+        self.path = path
+        self.on_window_change = on_window_change
+        self.size = os.path.getsize(path)
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        self.index = LineIndex(self.data, self.size)
+        self.index.start()
+        
+        self.window_start = 0
+        self.window_end = 0
+        self.window_offsets = array('q')  # byte offset of each window line
+        self._slide_job = None
+        self._search_job = 0  # bumped to cancel the running search
+        self._search_thread = None
+        self.load_window(0)
+    
+    def close(self):
+        """Stop indexing and release the mapping"""
+        if self._slide_job is not None:
+            self.text_widget.after_cancel(self._slide_job)
+            self._slide_job = None
+        self._search_job += 1
+        if self._search_thread and self._search_thread.is_alive():
+            self._search_thread.join(timeout=1)
+        self.index.cancel()
+        if self.size:
+            self.data.close()
+        self.file.close()
+    
+    # Window management
+    
+    def _line_start(self, offset):
+        """Byte offset of the start of the line containing offset"""
+        floor = max(0, offset - self.WINDOW_BYTES)
+        return self.data.rfind(b'\n', floor, offset) + 1 or floor
+    
+    def _lines_back(self, offset, count):
+        """Byte offset `count` lines before the line starting at offset"""
+        floor = max(0, offset - self.WINDOW_BYTES // 2)
+        for _ in range(count):
+            if offset <= floor:
+                break
+            offset = self.data.rfind(b'\n', floor, offset - 1) + 1 or floor
+        return offset
+    
+    def load_window(self, start, top=None):
+        """Load the lines from byte `start` and scroll so `top` is first"""
+        limit = min(self.size, start + self.WINDOW_BYTES)
+        offsets = array('q')
+        pos = start
+        while len(offsets) < self.WINDOW_LINES and pos < limit:
+            offsets.append(pos)
+            newline = self.data.find(b'\n', pos, limit)
+            pos = limit if newline == -1 else newline + 1
+        if not offsets:
+            offsets.append(start)
+        
+        content = self.data[start:pos].decode('utf-8', errors='replace').replace('\r\n', '\n')
+        if content.endswith('\n'):
+            content = content[:-1]
+        
+        self.window_start = start
+        self.window_end = pos
+        self.window_offsets = offsets
+        
+        self.text_widget.config(state=tk.NORMAL)
+        self.text_widget.delete('1.0', tk.END)
+        self.text_widget.insert('1.0', content)
+        self.text_widget.config(state=tk.DISABLED)
+        self.text_widget.edit_reset()
+        self.text_widget.edit_modified(False)
+        
+        if top is not None:
+            self.text_widget.yview(f"{self.window_line(top)}.0")
+        if self.on_window_change:
+            self.on_window_change(self)
+    
+    def load_around(self, offset):
+        """Load a window centred on the line containing a byte offset"""
+        top = self._line_start(offset)
+        self.load_window(self._lines_back(top, self.WINDOW_LINES // 2), top)
+    
+    def window_line(self, offset):
+        """1-based window line containing a byte offset"""
+        return max(1, bisect_right(self.window_offsets, offset))
+    
+    @property
+    def first_line_number(self):
+        """File line number of the first window line, or None while unknown"""
+        return self.index.line_of_offset(self.window_start)
+    
+    def top_offset(self):
+        """Byte offset of the first visible line"""
+        line = int(self.text_widget.index('@0,0').split('.')[0])
+        return self.window_offsets[min(line, len(self.window_offsets)) - 1]
+    
+    def on_scroll(self, first, last):
+        """yscrollcommand hook: slide the window near its edges"""
+        first, last = float(first), float(last)
+        near_top = first < self.EDGE and self.window_start > 0
+        near_bottom = last > 1 - self.EDGE and self.window_end < self.size
+        if (near_top or near_bottom) and self._slide_job is None:
+            self._slide_job = self.text_widget.after_idle(self._slide)
+    
+    def _slide(self):
+        self._slide_job = None
+        self.load_around(self.top_offset())
+    
+    def file_fraction(self, first, last):
+        """Map the window's scroll fractions to fractions of the whole file"""
+        if not self.size:
+            return 0.0, 1.0
+        span = self.window_end - self.window_start
+        top = self.window_start + float(first) * span
+        bottom = self.window_start + float(last) * span
+        return top / self.size, bottom / self.size
+    
+    def scrollbar_command(self, *args):
+        """Scrollbar command: jumps move the window, steps scroll the text"""
+        if args and args[0] == 'moveto':
+            self.load_around(int(float(args[1]) * self.size))
+        else:
+            self.text_widget.yview(*args)
+    
+    # Navigation and search
+    
+    def goto_line(self, line):
+        """Show a 1-based file line; False while that part is not indexed"""
+        offset = self.index.line_offset(line)
+        if offset is None:
+            return False
+        self.load_around(offset)
+        index = f"{self.window_line(offset)}.0"
+        self.text_widget.mark_set(tk.INSERT, index)
+        self.text_widget.see(index)
+        return True
+    
+    def cursor_offset(self):
+        """Byte offset of the insert cursor"""
+        line, column = map(int, self.text_widget.index(tk.INSERT).split('.'))
+        prefix = self.text_widget.get(f"{line}.0", f"{line}.{column}")
+        return self.window_offsets[min(line, len(self.window_offsets)) - 1] + len(prefix.encode('utf-8'))
+    
+    def find(self, search_term, start=0, cancelled=None):
+        """Byte offset of the next occurrence of search_term, or -1"""
+        if not self.size:
+            return -1
+        return find_bytes(self.data, search_term.encode('utf-8'), start, self.size, cancelled)
+    
+    def find_text(self, search_term, callback=None):
+        """Search from the cursor in a worker thread; the match is shown and
+        its index (or None) passed to callback on the UI thread.
+        
+        A new search or close() cancels the running one.
+        """
+        self._search_job += 1
+        job = self._search_job
+        start = self.cursor_offset()
+        ui_queue.expect(self.text_widget)
+        self._search_thread = threading.Thread(target=self._search, args=(job, search_term, start, callback),
+                                               daemon=True)
+        self._search_thread.start()
+    
+    def _search(self, job, search_term, start, callback):
+        """Worker: search the mapping and hand the hit to the UI thread"""
+        try:
+            hit = self.find(search_term, start, lambda: job != self._search_job)
+        except (ValueError, OSError):
+            ui_queue.cancel()  # mapping closed under us
+            return
+        ui_queue.post(lambda: self._show_match(job, search_term, hit, callback))
+    
+    def _show_match(self, job, search_term, hit, callback):
+        """Main thread: select a search hit unless the search was superseded"""
+        if job != self._search_job:
+            return
+        pos = self._select(search_term, hit) if hit != -1 else None
+        if callback:
+            callback(pos)
+    
+    def _select(self, search_term, hit):
+        """Load the window around a hit and select it"""
+        self.load_around(hit)
+        line = self.window_line(hit)
+        column = len(self.data[self.window_offsets[line - 1]:hit].decode('utf-8', errors='replace'))
+        pos = f"{line}.{column}"
+        end_pos = f"{pos}+{len(search_term)}c"
+        self.text_widget.tag_remove('found', '1.0', tk.END)
+        self.text_widget.tag_add('found', pos, end_pos)
+        self.text_widget.tag_config('found', background='yellow', foreground='black')
+        self.text_widget.see(pos)
+        self.text_widget.mark_set(tk.INSERT, end_pos)
+        return pos
+    
+    def status_text(self):
+        """Status bar summary of the mapped file"""
+        size_mb = self.size / (1024 * 1024)
+        if self.index.complete:
+            lines = f"Lines: {self.index.line_count}"
+        else:
+            lines = f"Indexing lines: {self.index.progress:.0%}"
+        return f"Large file (read-only) | {size_mb:.1f} MB | {lines}"
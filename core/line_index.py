@@ -0,0 +1,101 @@
+# Line start table for fast offset <-> line.column conversion
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+
+class LineStartIndex:
+    """Offsets of the first character of every line, kept in an array.
+    
+    Absolute offsets (e.g. regex match positions) are turned into Tk
+    'line.col' indices with a binary search, instead of letting Tk walk
+    "1.0+Nc" from the start of the buffer for every match.
+    
+    Edits splice the starts of the changed lines. Shifting the lines after
+    an edit is done lazily: entries from _shift_from on are stored _shift
+    too low, and only the entries between two successive edit points are
+    rewritten, so typing in one place stays cheap in a huge document.
+    """
+    
+    def __init__(self, text=''):
+        self.reset(text)
+    
+    def reset(self, text):
+        """Rebuild the table for a whole text"""
+        self._starts = array('q', [0])
+        self._starts.extend(accumulate(len(line) + 1 for line in text.split('\n')[:-1]))
+        self._shift_from = len(self._starts)
+        self._shift = 0
+        self.length = len(text)
+    
+    @property
+    def line_count(self):
+        """Number of lines"""
+        return len(self._starts)
+    
+    def _start(self, i):
+        start = self._starts[i]
+        return start + self._shift if i >= self._shift_from else start
+    
+    def _line_index(self, offset):
+        """0-based index of the line containing an offset"""
+        starts, first = self._starts, self._shift_from
+        if first < len(starts) and offset >= starts[first] + self._shift:
+            return bisect_right(starts, offset - self._shift, first) - 1
+        return bisect_right(starts, offset, 0, first) - 1
+    
+    def _settle(self, index):
+        """Move the start of the lazily shifted entries to index"""
+        starts, shift = self._starts, self._shift
+        if shift:
+            if index > self._shift_from:
+                for i in range(self._shift_from, index):
+                    starts[i] += shift
+            else:
+                for i in range(index, self._shift_from):
+                    starts[i] -= shift
+        self._shift_from = index
+    
+    def line_start(self, line):
+        """Offset of the first character of a 1-based line"""
+        if line <= 1:
+            return 0
+        if line > len(self._starts):
+            return self.length
+        return self._start(line - 1)
+    
+    def line_end(self, line):
+        """Offset of the end of a 1-based line (before its newline)"""
+        if line >= len(self._starts):
+            return self.length
+        return self._start(line) - 1
+    
+    def position(self, offset):
+        """Convert an offset to a (1-based line, column) pair"""
+        offset = max(0, min(offset, self.length))
+        line = self._line_index(offset)
+        return line + 1, offset - self._start(line)
+    
+    def index(self, offset):
+        """Convert an offset to a Tk 'line.col' index"""
+        line, column = self.position(offset)
+        return f"{line}.{column}"
+    
+    def offset(self, line, column):
+        """Convert a 1-based line and column to an offset, clamped to the line"""
+        return min(self.line_start(line) + column, self.line_end(line))
+    
+    def update(self, offset, removed, inserted):
+        """Follow an edit replacing the text removed at offset with inserted"""
+        line = self._line_index(offset)
+        removed_lines = removed.count('\n')
+        self._settle(line + 1 + removed_lines)
+        
+        new_starts = array('q')
+        pos = inserted.find('\n')
+        while pos != -1:
+            new_starts.append(offset + pos + 1)
+            pos = inserted.find('\n', pos + 1)
+        self._starts[line + 1:line + 1 + removed_lines] = new_starts
+        self._shift_from = line + 1 + len(new_starts)
+        self._shift += len(inserted) - len(removed)
+        self.length += len(inserted) - len(removed)
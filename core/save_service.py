@@ -0,0 +1,128 @@
+# Background, atomic file saving
+import hashlib
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from core.document import join_snapshot
+from core.ui_queue import ui_queue
+
+def write_atomic(path, data):
+    """Write bytes to a temp file next to path, fsync it and rename it over path"""
+    directory = os.path.dirname(path) or '.'
+    fd, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, temp_path)
+        else:
+            os.chmod(temp_path, 0o644)  # mkstemp creates files readable by the owner only
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    
+    # Make the rename itself durable where directories can be fsynced
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+class SaveService:
+    """Write-behind thread that saves buffer snapshots atomically.
+    
+    The UI thread only captures a document snapshot; joining, encoding,
+    hashing and writing happen on the worker. A save whose content hash
+    matches the last write to the same path is skipped. Results are passed
+    to callback(ok, message) on the UI thread through the UI queue, where
+    message is 'saved', 'unchanged' or the error text.
+    """
+    
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._hashes = {}  # path -> digest of the last content written
+        self._lock = threading.Lock()
+        self._thread = None
+    
+    def save(self, path, snapshot, widget=None, callback=None, encoding='utf-8'):
+        """Queue a snapshot (see TextDocument.snapshot) for writing to path"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        if widget is not None and callback is not None:
+            ui_queue.expect(widget)
+        self._queue.put((os.path.abspath(path), snapshot, widget, callback, encoding))
+    
+    def wait(self):
+        """Block until every queued save has been written (e.g. before exit).
+        
+        Never waits on the UI thread: results are only queued for it.
+        """
+        self._queue.join()
+    
+    def save_now(self, path, snapshot, encoding='utf-8'):
+        """Write a snapshot on the calling thread and return (ok, message).
+        
+        Queued saves are written first so an older snapshot can never
+        replace this one.
+        """
+        self.wait()
+        try:
+            return True, self._write(os.path.abspath(path), snapshot, encoding)
+        except Exception as e:
+            return False, str(e)
+    
+    def forget(self, path):
+        """Drop the remembered hash so the next save of path always writes"""
+        self._hashes.pop(os.path.abspath(path), None)
+    
+    def _run(self):
+        while True:
+            path, snapshot, widget, callback, encoding = self._queue.get()
+            try:
+                ok, message = True, self._write(path, snapshot, encoding)
+            except Exception as e:
+                ok, message = False, str(e)
+            # Report before task_done so wait() returns with the result queued
+            self._report(widget, callback, ok, message)
+            self._queue.task_done()
+    
+    def _write(self, path, snapshot, encoding):
+        text = join_snapshot(snapshot)
+        if os.linesep != '\n':
+            text = text.replace('\n', os.linesep)  # same output as a text-mode write
+        data = text.encode(encoding)
+        digest = hashlib.sha1(data).digest()
+        if self._hashes.get(path) == digest and os.path.exists(path):
+            return 'unchanged'
+        write_atomic(path, data)
+        self._hashes[path] = digest
+        return 'saved'
+    
+    def _report(self, widget, callback, ok, message):
+        if callback is None:
+            return
+        try:
+            if widget is None:
+                callback(ok, message)
+            else:
+                ui_queue.post(lambda: callback(ok, message))
+        except Exception as e:
+            print(f"Error reporting save result: {e}")
+
+# Global save service instance
+save_service = SaveService()
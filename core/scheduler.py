@@ -0,0 +1,83 @@
+# Coalescing idle-time scheduler for editor refresh work
+import time
+from collections import deque
+from config import Config
+
+class RefreshScheduler:
+    """Collects dirty flags and flushes them once per idle cycle.
+    
+    Handlers are registered per flag and run in registration order. Marking
+    a flag several times before the flush only runs its handler once; range
+    payloads (e.g. line ranges to highlight) are merged. Work that does not
+    fit in the frame budget, and chunked jobs queued with defer(), continue
+    on the next idle cycle so input events are processed in between.
+    """
+    
+    def __init__(self, widget, budget=None):
+        self.widget = widget
+        self.budget = budget if budget is not None else Config.REFRESH_FRAME_BUDGET
+        self.handlers = {}  # flag -> callback(payload)
+        self.dirty = {}  # flag -> merged payload
+        self.deferred = deque()
+        self._job = None
+    
+    def register(self, flag, callback):
+        """Register the handler run when flag is dirty"""
+        self.handlers[flag] = callback
+    
+    def mark(self, flag, payload=None):
+        """Mark a flag dirty; (first, last) payloads are merged into one range"""
+        if flag in self.dirty and payload is not None:
+            current = self.dirty[flag]
+            if current is not None:
+                payload = (min(current[0], payload[0]), max(current[1], payload[1]))
+        elif flag in self.dirty:
+            payload = self.dirty[flag]
+        self.dirty[flag] = payload
+        self._schedule()
+    
+    def defer(self, task):
+        """Queue a chunked job: task() returning True is run again later"""
+        self.deferred.append(task)
+        self._schedule()
+    
+    def cancel(self, flag):
+        """Forget a pending flag"""
+        self.dirty.pop(flag, None)
+    
+    def _schedule(self):
+        if self._job is None:
+            try:
+                self._job = self.widget.after_idle(self.flush)
+            except Exception:
+                self._job = None  # widget destroyed
+    
+    def flush(self):
+        """Run dirty handlers, then deferred jobs, within the frame budget"""
+        self._job = None
+        deadline = time.perf_counter() + self.budget
+        
+        for flag, callback in list(self.handlers.items()):
+            if flag not in self.dirty:
+                continue
+            if time.perf_counter() > deadline:
+                break
+            payload = self.dirty.pop(flag)
+            try:
+                callback(payload)
+            except Exception as e:
+                print(f"Error refreshing {flag}: {e}")
+        
+        for flag in [flag for flag in self.dirty if flag not in self.handlers]:
+            del self.dirty[flag]
+        
+        while self.deferred and time.perf_counter() < deadline:
+            task = self.deferred.popleft()
+            try:
+                if task():
+                    self.deferred.append(task)
+            except Exception as e:
+                print(f"Error in deferred editor task: {e}")
+        
+        if self.dirty or self.deferred:
+            self._schedule()
@@ -0,0 +1,88 @@
+# Incremental document statistics for the status bar
+
+def count_words(chunks):
+    """Count whitespace-separated words over a sequence of text chunks"""
+    words = 0
+    joined = False  # previous chunk ended inside a word
+    for chunk in chunks:
+        if not chunk:
+            continue
+        words += len(chunk.split())
+        if joined and not chunk[0].isspace():
+            words -= 1  # the word continues across the chunk boundary
+        joined = not chunk[-1].isspace()
+    return words
+
+def count_paragraph_starts(lines, previous_blank=True):
+    """Count non-blank lines that follow a blank line (or the start)"""
+    count = 0
+    for line in lines:
+        blank = not line.strip()
+        if previous_blank and not blank:
+            count += 1
+        previous_blank = blank
+    return count, previous_blank
+
+class DocumentStatistics:
+    """Line, word, character and paragraph counts kept current from edit deltas"""
+    
+    SELECTION_WORD_LIMIT = 4 * 1024 * 1024
+    
+    def __init__(self, document):
+        self.document = document
+        self.words = 0
+        self.paragraphs = 0
+        self.recount()
+        document.add_listener(self.on_edit)
+    
+    @property
+    def chars(self):
+        """Number of characters in the document"""
+        return len(self.document)
+    
+    @property
+    def lines(self):
+        """Number of lines in the document"""
+        return self.document.line_count
+    
+    def recount(self):
+        """Count everything from scratch"""
+        self.words = count_words(self.document.table.iter_chunks())
+        self.paragraphs = count_paragraph_starts(self.document.get_text().split('\n'))[0]
+    
+    def _paragraphs(self, text, previous_blank, next_line):
+        count, last_blank = count_paragraph_starts(text.split('\n'), previous_blank)
+        if next_line is not None and last_blank and next_line.strip():
+            count += 1
+        return count
+    
+    def on_edit(self, edit):
+        """Update the counts from the lines touched by an edit"""
+        document = self.document
+        first = edit.start_line
+        last = first + edit.inserted_lines
+        start = document.lines.line_start(first)
+        
+        # The touched lines after the edit, and the same lines before it
+        new_text = document.get_text(start, document.lines.line_end(last))
+        pos = edit.offset - start
+        old_text = new_text[:pos] + edit.removed + new_text[pos + len(edit.inserted):]
+        
+        self.words += len(new_text.split()) - len(old_text.split())
+        
+        previous_blank = first == 1 or not document.get_line(first - 1).strip()
+        next_line = document.get_line(last + 1) if last < document.line_count else None
+        self.paragraphs += (self._paragraphs(new_text, previous_blank, next_line)
+                            - self._paragraphs(old_text, previous_blank, next_line))
+    
+    def selection_counts(self, first_index, last_index):
+        """Return (chars, words) for a range without copying it out of Tk.
+        
+        Words are None when the selection is too large to count quickly.
+        """
+        first = self.document.index_to_offset(first_index)
+        last = self.document.index_to_offset(last_index)
+        chars = max(0, last - first)
+        if chars > self.SELECTION_WORD_LIMIT:
+            return chars, None
+        return chars, count_words(self.document.table.iter_chunks(first, last))
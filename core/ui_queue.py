@@ -0,0 +1,65 @@
+# Hand-off of worker thread results to the Tk thread
+import queue
+
+class UiQueue:
+    """Callbacks posted by worker threads and run on the UI thread.
+    
+    Tk must only be called from the thread running the main loop, so a
+    worker never calls widget.after itself. The UI thread announces each
+    result it waits for with expect(widget), which starts polling through
+    after() on the widget's root window; workers hand the result over with
+    post(callback), which only touches a thread-safe queue. Polling stops
+    once every expected result has arrived.
+    """
+    
+    POLL_INTERVAL = 10  # ms
+    
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._pending = 0  # results expected by the UI thread
+        self._root = None
+        self._job = None
+    
+    def expect(self, widget):
+        """UI thread: a worker will post one callback (or cancel())"""
+        self._pending += 1
+        if self._job is None:
+            self._root = widget._root() if hasattr(widget, '_root') else widget
+            self._job = self._root.after(self.POLL_INTERVAL, self.poll)
+    
+    def post(self, callback):
+        """Any thread: run callback() on the UI thread"""
+        self._queue.put(callback)
+    
+    def cancel(self):
+        """Any thread: an expected callback will not be posted after all"""
+        self._queue.put(None)
+    
+    def poll(self):
+        """UI thread: run the callbacks posted so far"""
+        self._job = None
+        while True:
+            try:
+                callback = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._pending -= 1
+            if callback is None:
+                continue
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error handling background result: {e}")
+        if self._pending > 0 and self._root is not None:
+            try:
+                self._job = self._root.after(self.POLL_INTERVAL, self.poll)
+            except Exception:
+                self._job = None  # the application is closing
+    
+    @property
+    def pending(self):
+        """Number of results still expected"""
+        return self._pending
+
+# Global UI hand-off queue
+ui_queue = UiQueue()
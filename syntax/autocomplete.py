@@ -1,107 +1,79 @@
 # Auto-completion system for NoteSharp
 import tkinter as tk
 import re
-import keyword
 from pathlib import Path
+from config import Config
+from syntax.languages import get_language
+from syntax.completion_providers import CompletionRequest, completion_worker
+from syntax.completion_providers import DocumentProvider, LanguageProvider, OpenTabsProvider, WorkspaceProvider
+from syntax.ranking import completion_stats
+from syntax.word_index import WORD, WordIndex
+from syntax.workspace_index import workspace_index
+from ui.completion_popup import CompletionPopup
 
 class AutoComplete:
     """Basic auto-completion system"""
     
-    def __init__(self, text_widget):
+    def __init__(self, text_widget, document=None, scheduler=None):
         self.text_widget = text_widget
+        self.document = document
+        self.scheduler = scheduler
         self.language = 'text'
-        self.completion_window = None
-        self.completion_list = []
-        self.current_completions = []
-        
-        # Language-specific completions
-        self.completions = {
-            'python': {
-                'keywords': keyword.kwlist,
-                'builtins': ['abs', 'all', 'any', 'ascii', 'bin', 'bool', 'bytearray', 'bytes', 
-                           'callable', 'chr', 'classmethod', 'compile', 'complex', 'delattr', 
-                           'dict', 'dir', 'divmod', 'enumerate', 'eval', 'exec', 'filter', 
-                           'float', 'format', 'frozenset', 'getattr', 'globals', 'hasattr', 
-                           'hash', 'help', 'hex', 'id', 'input', 'int', 'isinstance', 
-                           'issubclass', 'iter', 'len', 'list', 'locals', 'map', 'max', 
-                           'memoryview', 'min', 'next', 'object', 'oct', 'open', 'ord', 
-                           'pow', 'print', 'property', 'range', 'repr', 'reversed', 'round', 
-                           'set', 'setattr', 'slice', 'sorted', 'staticmethod', 'str', 'sum', 
-                           'super', 'tuple', 'type', 'vars', 'zip'],
-                'snippets': {
-                    'def': 'def function_name():\n    pass',
-                    'class': 'class ClassName:\n    def __init__(self):\n        pass',
-                    'if': 'if condition:\n    pass',
-                    'for': 'for item in iterable:\n    pass',
-                    'while': 'while condition:\n    pass',
-                    'try': 'try:\n    pass\nexcept Exception as e:\n    pass',
-                    'with': 'with open("file.txt") as f:\n    pass'
-                }
-            },
-            'javascript': {
-                'keywords': ['abstract', 'await', 'boolean', 'break', 'byte', 'case', 'catch', 
-                           'char', 'class', 'const', 'continue', 'debugger', 'default', 'delete', 
-                           'do', 'double', 'else', 'enum', 'export', 'extends', 'false', 'final', 
-                           'finally', 'float', 'for', 'function', 'goto', 'if', 'implements', 
-                           'import', 'in', 'instanceof', 'int', 'interface', 'let', 'long', 
-                           'native', 'new', 'null', 'package', 'private', 'protected', 'public', 
-                           'return', 'short', 'static', 'super', 'switch', 'synchronized', 'this', 
-                           'throw', 'throws', 'transient', 'true', 'try', 'typeof', 'var', 'void', 
-                           'volatile', 'while', 'with', 'yield'],
-                'builtins': ['Array', 'Boolean', 'Date', 'Error', 'Function', 'JSON', 'Math', 
-                           'Number', 'Object', 'RegExp', 'String', 'console', 'document', 
-                           'window', 'undefined', 'NaN', 'Infinity'],
-                'snippets': {
-                    'function': 'function functionName() {\n    \n}',
-                    'if': 'if (condition) {\n    \n}',
-                    'for': 'for (let i = 0; i < length; i++) {\n    \n}',
-                    'while': 'while (condition) {\n    \n}',
-                    'try': 'try {\n    \n} catch (error) {\n    \n}',
-                    'class': 'class ClassName {\n    constructor() {\n        \n    }\n}'
-                }
-            },
-            'html': {
-                'keywords': ['html', 'head', 'body', 'div', 'span', 'p', 'a', 'img', 'ul', 'ol', 
-                           'li', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'table', 'tr', 'td', 'th', 
-                           'form', 'input', 'button', 'select', 'option', 'textarea', 'script', 
-                           'style', 'link', 'meta', 'title'],
-                'snippets': {
-                    'html5': '<!DOCTYPE html>\n<html lang="en">\n<head>\n    <meta charset="UTF-8">\n    <meta name="viewport" content="width=device-width, initial-scale=1.0">\n    <title>Document</title>\n</head>\n<body>\n    \n</body>\n</html>',
-                    'div': '<div>\n    \n</div>',
-                    'form': '<form>\n    <input type="text" name="" id="">\n    <button type="submit">Submit</button>\n</form>'
-                }
-            },
-            'css': {
-                'keywords': ['color', 'background', 'font-size', 'font-family', 'margin', 'padding', 
-                           'border', 'width', 'height', 'display', 'position', 'top', 'right', 
-                           'bottom', 'left', 'float', 'clear', 'text-align', 'font-weight', 
-                           'text-decoration', 'line-height', 'letter-spacing', 'word-spacing', 
-                           'vertical-align', 'white-space', 'list-style', 'cursor', 'overflow', 
-                           'visibility', 'z-index', 'opacity', 'transform', 'transition', 
-                           'animation', 'box-shadow', 'border-radius', 'flex', 'grid'],
-                'snippets': {
-                    'flex': 'display: flex;\njustify-content: center;\nalign-items: center;',
-                    'grid': 'display: grid;\ngrid-template-columns: repeat(auto-fit, minmax(200px, 1fr));\ngap: 1rem;',
-                    'center': 'margin: 0 auto;\ntext-align: center;'
-                }
-            }
-        }
-        
-        # Bind events
-        self.text_widget.bind('<KeyRelease>', self.on_key_release)
-        self.text_widget.bind('<Button-1>', self.hide_completion)
+        self.popup = CompletionPopup(text_widget, self.accept_completion)
+        self.request = None  # lookup of the completions shown (or on their way)
+        self.matcher = None  # merges the results of self.request
+        self._focus_check = None  # pending check after the text lost the focus
+        
+        # Language-specific completions come from the shared registry
+        self.definition = None
+        
+        # Document words, kept up to date edit by edit
+        self.words = WordIndex(document, text_widget) if document is not None else None
+        if self.words is not None:
+            workspace_index.add_document(self.words)
+        if document is not None:
+            document.add_listener(lambda edit: self.cancel_request())
+        
+        # Sources of completions, queried in order
+        self.providers = [LanguageProvider(self), DocumentProvider(self), OpenTabsProvider(self), WorkspaceProvider()]
+        
+        # Bind events (navigation keys drive the popup while it is shown)
+        self.text_widget.bind('<KeyRelease>', self.on_key_release, add='+')
+        self.text_widget.bind('<Button-1>', self.hide_completion, add='+')
+        self.text_widget.bind('<FocusOut>', self.on_focus_out, add='+')
+        for key, delta in (('<Down>', 1), ('<Up>', -1), ('<Next>', CompletionPopup.ROWS), ('<Prior>', -CompletionPopup.ROWS)):
+            self.text_widget.bind(key, lambda e, delta=delta: self.move_selection(delta), add='+')
+        self.text_widget.bind('<Return>', self.on_accept_key, add='+')
+        self.text_widget.bind('<Tab>', self.on_accept_key, add='+')
+        self.text_widget.bind('<Escape>', self.on_escape, add='+')
+        if self.scheduler:
+            self.scheduler.register('completion', self.update_completion)
+    
+    def add_provider(self, provider):
+        """Add a source of completions (see CompletionProvider)"""
+        self.providers.append(provider)
     
     def set_language(self, language):
         """Set the current language for completions"""
         self.language = language.lower()
+        self.definition = get_language(self.language)
     
     def on_key_release(self, event):
         """Handle key release events"""
-        if event.keysym in ['Up', 'Down', 'Left', 'Right', 'Return', 'Tab']:
+        if event.keysym in ['Up', 'Down', 'Prior', 'Next'] and self.popup.visible:
+            return  # moving through the list
+        if event.keysym in ['Up', 'Down', 'Left', 'Right', 'Return', 'Tab', 'Escape']:
             self.hide_completion()
             return
         
-        # Get current word
+        # Coalesce fast typing into one lookup per idle cycle
+        if self.scheduler:
+            self.scheduler.mark('completion')
+        else:
+            self.update_completion()
+    
+    def update_completion(self, payload=None):
+        """Show or hide completions for the word at the cursor"""
         current_word = self.get_current_word()
         
         if len(current_word) >= 2:  # Start completion after 2 characters
@@ -119,103 +91,135 @@ class AutoComplete:
         match = re.search(r'\b(\w+)$', line_text)
         return match.group(1) if match else ''
     
-    def get_completions(self, prefix):
-        """Get completions for the given prefix"""
-        completions = []
-        
-        if self.language in self.completions:
-            lang_completions = self.completions[self.language]
-            
-            # Add keywords
-            if 'keywords' in lang_completions:
-                completions.extend([kw for kw in lang_completions['keywords'] 
-                                  if kw.startswith(prefix.lower())])
-            
-            # Add builtins
-            if 'builtins' in lang_completions:
-                completions.extend([bi for bi in lang_completions['builtins'] 
-                                  if bi.lower().startswith(prefix.lower())])
-            
-            # Add snippets
-            if 'snippets' in lang_completions:
-                completions.extend([sn for sn in lang_completions['snippets'].keys() 
-                                  if sn.startswith(prefix.lower())])
-        
-        # Add words from current document
-        document_words = self.get_document_words()
-        completions.extend([word for word in document_words 
-                          if word.lower().startswith(prefix.lower()) and word != prefix])
-        
-        # Remove duplicates and sort
-        completions = sorted(list(set(completions)))
-        
-        return completions[:10]  # Limit to 10 completions
+    def get_completions(self, prefix, limit=10):
+        """Get the best completions for the typed word from every provider, waiting for all"""
+        request = CompletionRequest(prefix, limit=limit)
+        matcher = request.matcher()
+        for provider in self.providers:
+            provider.provide(request, matcher)
+        return matcher.best()
     
     def get_document_words(self):
         """Extract words from the current document"""
+        if self.words is not None:
+            return [word for lower, word, mask in self.words.keys]
         content = self.text_widget.get('1.0', 'end-1c')
-        words = re.findall(r'\b\w{3,}\b', content)  # Words with 3+ characters
-        return list(set(words))
+        return list(set(WORD.findall(content)))
     
     def show_completion(self, prefix):
-        """Show completion popup"""
-        completions = self.get_completions(prefix)
-        
-        if not completions:
-            self.hide_completion()
+        """Look up completions on the worker: the quick providers in one job, each slow one in its own"""
+        self.cancel_request()
+        version = self.document.version if self.document is not None else None
+        request = CompletionRequest(prefix, version, Config.COMPLETION_MAX_ITEMS)
+        self.request = request
+        self.matcher = request.matcher()
+        quick = [(provider, provider.snapshot(request)) for provider in self.providers if not provider.slow]
+        jobs = [quick] + [[(provider, provider.snapshot(request))] for provider in self.providers if provider.slow]
+        for snapshots in jobs:
+            completion_worker.submit(request, snapshots, self.text_widget, self.on_provider_results)
+    
+    def on_provider_results(self, request, matches):
+        """Merge the matches of a worker job, unless the request is stale"""
+        if request is not self.request or request.cancelled:
             return
-        
-        # Hide existing completion window
-        self.hide_completion()
-        
-        # Create completion window
-        self.completion_window = tk.Toplevel(self.text_widget)
-        self.completion_window.wm_overrideredirect(True)
-        self.completion_window.configure(bg='white', relief='solid', bd=1)
-        
-        # Position the window
-        cursor_pos = self.text_widget.index(tk.INSERT)
-        x, y, _, _ = self.text_widget.bbox(cursor_pos)
+        if self.document is not None and self.document.version != request.version:
+            return
+        self.matcher.merge(matches)
+        self.show_matches(keep_selection=self.popup.visible)
+    
+    def show_matches(self, keep_selection=False):
+        """Show the best matches of the current request"""
+        completions = self.matcher.best()
+        
+        # Position the popup under the cursor (hidden when the cursor is scrolled away)
+        bbox = self.text_widget.bbox(tk.INSERT)
+        if not completions or bbox is None:
+            self.popup.hide()  # slower providers may still bring results
+            return
+        x, y, _, height = bbox
         x += self.text_widget.winfo_rootx()
-        y += self.text_widget.winfo_rooty() + 20
-        
-        self.completion_window.geometry(f"+{x}+{y}")
-        
-        # Create listbox with completions
-        listbox = tk.Listbox(
-            self.completion_window,
-            height=min(len(completions), 8),
-            width=max(len(max(completions, key=len)), 15),
-            font=('Consolas', 10)
-        )
-        listbox.pack()
-        
-        for completion in completions:
-            listbox.insert(tk.END, completion)
+        y += self.text_widget.winfo_rooty() + height + 2
         
-        # Select first item
-        if completions:
-            listbox.selection_set(0)
-            listbox.activate(0)
-        
-        # Bind events
-        listbox.bind('<Double-Button-1>', lambda e: self.insert_completion(prefix, listbox.get(listbox.curselection())))
-        listbox.bind('<Return>', lambda e: self.insert_completion(prefix, listbox.get(listbox.curselection())))
-        listbox.focus_set()
-        
-        self.current_completions = completions
+        # The same window is moved and refilled on every keystroke
+        self.popup.show(completions, x, y, keep_selection)
+    
+    def cancel_request(self):
+        """Drop the pending lookup (the text changed or the popup closed)"""
+        if self.request is not None:
+            self.request.cancel()
+            self.request = None
+    
+    def move_selection(self, delta):
+        """Move through the shown completions; the keys move the cursor otherwise"""
+        if not self.popup.visible:
+            return None
+        self.popup.move(delta)
+        return 'break'
+    
+    def on_accept_key(self, event=None):
+        """Insert the selected completion on Return/Tab while the popup is shown"""
+        completion = self.popup.selection()
+        if completion is None:
+            return None
+        self.accept_completion(completion)
+        return 'break'
+    
+    def on_escape(self, event=None):
+        """Close the popup, leaving Escape to the editor when none is shown"""
+        if not self.popup.visible:
+            return None
+        if self.scheduler:
+            self.scheduler.cancel('completion')
+        self.hide_completion()
+        return 'break'
+    
+    def accept_completion(self, completion):
+        """Replace the word at the cursor by a chosen completion"""
+        if self.scheduler:
+            self.scheduler.cancel('completion')  # a lookup still queued would reopen the popup
+        self.insert_completion(self.get_current_word(), completion)
+    
+    def close(self):
+        """Stop completing from this document (its tab is closing)"""
+        self.cancel_request()
+        if self._focus_check is not None:
+            self.text_widget.after_cancel(self._focus_check)
+            self._focus_check = None
+        self.popup.destroy()
+        if self.words is not None:
+            workspace_index.remove_document(self.words)
+    
+    def on_focus_out(self, event=None):
+        """Hide the popup once the focus has really gone elsewhere.
+        
+        Clicking the popup can take the focus from the text before the
+        click reaches the list, so the check waits until the pending
+        events are handled and keeps the popup while the focus is back in
+        the text or the pointer is over the popup.
+        """
+        if self.popup.visible and self._focus_check is None:
+            self._focus_check = self.text_widget.after_idle(self.check_focus)
+    
+    def check_focus(self):
+        """Idle callback of on_focus_out"""
+        self._focus_check = None
+        try:
+            focus = self.text_widget.focus_get()
+        except (KeyError, tk.TclError):
+            focus = None  # the focus is in a dialog or another application
+        if focus is not self.text_widget and not self.popup.contains_pointer():
+            self.hide_completion()
     
     def hide_completion(self, event=None):
         """Hide completion popup"""
-        if self.completion_window:
-            self.completion_window.destroy()
-            self.completion_window = None
-            self.current_completions = []
+        self.cancel_request()
+        self.popup.hide()
     
     def insert_completion(self, prefix, completion):
         """Insert selected completion"""
         if not completion:
             return
+        completion_stats.accept(completion)
         
         # Get cursor position
         cursor_pos = self.text_widget.index(tk.INSERT)
@@ -228,11 +232,8 @@ class AutoComplete:
         self.text_widget.delete(start_pos, cursor_pos)
         
         # Check if it's a snippet
-        if (self.language in self.completions and 
-            'snippets' in self.completions[self.language] and 
-            completion in self.completions[self.language]['snippets']):
-            
-            snippet = self.completions[self.language]['snippets'][completion]
+        if self.definition is not None and completion in self.definition.snippets:
+            snippet = self.definition.snippets[completion]
             self.text_widget.insert(start_pos, snippet)
         else:
             self.text_widget.insert(start_pos, completion)
@@ -0,0 +1,544 @@
+# Bracket pair index: matching brackets and nesting depth in logarithmic time
+import re
+import threading
+from bisect import bisect_left
+from itertools import accumulate
+
+from core.document import join_snapshot
+from core.ui_queue import ui_queue
+from syntax.languages import get_language
+
+# Strings and comments are matched whole so the brackets inside them are
+# skipped. These only see one line: tokens spanning lines (block comments,
+# triple-quoted strings, template literals) are tracked by BracketScanner
+# from the language's multi-line rules.
+_STRING = r'"(?:[^"\\\n]|\\.)*"?|\'(?:[^\'\\\n]|\\.)*\'?'
+_BRACKET = r'[{}[\]()]'
+
+BRACKETS = re.compile(rf'{_STRING}|//.*|/\*.*?(?:\*/|$)|{_BRACKET}', re.M)
+# Rust: single quotes also start lifetimes, so only char literals are skipped
+RUST_BRACKETS = re.compile(r'"(?:[^"\\\n]|\\.)*"?|\'(?:\\.[^\'\n]*|[^\'\\\n])\'|//.*|/\*.*?(?:\*/|$)|' + _BRACKET, re.M)
+HASH_BRACKETS = re.compile(rf'{_STRING}|#.*|{_BRACKET}', re.M)
+SQL_BRACKETS = re.compile(rf'{_STRING}|--.*|/\*.*?(?:\*/|$)|{_BRACKET}', re.M)
+
+OPENERS = '{[('
+CLOSERS = '}])'
+
+_SCANNERS = {
+    'javascript': BRACKETS, 'typescript': BRACKETS, 'json': BRACKETS, 'c': BRACKETS, 'cpp': BRACKETS,
+    'java': BRACKETS, 'go': BRACKETS, 'php': BRACKETS, 'css': BRACKETS, 'scss': BRACKETS,
+    'rust': RUST_BRACKETS,
+    'python': HASH_BRACKETS, 'ruby': HASH_BRACKETS, 'yaml': HASH_BRACKETS,
+    'sql': SQL_BRACKETS,
+}
+
+_INF = 1 << 60
+
+_compiled = {}  # language -> BracketScanner, shared by all tabs
+
+class BracketScanner:
+    """Finds the brackets of a language outside strings and comments.
+    
+    Lines are scanned from the state they start in, as the lexer does:
+    None, or the name of the multi-line token left open by the line
+    before, whose closer is looked for first. The language's multi-line
+    openers are tried before the single-line regex, and one left open
+    hides the rest of its line and carries over to the next.
+    
+    With resumable, a rescan may start right after any bracket. Rust
+    scanners are not: a quote before a bracket becomes a char literal
+    hiding it once the closing quote is typed after it.
+    """
+    
+    def __init__(self, regex, multiline=(), resumable=True):
+        self.resumable = resumable
+        openers = []
+        self.closers = {}  # multi-line alternative name -> closer regex
+        for i, (tag, opener, closer) in enumerate(multiline):
+            name = f"m{i}"
+            openers.append(f"(?P<{name}>{opener})")
+            self.closers[name] = re.compile(closer)
+        self.regex = re.compile('|'.join(openers + [f"(?:{regex.pattern})"]), re.M)
+    
+    def scan_line(self, line, state=None, base=0):
+        """(offsets from base, depth deltas, end state) of the brackets of one line"""
+        offsets = []
+        deltas = []
+        pos = 0
+        if state is not None:
+            match = self.closers[state].match(line)
+            if match is None:
+                return offsets, deltas, state
+            pos = match.end()
+        search = self.regex.search
+        while True:
+            match = search(line, pos)
+            if match is None:
+                return offsets, deltas, None
+            name = match.lastgroup
+            pos = match.end()
+            if name is not None:
+                end = self.closers[name].match(line, pos)
+                if end is None:
+                    return offsets, deltas, name
+                pos = end.end()
+                continue
+            char = match.group()
+            if char in OPENERS:
+                offsets.append(base + match.start())
+                deltas.append(1)
+            elif char in CLOSERS:
+                offsets.append(base + match.start())
+                deltas.append(-1)
+    
+    def scan(self, text):
+        """(offsets, depth deltas, end state of each line) of a whole text"""
+        offsets = []
+        deltas = []
+        states = []
+        state = None
+        base = 0
+        for line in text.split('\n'):
+            line_offsets, line_deltas, state = self.scan_line(line, state, base)
+            offsets += line_offsets
+            deltas += line_deltas
+            states.append(state)
+            base += len(line) + 1
+        return offsets, deltas, states
+
+def bracket_scanner(language):
+    """BracketScanner for a language, or None if it has no brackets to match"""
+    scanner = _compiled.get(language)
+    if scanner is None and language in _SCANNERS:
+        definition = get_language(language)
+        multiline = definition.multiline if definition is not None else ()
+        scanner = _compiled[language] = BracketScanner(_SCANNERS[language], multiline,
+                                                       resumable=_SCANNERS[language] is not RUST_BRACKETS)
+    return scanner
+
+class _Block:
+    """A run of brackets; real offsets are the stored ones plus shift"""
+    
+    __slots__ = ('offsets', 'deltas', 'shift')
+    
+    def __init__(self, offsets, deltas, shift=0):
+        self.offsets = offsets
+        self.deltas = deltas
+        self.shift = shift
+
+class BracketIndex:
+    """Every bracket of a document outside strings and comments.
+    
+    Brackets are kept in document order in blocks of about BLOCK_SIZE,
+    each with a +1/-1 depth delta. A segment tree over the blocks stores
+    each block's net delta, lowest prefix and highest suffix, so the match
+    of a bracket is found by descending the tree instead of walking the
+    text between the two: O(log n + BLOCK_SIZE) even on a minified file.
+    
+    The index is built once per language in a worker thread, along with
+    the scanner state at the end of every line; edits made meanwhile are
+    replayed on its result. Edits then rescan only
+    from the last bracket before the change, stopping as soon as the
+    brackets found line up with the old ones again, or once past the
+    edited lines the end-of-line state is the old one again. Offsets
+    after an edit are shifted lazily per block, like LineStartIndex does.
+    """
+    
+    BLOCK_SIZE = 256
+    RESCAN_LINES = 2000  # lines rescanned after an edit before rebuilding in the background instead
+    
+    def __init__(self, document, text_widget=None):
+        self.document = document
+        self.text_widget = text_widget  # None: build synchronously
+        self.scanner = None
+        self.blocks = []
+        self.line_states = []  # scanner state at the end of each line
+        self.ready = False
+        self._job = 0
+        self._edits = None  # edits since the running build's snapshot, replayed when it is installed
+        self._shift_from = 0  # blocks from here on are stored _shift too low
+        self._shift = 0
+        self._rebuild_tree()
+        document.add_listener(self.on_edit)
+    
+    def set_language(self, language):
+        """Pick the scanner for a language and rebuild the index"""
+        self.scanner = bracket_scanner(language)
+        self.blocks = []
+        self.line_states = []
+        self.ready = False
+        self._job += 1
+        self._edits = None
+        if self.scanner:
+            self.build()
+    
+    # Building
+    
+    def build(self):
+        """Index the whole document (in a worker thread when there is a widget)"""
+        self._job += 1
+        self._edits = []
+        job, version = self._job, self.document.version
+        if self.text_widget is None:
+            self._install(job, version, *self.scanner.scan(self.document.get_text()))
+            return
+        spans = self.document.snapshot()
+        ui_queue.expect(self.text_widget)
+        threading.Thread(target=self._scan_snapshot, args=(job, self.scanner, spans, version), daemon=True).start()
+    
+    def _scan_snapshot(self, job, scanner, spans, version):
+        """Worker: scan a document snapshot"""
+        try:
+            offsets, deltas, states = scanner.scan(join_snapshot(spans))
+            ui_queue.post(lambda: self._install(job, version, offsets, deltas, states))
+        except Exception as e:
+            ui_queue.cancel()
+            print(f"Error indexing brackets: {e}")
+    
+    def _install(self, job, version, offsets, deltas, states):
+        """Main thread: adopt a scan, rescanning the text edited since its snapshot"""
+        if job != self._job:
+            return  # superseded
+        size = self.BLOCK_SIZE
+        self.blocks = [_Block(offsets[i:i + size], deltas[i:i + size]) for i in range(0, len(offsets), size)]
+        self.line_states = states
+        self._shift_from = len(self.blocks)
+        self._shift = 0
+        self._rebuild_tree()
+        edits, self._edits = self._edits, None
+        if not edits:
+            self.ready = True
+            return
+        
+        # Drop and shift the brackets edit by edit, tracking the edited
+        # span in the current text, then rescan that span once
+        low = high = None
+        for edit in edits:
+            self._apply(edit)
+            offset, delta = edit.offset, len(edit.inserted) - len(edit.removed)
+            if low is None:
+                low, high = offset, offset
+            elif high >= offset + len(edit.removed):
+                high += delta
+            elif high > offset:
+                high = offset
+            low = min(low, offset)
+            high = max(high, offset + len(edit.inserted))
+        self.ready = True
+        lines = self.document.lines
+        self._rescan_edit(low, high, lines.position(low)[0], lines.position(high)[0])
+    
+    # Block offsets
+    
+    def _block_shift(self, b):
+        block = self.blocks[b]
+        return block.shift + self._shift if b >= self._shift_from else block.shift
+    
+    def _settle(self, index):
+        """Move the start of the lazily shifted blocks to index"""
+        shift = self._shift
+        if shift:
+            if index > self._shift_from:
+                for block in self.blocks[self._shift_from:index]:
+                    block.shift += shift
+            else:
+                for block in self.blocks[index:self._shift_from]:
+                    block.shift -= shift
+        self._shift_from = index
+    
+    def _locate(self, offset):
+        """(block, position) of the first bracket at or after offset"""
+        blocks = self.blocks
+        low, high = 0, len(blocks)
+        while low < high:
+            mid = (low + high) // 2
+            if blocks[mid].offsets[-1] + self._block_shift(mid) < offset:
+                low = mid + 1
+            else:
+                high = mid
+        if low == len(blocks):
+            return low, 0
+        return low, bisect_left(blocks[low].offsets, offset - self._block_shift(low))
+    
+    def _offset_at(self, b, i):
+        return self.blocks[b].offsets[i] + self._block_shift(b)
+    
+    def _find(self, offset):
+        """(block, position) of the bracket at offset, or None"""
+        b, i = self._locate(offset)
+        if b < len(self.blocks) and self._offset_at(b, i) == offset:
+            return b, i
+        return None
+    
+    # Segment tree over the blocks
+    
+    def _rebuild_tree(self):
+        size = 1
+        while size < len(self.blocks):
+            size *= 2
+        self._size = size
+        self._net = [0] * (2 * size)
+        self._low = [_INF] * (2 * size)
+        self._high = [-_INF] * (2 * size)
+        for b in range(len(self.blocks)):
+            self._set_leaf(b)
+        for node in range(size - 1, 0, -1):
+            self._pull(node)
+    
+    def _set_leaf(self, b):
+        """Net delta, lowest prefix and highest suffix of a block"""
+        deltas = self.blocks[b].deltas
+        node = self._size + b
+        if not deltas:
+            self._net[node], self._low[node], self._high[node] = 0, _INF, -_INF
+            return
+        prefixes = list(accumulate(deltas))
+        net = prefixes[-1]
+        self._net[node] = net
+        self._low[node] = min(prefixes)
+        self._high[node] = net - min(0, min(prefixes[:-1], default=0))
+    
+    def _pull(self, node):
+        left, right = 2 * node, 2 * node + 1
+        net, low, high = self._net, self._low, self._high
+        net[node] = net[left] + net[right]
+        low[node] = min(low[left], net[left] + low[right])
+        high[node] = max(high[right], net[right] + high[left])
+    
+    def _update_tree(self, b):
+        self._set_leaf(b)
+        node = (self._size + b) // 2
+        while node:
+            self._pull(node)
+            node //= 2
+    
+    def _nodes(self, first, last):
+        """Tree nodes covering blocks first..last-1, left to right"""
+        first += self._size
+        last += self._size
+        left, right = [], []
+        while first < last:
+            if first & 1:
+                left.append(first)
+                first += 1
+            if last & 1:
+                last -= 1
+                right.append(last)
+            first //= 2
+            last //= 2
+        return left + right[::-1]
+    
+    def _search_forward(self, b, i):
+        """First bracket after (b, i) where the depth falls below the depth before it"""
+        deltas = self.blocks[b].deltas
+        depth = 0
+        for j in range(i + 1, len(deltas)):
+            depth += deltas[j]
+            if depth < 0:
+                return b, j
+        for node in self._nodes(b + 1, len(self.blocks)):
+            if depth + self._low[node] >= 0:
+                depth += self._net[node]
+                continue
+            while node < self._size:
+                node *= 2
+                if depth + self._low[node] >= 0:
+                    depth += self._net[node]
+                    node += 1
+            b = node - self._size
+            for j, delta in enumerate(self.blocks[b].deltas):
+                depth += delta
+                if depth < 0:
+                    return b, j
+        return None
+    
+    def _search_backward(self, b, i):
+        """Last bracket before (b, i) opening a level still open at (b, i)"""
+        depth = 0
+        if b < len(self.blocks):
+            deltas = self.blocks[b].deltas
+            for j in range(i - 1, -1, -1):
+                depth += deltas[j]
+                if depth > 0:
+                    return b, j
+        for node in reversed(self._nodes(0, min(b, len(self.blocks)))):
+            if depth + self._high[node] <= 0:
+                depth += self._net[node]
+                continue
+            while node < self._size:
+                node = 2 * node + 1
+                if depth + self._high[node] <= 0:
+                    depth += self._net[node]
+                    node -= 1
+            b = node - self._size
+            deltas = self.blocks[b].deltas
+            for j in range(len(deltas) - 1, -1, -1):
+                depth += deltas[j]
+                if depth > 0:
+                    return b, j
+        return None
+    
+    # Queries
+    
+    def is_bracket(self, offset):
+        """Whether there is an indexed bracket at offset"""
+        return self.ready and self._find(offset) is not None
+    
+    def match(self, offset):
+        """Offset of the bracket matching the one at offset, or None"""
+        if not self.ready:
+            return None
+        found = self._find(offset)
+        if found is None:
+            return None
+        b, i = found
+        if self.blocks[b].deltas[i] > 0:
+            found = self._search_forward(b, i)
+        else:
+            found = self._search_backward(b, i)
+        return self._offset_at(*found) if found else None
+    
+    def enclosing(self, offset):
+        """(opening, closing) offsets of the innermost pair around offset.
+        
+        Offset is inside when opening < offset <= closing; closing is None
+        if the bracket is never closed. Returns None outside any pair.
+        """
+        if not self.ready:
+            return None
+        found = self._search_backward(*self._locate(offset))
+        if found is None:
+            return None
+        closing = self._search_forward(*found)
+        return self._offset_at(*found), self._offset_at(*closing) if closing else None
+    
+    def depth_at(self, offset):
+        """Number of brackets opened and not yet closed before offset"""
+        if not self.ready:
+            return 0
+        b, i = self._locate(offset)
+        depth = sum(self._net[node] for node in self._nodes(0, min(b, len(self.blocks))))
+        if b < len(self.blocks):
+            depth += sum(self.blocks[b].deltas[:i])
+        return max(0, depth)
+    
+    # Edits
+    
+    def on_edit(self, edit):
+        """Document listener: drop, shift and rescan the brackets around an edit"""
+        if not self.ready:
+            if self._edits is not None:
+                self._edits.append(edit)  # replayed on the running build
+            return
+        self._apply(edit)
+        self._rescan_edit(edit.offset, edit.offset + len(edit.inserted),
+                          edit.start_line, edit.start_line + edit.inserted_lines)
+    
+    def _apply(self, edit):
+        """Drop the brackets an edit removed and shift the ones after it"""
+        offset = edit.offset
+        self._splice(offset, offset + len(edit.removed), [], [])
+        self._shift_after(offset, len(edit.inserted) - len(edit.removed))
+        
+        # The new lines' end states are unknown; the last edited line keeps
+        # its old one, which still holds past the last bracket before it
+        first, states = edit.start_line, self.line_states
+        last_state = states[first + edit.removed_lines - 1]
+        states[first - 1:first + edit.removed_lines] = [None] * edit.inserted_lines + [last_state]
+    
+    def _rescan_edit(self, offset, new_end, first, last_line):
+        """Rescan the edited text offset..new_end on lines first..last_line"""
+        # Resume at the line's start state, or after the last bracket before
+        # the edit: brackets are only found outside tokens (state None)
+        states = self.line_states
+        start = self.document.lines.line_start(first)
+        state = states[first - 2] if first > 1 else None
+        b, i = self._locate(offset)
+        previous = -1
+        if i:
+            previous = self._offset_at(b, i - 1)
+        elif b:
+            previous = self._offset_at(b - 1, len(self.blocks[b - 1].offsets) - 1)
+        if previous >= start and self.scanner.resumable:
+            start, state = previous + 1, None
+        rescanned = self._rescan(first, start, state, new_end, last_line)
+        if rescanned is None:
+            self.ready = False
+            self.build()
+            return
+        self._splice(start, *rescanned)
+    
+    def _shift_after(self, offset, delta):
+        """Move the brackets at or after offset by delta"""
+        b, i = self._locate(offset)
+        if not delta or b == len(self.blocks):
+            return
+        self._settle(b + 1)
+        block_offsets = self.blocks[b].offsets
+        for j in range(i, len(block_offsets)):
+            block_offsets[j] += delta
+        self._shift += delta
+    
+    def _rescan(self, line, start, state, new_end, last_line):
+        """Scan from start (on line, in state); returns (end, offsets, deltas) of the brackets before end.
+        
+        The scan ends early at an old bracket after the edit: from a token
+        boundary both scans agree, so the rest is unchanged. Otherwise it
+        goes on past last_line until a line ends in its old state again,
+        storing the new end states. Returns None after RESCAN_LINES lines
+        (e.g. a comment opened at the top of a long file).
+        """
+        lines, states = self.document.lines, self.line_states
+        offsets = []
+        deltas = []
+        for line in range(line, lines.line_count + 1):
+            if line - last_line > self.RESCAN_LINES:
+                return None
+            stop = lines.line_end(line)
+            line_offsets, line_deltas, state = self.scanner.scan_line(self.document.get_text(start, stop), state, start)
+            for bracket, delta in zip(line_offsets, line_deltas):
+                if bracket >= new_end and self._find(bracket) is not None:
+                    return bracket, offsets, deltas
+                offsets.append(bracket)
+                deltas.append(delta)
+            if line >= last_line and states[line - 1] == state:
+                break
+            states[line - 1] = state
+            start = stop + 1
+        return stop, offsets, deltas
+    
+    def _splice(self, start, end, offsets, deltas):
+        """Replace the brackets in start..end with the given ones"""
+        b, i = self._locate(start)
+        b2, i2 = self._locate(end)
+        if (b, i) == (b2, i2) and not offsets:
+            return
+        if not self.blocks:
+            self.blocks = [_Block([], [])]
+            self._shift_from = 1
+            self._rebuild_tree()
+        last = len(self.blocks) - 1
+        if b > last:
+            b, i = last, len(self.blocks[last].offsets)
+        if b2 > last:
+            b2, i2 = last, len(self.blocks[last].offsets)
+        self._settle(b2 + 1)
+        
+        block, tail = self.blocks[b], self.blocks[b2]
+        tail_offsets = [o + tail.shift - block.shift for o in tail.offsets[i2:]]
+        tail_deltas = tail.deltas[i2:]
+        block.offsets[i:] = [o - block.shift for o in offsets] + tail_offsets
+        block.deltas[i:] = deltas + tail_deltas
+        
+        size = self.BLOCK_SIZE
+        if b == b2 and block.offsets and len(block.offsets) <= 2 * size:
+            self._update_tree(b)
+            return
+        if len(block.offsets) > 2 * size:
+            pieces = [_Block(block.offsets[k:k + size], block.deltas[k:k + size], block.shift)
+                      for k in range(0, len(block.offsets), size)]
+        else:
+            pieces = [block] if block.offsets else []
+        self.blocks[b:b2 + 1] = pieces
+        self._shift_from = b + len(pieces)
+        self._rebuild_tree()
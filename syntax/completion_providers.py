@@ -0,0 +1,161 @@
+# Completion providers: the sources of completions and the worker ranking them
+import queue
+import threading
+
+from core.ui_queue import ui_queue
+from syntax.ranking import FuzzyMatcher, completion_stats, word_entry
+from syntax.workspace_index import workspace_index
+
+class CompletionRequest:
+    """One completion lookup: the word typed at a document version.
+    
+    A request is cancelled as soon as the document changes again; queued
+    work for it is dropped and running providers stop at their next
+    check of `cancelled`.
+    """
+    
+    def __init__(self, prefix, version=None, limit=10):
+        self.prefix = prefix
+        self.version = version
+        self.limit = limit
+        self.cancelled = False
+    
+    def cancel(self):
+        """Mark the request stale"""
+        self.cancelled = True
+    
+    def matcher(self):
+        """A new FuzzyMatcher for this request's word"""
+        return FuzzyMatcher(self.prefix, completion_stats, self.limit)
+
+class CompletionProvider:
+    """A source of completions.
+    
+    snapshot(request) runs on the UI thread and captures the candidates
+    cheaply, in a form the UI thread will not change afterwards;
+    rank(request, matcher, snapshot) runs on the completion worker and
+    feeds them to the matcher with matcher.add(). By default the snapshot
+    is a list of words, or None for nothing to offer. Slow providers get a
+    worker job of their own, so the matches of the others are shown
+    without waiting for them.
+    """
+    
+    slow = False
+    
+    def snapshot(self, request):
+        return None
+    
+    def rank(self, request, matcher, snapshot):
+        if snapshot:
+            matcher.add(map(word_entry, snapshot), exclude=request.prefix)
+    
+    def provide(self, request, matcher):
+        """Snapshot and rank at once, on the calling thread"""
+        self.rank(request, matcher, self.snapshot(request))
+
+class LanguageProvider(CompletionProvider):
+    """Keywords, builtins and snippets of the editor's language"""
+    
+    def __init__(self, auto_complete):
+        self.auto_complete = auto_complete
+    
+    def snapshot(self, request):
+        return self.auto_complete.definition  # read-only, shared by all tabs
+    
+    def rank(self, request, matcher, definition):
+        if definition is not None:
+            matcher.add(map(word_entry, definition.keywords))
+            matcher.add(map(word_entry, definition.builtins))
+            matcher.add(map(word_entry, definition.snippets.keys()))
+
+class DocumentProvider(CompletionProvider):
+    """Words of the edited document"""
+    
+    def __init__(self, auto_complete):
+        self.auto_complete = auto_complete
+    
+    def snapshot(self, request):
+        words = self.auto_complete.words
+        if words is not None:
+            return words.snapshot()
+        return self.auto_complete.get_document_words()
+    
+    def rank(self, request, matcher, words):
+        if isinstance(words, list):
+            super().rank(request, matcher, words)
+        else:
+            words.fuzzy(matcher, exclude=request.prefix, cancelled=lambda: request.cancelled)
+
+class OpenTabsProvider(CompletionProvider):
+    """Words of the other open tabs"""
+    
+    def __init__(self, auto_complete):
+        self.auto_complete = auto_complete
+    
+    def snapshot(self, request):
+        return workspace_index.document_snapshots(skip=self.auto_complete.words)
+    
+    def rank(self, request, matcher, documents):
+        for words in documents:
+            words.fuzzy(matcher, exclude=request.prefix, cancelled=lambda: request.cancelled)
+
+class WorkspaceProvider(CompletionProvider):
+    """Words of the files under the workspace root"""
+    
+    slow = True
+    
+    def rank(self, request, matcher, snapshot):
+        workspace_index.fuzzy_files(matcher, exclude=request.prefix, cancelled=lambda: request.cancelled)
+
+class CompletionWorker:
+    """Thread ranking completions, one job at a time.
+    
+    A job ranks the snapshots of one or more providers into a matcher of
+    its own; the matches are handed to callback(request, matches) on the
+    UI thread through ui_queue. Jobs of cancelled requests are skipped,
+    both before they start and when they finish.
+    """
+    
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+    
+    def submit(self, request, snapshots, widget, callback):
+        """Queue ranking [(provider, snapshot), ...] for request (UI thread when widget is given)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        if widget is not None:
+            ui_queue.expect(widget)
+        self._queue.put((request, snapshots, widget, callback))
+    
+    def wait(self):
+        """Block until every queued job has run"""
+        self._queue.join()
+    
+    def _run(self):
+        while True:
+            request, snapshots, widget, callback = self._queue.get()
+            delivered = False
+            try:
+                if not request.cancelled:
+                    matcher = request.matcher()
+                    for provider, snapshot in snapshots:
+                        provider.rank(request, matcher, snapshot)
+                    if not request.cancelled:
+                        matches = matcher.matches
+                        if widget is None:
+                            callback(request, matches)
+                        else:
+                            ui_queue.post(lambda callback=callback, request=request, matches=matches: callback(request, matches))
+                            delivered = True
+            except Exception as e:
+                print(f"Error in completion provider: {e}")
+            if widget is not None and not delivered:
+                ui_queue.cancel()
+            self._queue.task_done()
+
+# Global completion worker instance
+completion_worker = CompletionWorker()
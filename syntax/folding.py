@@ -0,0 +1,240 @@
+# Code folding: fold ranges from indentation or bracket nesting
+from syntax.brackets import bracket_scanner
+
+class FoldIndex:
+    """Per-line fold summaries of a document, kept in sync with its edits.
+    
+    Indentation languages store each line's indent (-1 for blank lines);
+    bracket languages store (unmatched closers, unmatched openers, start
+    state). The start state is the bracket index's scanner state at the
+    end of the line before (None until the index is ready), so brackets
+    inside block comments, docstrings and template literals are skipped;
+    a summary scanned from another state than the current one is redone
+    when asked for. Both
+    are computed only for the lines that are asked about (markers for the
+    visible lines, the extent of a fold being toggled) and edits only
+    forget the summaries of the lines they touch, so a 100k-line document
+    costs nothing until it is folded.
+    """
+    
+    INDENT_LANGUAGES = ('python', 'yaml', 'sass')
+    BRACKET_LANGUAGES = ('javascript', 'typescript', 'json', 'c', 'cpp', 'java', 'go', 'rust', 'php',
+                         'css', 'scss')
+    
+    # Lines fetched from the document at a time
+    READ_BLOCK_LINES = 256
+    
+    def __init__(self, document, brackets=None):
+        self.document = document
+        self.brackets = brackets  # optional BracketIndex for the end of bracket folds
+        self.mode = None  # 'indent', 'bracket' or None (no folding)
+        self.scanner = None  # BracketScanner in bracket mode
+        self.summaries = []  # one per line, None until computed
+        document.add_listener(self.on_edit)
+    
+    def set_language(self, language):
+        """Pick the folding mode for a language and forget all summaries"""
+        if language in self.INDENT_LANGUAGES:
+            self.mode = 'indent'
+        elif language in self.BRACKET_LANGUAGES:
+            self.mode = 'bracket'
+            self.scanner = bracket_scanner(language)
+        else:
+            self.mode = None
+        self.summaries = [None] * self.document.line_count if self.mode else []
+    
+    def on_edit(self, edit):
+        """Document listener: forget the summaries of the edited lines"""
+        if self.mode:
+            start = edit.start_line
+            self.summaries[start - 1:start + edit.removed_lines] = [None] * (edit.inserted_lines + 1)
+    
+    def summarize(self, text, state=None):
+        """Summary of one line of text (starting in state) for the current mode"""
+        if self.mode == 'indent':
+            stripped = text.lstrip()
+            if not stripped:
+                return -1
+            return len(text[:len(text) - len(stripped)].expandtabs(4))
+        closes = opens = 0
+        for delta in self.scanner.scan_line(text, state)[1]:
+            if delta > 0:
+                opens += 1
+            elif opens:
+                opens -= 1
+            else:
+                closes += 1
+        return closes, opens, state
+    
+    def _start_state(self, line):
+        """Bracket scanner state at the start of a 1-based line"""
+        brackets = self.brackets
+        if self.mode != 'bracket' or brackets is None or not brackets.ready or line < 2:
+            return None
+        states = brackets.line_states
+        return states[line - 2] if line - 2 < len(states) else None
+    
+    def _stale(self, line):
+        summary = self.summaries[line - 1]
+        return summary is None or (self.mode == 'bracket' and summary[2] != self._start_state(line))
+    
+    def summary(self, line):
+        """Summary of a 1-based line, computing a block of them if needed"""
+        if self._stale(line):
+            last = line
+            while last < len(self.summaries) and last - line < self.READ_BLOCK_LINES and self._stale(last + 1):
+                last += 1
+            texts = self.document.get_lines(line, last).split('\n')
+            for i, text in enumerate(texts, line):
+                self.summaries[i - 1] = self.summarize(text, self._start_state(i))
+        return self.summaries[line - 1]
+    
+    def _next_code_line(self, line):
+        """First non-blank line after line (indent mode), or None"""
+        for next_line in range(line + 1, len(self.summaries) + 1):
+            if self.summary(next_line) >= 0:
+                return next_line
+        return None
+    
+    def foldable(self, line):
+        """Cheap check used for gutter markers: does a fold start on this line?"""
+        if not self.mode or not 1 <= line <= len(self.summaries):
+            return False
+        if self.mode == 'indent':
+            indent = self.summary(line)
+            next_line = self._next_code_line(line)
+            return indent >= 0 and next_line is not None and self.summary(next_line) > indent
+        opens = self.summary(line)[1]
+        return opens > 0 and line < len(self.summaries) and self.summary(line + 1)[0] < opens
+    
+    def fold_end(self, line):
+        """Last line hidden by folding at line, or None if nothing folds there.
+        
+        Indentation folds end at the last line indented deeper than the
+        first; bracket folds end just before the line that closes them, so
+        the closing bracket stays visible.
+        """
+        if not self.foldable(line):
+            return None
+        line_count = len(self.summaries)
+        if self.mode == 'indent':
+            indent = self.summary(line)
+            end = line
+            for next_line in range(line + 1, line_count + 1):
+                next_indent = self.summary(next_line)
+                if next_indent < 0:
+                    continue
+                if next_indent <= indent:
+                    break
+                end = next_line
+            return end
+        
+        if self.brackets is not None and self.brackets.ready:
+            # The first bracket left open on the line, matched through the index
+            lines = self.document.lines
+            start = lines.line_start(line)
+            outer = None
+            pair = self.brackets.enclosing(lines.line_end(line))
+            while pair and pair[0] >= start:
+                outer = pair
+                pair = self.brackets.enclosing(pair[0])
+            if outer:
+                if outer[1] is None:
+                    return line_count
+                end = lines.position(outer[1])[0] - 1
+                return end if end > line else None
+        
+        depth = self.summary(line)[1]
+        for next_line in range(line + 1, line_count + 1):
+            closes, opens = self.summary(next_line)[:2]
+            depth -= closes
+            if depth <= 0:
+                return next_line - 1 if next_line - 1 > line else None
+            depth += opens
+        return line_count
+
+class CodeFolding:
+    """Code folding with elide tags over the ranges of a FoldIndex"""
+    
+    def __init__(self, text_widget, document, brackets=None):
+        self.text_widget = text_widget
+        self.index = FoldIndex(document, brackets)
+        self.folded_regions = {}  # first line -> last hidden line
+        self.fold_markers = {}
+        self.text_widget.tag_config('folded', elide=True)
+        document.add_listener(self.on_edit)
+    
+    def set_language(self, language):
+        """Switch the folding mode; open folds are expanded"""
+        self.unfold_all()
+        self.index.set_language(language)
+    
+    def add_fold_markers(self, first_line, last_line):
+        """Compute the {line: folded} gutter markers for lines first..last"""
+        markers = {}
+        line = first_line
+        while line <= last_line:
+            if line in self.folded_regions:
+                markers[line] = True
+                line = self.folded_regions[line] + 1  # hidden lines have no marker
+                continue
+            if self.index.foldable(line):
+                markers[line] = False
+            line += 1
+        self.fold_markers = markers
+        return markers
+    
+    def toggle_fold(self, line_number):
+        """Toggle fold at a specific line"""
+        if line_number in self.folded_regions:
+            self.unfold_region(line_number)
+        else:
+            self.fold_region(line_number)
+    
+    def fold_region(self, start_line):
+        """Hide the lines of the fold starting at start_line; return False if there is none"""
+        end_line = self.index.fold_end(start_line)
+        if end_line is None:
+            return False
+        self.text_widget.tag_add('folded', f"{start_line + 1}.0", f"{end_line + 1}.0")
+        self.folded_regions[start_line] = end_line
+        
+        # Keep the cursor out of the hidden lines
+        cursor_line = int(self.text_widget.index('insert').split('.')[0])
+        if start_line < cursor_line <= end_line:
+            self.text_widget.mark_set('insert', f"{start_line}.end")
+        return True
+    
+    def unfold_region(self, start_line):
+        """Unfold a region (folds nested inside it stay folded)"""
+        if start_line in self.folded_regions:
+            end_line = self.folded_regions.pop(start_line)
+            self.text_widget.tag_remove('folded', f"{start_line + 1}.0", f"{end_line + 1}.0")
+            for first, last in self.folded_regions.items():
+                if start_line < first <= end_line:
+                    self.text_widget.tag_add('folded', f"{first + 1}.0", f"{last + 1}.0")
+    
+    def unfold_all(self):
+        """Expand every fold"""
+        self.text_widget.tag_remove('folded', '1.0', 'end')
+        self.folded_regions = {}
+    
+    def on_edit(self, edit):
+        """Document listener: shift folds after the edit, expand the ones it touches"""
+        start, removed, inserted = edit.start_line, edit.removed_lines, edit.inserted_lines
+        delta = inserted - removed
+        folded = {}
+        expanded = False
+        for first, last in self.folded_regions.items():
+            if last < start or (first == start and not removed and not inserted):
+                folded[first] = last
+            elif first > start + removed:
+                folded[first + delta] = last + delta
+            else:
+                self.text_widget.tag_remove('folded', f"{min(first, start)}.0", f"{max(last + delta, start + inserted) + 1}.0")
+                expanded = True
+        self.folded_regions = folded
+        if expanded:
+            # Nested folds may have lost their tag along with the expanded one
+            for first, last in folded.items():
+                self.text_widget.tag_add('folded', f"{first + 1}.0", f"{last + 1}.0")
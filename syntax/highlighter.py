@@ -1,18 +1,176 @@
 # Advanced syntax highlighter for multiple languages
-import re
-import keyword
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from config import Config
+from core.document import join_snapshot
+from core.ui_queue import ui_queue
 from ui.themes import theme_manager
+from syntax.lexer import lex_blocks
+from syntax.languages import LANGUAGE_RULES, get_lexer, lex_chunk
+
+UNKNOWN = object()  # end state of an edited line that has not been re-lexed
+
+# Process pool lexing huge documents, started on first use and shared by all tabs
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_process_pool():
+    """Return the shared lexing process pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=Config.PARALLEL_HIGHLIGHT_WORKERS)
+        return _pool
+
+class LineRangeSet:
+    """Sorted, disjoint, inclusive ranges of line numbers"""
+    
+    def __init__(self):
+        self.ranges = []  # [first, last] pairs
+    
+    def clear(self):
+        self.ranges = []
+    
+    def add(self, first, last):
+        """Add lines first..last, merging touching ranges"""
+        merged = []
+        for start, end in self.ranges:
+            if end < first - 1 or start > last + 1:
+                merged.append([start, end])
+            else:
+                first, last = min(first, start), max(last, end)
+        merged.append([first, last])
+        merged.sort()
+        self.ranges = merged
+    
+    def remove(self, first, last):
+        """Remove lines first..last"""
+        kept = []
+        for start, end in self.ranges:
+            if end < first or start > last:
+                kept.append([start, end])
+                continue
+            if start < first:
+                kept.append([start, first - 1])
+            if end > last:
+                kept.append([last + 1, end])
+        self.ranges = kept
+    
+    def missing(self, first, last):
+        """Yield the (first, last) gaps of first..last not in the set"""
+        for start, end in self.ranges:
+            if end < first:
+                continue
+            if start > last:
+                break
+            if start > first:
+                yield first, start - 1
+            first = end + 1
+        if first <= last:
+            yield first, last
+    
+    def on_edit(self, start_line, removed_lines, inserted_lines):
+        """Follow an edit: the touched lines are dropped, later ones shift"""
+        self.remove(start_line, start_line + removed_lines)
+        delta = inserted_lines - removed_lines
+        if delta:
+            for pair in self.ranges:
+                if pair[0] > start_line:
+                    pair[0] += delta
+                    pair[1] += delta
+
+def merge_ranges(indices):
+    """Merge touching pairs of a flat [start, end, start, end, ...] list"""
+    merged = indices[:2]
+    for i in range(2, len(indices), 2):
+        if indices[i] == merged[-1]:
+            merged[-1] = indices[i + 1]
+        else:
+            merged.extend(indices[i:i + 2])
+    return merged
+
+class TagBudget:
+    """Caps the tag ranges handed to Tk.
+    
+    Touching ranges of a tag are merged, and above size_limit characters
+    the low-value tags are not applied at all: single operator and bracket
+    characters make up most ranges of a large file, and every range slows
+    down scrolling, tag_remove and restyling.
+    """
+    
+    LOW_VALUE_TAGS = ('operator', 'bracket')
+    
+    def __init__(self, size_limit=None):
+        self.size_limit = size_limit if size_limit is not None else Config.TAG_BUDGET_SIZE
+        self.active = False  # dropping the low-value tags
+    
+    def update(self, size):
+        """Follow the document size; return True when the active state changed"""
+        active = size > self.size_limit
+        changed = active != self.active
+        self.active = active
+        return changed
+    
+    def apply(self, ranges):
+        """Return {tag: indices} with merged ranges and without dropped tags"""
+        return {tag: merge_ranges(indices) for tag, indices in ranges.items()
+                if not (self.active and tag in self.LOW_VALUE_TAGS)}
 
 class SyntaxHighlighter:
     """Advanced syntax highlighter supporting multiple programming languages"""
     
-    def __init__(self, text_widget):
+    # Above this many changed lines a full pass is cheaper than line by line
+    FULL_REHIGHLIGHT_LINES = 500
+    
+    # Index pairs passed to a single tag_add call
+    TAG_BATCH = 1000
+    
+    # Lines highlighted above and below the visible ones
+    VIEWPORT_MARGIN = 100
+    
+    # Lines fetched from the document at a time, and scanned per deferred step
+    READ_BLOCK_LINES = 256
+    SCAN_STEP_LINES = 5000
+    
+    # Documents with more lines are tokenized on a worker thread, and its
+    # tags applied this many lines per deferred step
+    BACKGROUND_MIN_LINES = 2000
+    BACKGROUND_BLOCK_LINES = 500
+    
+    # Lines per process pool chunk, and how far past the target line a
+    # chunk may end to start the next one on a likely restart point
+    PARALLEL_CHUNK_LINES = 20000
+    RESTART_SEARCH_LINES = 500
+    
+    def __init__(self, text_widget, document=None, scheduler=None):
         self.text_widget = text_widget
+        self.document = document
+        self.scheduler = scheduler
         self.language = 'text'
         self.patterns = {}
         self.load_patterns()
         
+        # Lines tagged so far; the rest is highlighted when scrolled into view
+        self.highlighted = LineRangeSet()
+        
+        # Lexer state at the end of each line (a valid prefix of the text),
+        # and the lines edited since they were last lexed
+        self.line_states = []
+        self.dirty = None
+        self._scanning = False
+        
+        # Background tokenization: the current job number (a new job or a
+        # language change supersedes the running one), the first line edited
+        # since its snapshot, and the tagged blocks waiting to be applied
+        self._job = 0
+        self._tokenizing = False
+        self._edited_from = 0
+        self._pending_blocks = deque()
+        self.budget = TagBudget()
+        if document is not None:
+            document.add_listener(self.on_edit)
+        
         # Configure text tags for syntax highlighting
         self.configure_tags()
         
@@ -34,183 +192,431 @@ class SyntaxHighlighter:
             )
     
     def load_patterns(self):
-        """Load syntax patterns for different languages"""
-        
-        # Python patterns
-        self.patterns['python'] = [
-            ('keyword', r'\b(?:' + '|'.join(keyword.kwlist) + r')\b'),
-            ('builtin', r'\b(?:abs|all|any|ascii|bin|bool|bytearray|bytes|callable|chr|classmethod|compile|complex|delattr|dict|dir|divmod|enumerate|eval|exec|filter|float|format|frozenset|getattr|globals|hasattr|hash|help|hex|id|input|int|isinstance|issubclass|iter|len|list|locals|map|max|memoryview|min|next|object|oct|open|ord|pow|print|property|range|repr|reversed|round|set|setattr|slice|sorted|staticmethod|str|sum|super|tuple|type|vars|zip|__import__)\b'),
-            ('string', r'(["\'])(?:(?=(\\?))\2.)*?\1'),
-            ('string', r'(""".*?"""|\'\'\'.*?\'\'\')'),
-            ('comment', r'#.*?$'),
-            ('number', r'\b\d+\.?\d*\b'),
-            ('function', r'\bdef\s+(\w+)'),
-            ('class', r'\bclass\s+(\w+)'),
-            ('operator', r'[+\-*/%=<>!&|^~]'),
-            ('bracket', r'[(){}[\]]')
-        ]
-        
-        # JavaScript patterns
-        self.patterns['javascript'] = [
-            ('keyword', r'\b(?:abstract|await|boolean|break|byte|case|catch|char|class|const|continue|debugger|default|delete|do|double|else|enum|export|extends|false|final|finally|float|for|function|goto|if|implements|import|in|instanceof|int|interface|let|long|native|new|null|package|private|protected|public|return|short|static|super|switch|synchronized|this|throw|throws|transient|true|try|typeof|var|void|volatile|while|with|yield)\b'),
-            ('builtin', r'\b(?:Array|Boolean|Date|Error|Function|JSON|Math|Number|Object|RegExp|String|console|document|window|undefined|NaN|Infinity)\b'),
-            ('string', r'(["\'])(?:(?=(\\?))\2.)*?\1'),
-            ('string', r'`[^`]*`'),
-            ('comment', r'//.*?$'),
-            ('comment', r'/\*.*?\*/'),
-            ('number', r'\b\d+\.?\d*\b'),
-            ('function', r'\bfunction\s+(\w+)'),
-            ('class', r'\bclass\s+(\w+)'),
-            ('operator', r'[+\-*/%=<>!&|^~]'),
-            ('bracket', r'[(){}[\]]')
-        ]
-        
-        # HTML patterns
-        self.patterns['html'] = [
-            ('tag', r'</?[a-zA-Z][^>]*>'),
-            ('attribute', r'\b[a-zA-Z-]+(?==)'),
-            ('string', r'(["\'])(?:(?=(\\?))\2.)*?\1'),
-            ('comment', r'<!--.*?-->'),
-            ('bracket', r'[<>]')
-        ]
-        
-        # CSS patterns
-        self.patterns['css'] = [
-            ('css_property', r'\b[a-zA-Z-]+(?=\s*:)'),
-            ('css_value', r':\s*[^;}\n]+'),
-            ('string', r'(["\'])(?:(?=(\\?))\2.)*?\1'),
-            ('comment', r'/\*.*?\*/'),
-            ('number', r'\b\d+(?:px|em|rem|%|vh|vw|pt|pc|in|cm|mm|ex|ch|vmin|vmax)?\b'),
-            ('bracket', r'[{}()[\]]'),
-            ('operator', r'[,:;]')
-        ]
-        
-        # JSON patterns
-        self.patterns['json'] = [
-            ('string', r'(["\'])(?:(?=(\\?))\2.)*?\1'),
-            ('number', r'\b\d+\.?\d*\b'),
-            ('keyword', r'\b(?:true|false|null)\b'),
-            ('bracket', r'[{}()[\]]'),
-            ('operator', r'[,:;]')
-        ]
-        
-        # C/C++ patterns
-        self.patterns['c'] = [
-            ('keyword', r'\b(?:auto|break|case|char|const|continue|default|do|double|else|enum|extern|float|for|goto|if|inline|int|long|register|restrict|return|short|signed|sizeof|static|struct|switch|typedef|union|unsigned|void|volatile|while)\b'),
-            ('builtin', r'\b(?:printf|scanf|malloc|free|sizeof|strlen|strcpy|strcmp|strcat|fopen|fclose|fread|fwrite)\b'),
-            ('string', r'(["\'])(?:(?=(\\?))\2.)*?\1'),
-            ('comment', r'//.*?$'),
-            ('comment', r'/\*.*?\*/'),
-            ('number', r'\b\d+\.?\d*[fFlLuU]?\b'),
-            ('operator', r'[+\-*/%=<>!&|^~]'),
-            ('bracket', r'[(){}[\]]')
-        ]
-        
-        # Add more language patterns as needed...
+        """Load syntax patterns for different languages (shared, see syntax.languages)"""
+        self.patterns = LANGUAGE_RULES
     
     def set_language(self, language):
         """Set the current language for syntax highlighting"""
         self.language = language.lower()
-        self.highlight_all()
+        self.line_states = []
+        self.dirty = None
+        self.cancel_background()
+        self.rehighlight()
     
     def detect_language_from_extension(self, file_extension):
         """Detect language from file extension"""
         return Config.LANGUAGE_EXTENSIONS.get(file_extension.lower(), 'text')
     
+    def get_text(self):
+        """Get the text to highlight, from the document model when available"""
+        if self.document is not None:
+            return self.document.get_text()
+        return self.text_widget.get('1.0', 'end-1c')
+    
+    def iter_lines(self, first_line, last_line):
+        """Yield the text of lines first_line..last_line, read in blocks"""
+        if self.document is None:
+            yield from self.text_widget.get(f"{first_line}.0", f"{last_line}.end").split('\n')
+            return
+        while first_line <= last_line:
+            block_last = min(last_line, first_line + self.READ_BLOCK_LINES - 1)
+            yield from self.document.get_lines(first_line, block_last).split('\n')
+            first_line = block_last + 1
+    
+    def line_count(self):
+        """Number of lines in the text"""
+        if self.document is not None:
+            return self.document.line_count
+        return int(self.text_widget.index('end-1c').split('.')[0])
+    
+    def visible_range(self):
+        """First and last line shown in the widget"""
+        first = int(self.text_widget.index('@0,0').split('.')[0])
+        last = int(self.text_widget.index(f"@0,{self.text_widget.winfo_height()}").split('.')[0])
+        return first, last
+    
+    # Lexer state checkpoints
+    
+    def start_state(self, line):
+        """Lexer state at the start of a line, scanning the lines above if needed"""
+        if line <= 1:
+            return None
+        self.ensure_states(line - 1)
+        return self.line_states[line - 2]
+    
+    def ensure_states(self, last_line):
+        """Extend the cached end-of-line states to last_line (state-only scan)"""
+        lexer = get_lexer(self.language)
+        known = len(self.line_states)
+        if lexer is None or known >= last_line:
+            return
+        state = self.line_states[-1] if known else None
+        for text in self.iter_lines(known + 1, min(last_line, self.line_count())):
+            state = lexer.scan_line(text, state)
+            self.line_states.append(state)
+    
+    def _store_state(self, line, state):
+        index = line - 1
+        if index < len(self.line_states):
+            self.line_states[index] = state
+        elif index == len(self.line_states):
+            self.line_states.append(state)
+    
+    def scan_states_step(self):
+        """Deferred job: extend the state cache ahead of scrolling, one block at a time"""
+        line_count = self.line_count()
+        if get_lexer(self.language) is None or self._tokenizing or len(self.line_states) >= line_count:
+            self._scanning = False
+            return False
+        self.ensure_states(min(line_count, len(self.line_states) + self.SCAN_STEP_LINES))
+        return True
+    
+    # Highlighting
+    
     def highlight_all(self):
         """Highlight the entire text"""
-        if self.language not in self.patterns:
+        lexer = get_lexer(self.language)
+        if lexer is None:
             return
         
         # Clear existing tags
         for tag in theme_manager.get_syntax_colors().keys():
             self.text_widget.tag_remove(tag, '1.0', 'end')
         
-        content = self.text_widget.get('1.0', 'end-1c')
+        self.line_states = []
+        self.dirty = None
+        self.highlighted.clear()
+        self.highlight_range(1, self.line_count())
+    
+    def rehighlight(self):
+        """Drop all tags and highlight the viewport again (language changes)"""
+        for tag in theme_manager.get_syntax_colors().keys():
+            self.text_widget.tag_remove(tag, '1.0', 'end')
+        self.highlighted.clear()
+        self.budget.update(self.document_size())
+        self.highlight_visible()
+        if self.line_count() > self.BACKGROUND_MIN_LINES:
+            self.highlight_in_background()
+    
+    def highlight_visible(self):
+        """Highlight the not yet highlighted lines of the viewport plus a margin"""
+        if get_lexer(self.language) is None:
+            return
+        if self.dirty:
+            self.highlight_lines(*self.dirty)
+        self.check_budget()
+        first, last = self.visible_range()
+        first = max(1, first - self.VIEWPORT_MARGIN)
+        last = min(self.line_count(), last + self.VIEWPORT_MARGIN)
+        for gap_first, gap_last in list(self.highlighted.missing(first, last)):
+            self.highlight_range(gap_first, gap_last)
         
-        # Apply syntax highlighting patterns
-        for tag, pattern in self.patterns[self.language]:
-            for match in re.finditer(pattern, content, re.MULTILINE | re.DOTALL):
-                start_idx = f"1.0+{match.start()}c"
-                end_idx = f"1.0+{match.end()}c"
-                self.text_widget.tag_add(tag, start_idx, end_idx)
+        if self.scheduler is not None and not (self._scanning or self._tokenizing) and len(self.line_states) < self.line_count():
+            self._scanning = True
+            self.scheduler.defer(self.scan_states_step)
+    
+    def highlight_range(self, first_line, last_line):
+        """Re-tokenize and tag lines first_line..last_line"""
+        lexer = get_lexer(self.language)
+        if lexer is None:
+            return
+        state = self.start_state(first_line)
+        tokens = []
+        lines = []
+        offset = 0
+        for line, text in enumerate(self.iter_lines(first_line, last_line), first_line):
+            line_tokens, state = lexer.lex_line(text, state)
+            tokens.extend((tag, offset + start, offset + end) for tag, start, end in line_tokens)
+            self._store_state(line, state)
+            lines.append(text)
+            offset += len(text) + 1
+        self._retag(first_line, last_line, tokens, '\n'.join(lines))
     
     def highlight_line(self, line_number):
         """Highlight a specific line (for performance)"""
-        if self.language not in self.patterns:
+        self.highlight_lines(line_number, line_number)
+    
+    def _retag(self, first_line, last_line, tokens, content):
+        for tag in theme_manager.get_syntax_colors().keys():
+            self.text_widget.tag_remove(tag, f"{first_line}.0", f"{last_line}.end")
+        self.tag_tokens(tokens, content, first_line)
+        self.highlighted.add(first_line, last_line)
+    
+    def tag_tokens(self, tokens, text, first_line):
+        """Tag (tag, start, end) tokens of text, which starts at first_line.
+        
+        Offsets are turned into line.column indices while walking the text
+        once, and ranges are grouped per tag into few tag_add calls.
+        """
+        ranges = {}
+        line = first_line
+        line_start = 0  # offset of the start of the current line
+        pos = 0
+        for tag, start, end in tokens:
+            newlines = text.count('\n', pos, start)
+            if newlines:
+                line += newlines
+                line_start = text.rfind('\n', pos, start) + 1
+            start_index = f"{line}.{start - line_start}"
+            newlines = text.count('\n', start, end)
+            if newlines:
+                line += newlines
+                line_start = text.rfind('\n', start, end) + 1
+            pos = end
+            ranges.setdefault(tag, []).extend((start_index, f"{line}.{end - line_start}"))
+        self.add_ranges(ranges)
+    
+    def add_ranges(self, ranges):
+        """Apply {tag: [start, end, start, end, ...]} with few tag_add calls"""
+        for tag, indices in self.budget.apply(ranges).items():
+            for i in range(0, len(indices), self.TAG_BATCH):
+                self.text_widget.tag_add(tag, *indices[i:i + self.TAG_BATCH])
+    
+    # Tag budget
+    
+    def document_size(self):
+        """Number of characters in the text"""
+        if self.document is not None:
+            return len(self.document)
+        return len(self.get_text())
+    
+    def check_budget(self):
+        """Drop or restore the low-value tags when the text crosses the size limit"""
+        if not self.budget.update(self.document_size()):
             return
+        if self.budget.active:
+            for tag in TagBudget.LOW_VALUE_TAGS:
+                self.text_widget.tag_remove(tag, '1.0', 'end')
+        else:
+            # Tagged lines lack them: highlight again as they are shown
+            self.highlighted.clear()
+    
+    def tag_range_counts(self):
+        """Return {tag: number of ranges} currently in the widget"""
+        return {tag: len(self.text_widget.tag_ranges(tag)) // 2
+                for tag in theme_manager.get_syntax_colors().keys()}
+    
+    def highlight_lines(self, first_line, last_line):
+        """Re-lex from the first changed line until the lexer state matches the cache.
         
-        # Get line content
-        line_start = f"{line_number}.0"
-        line_end = f"{line_number}.end"
-        line_content = self.text_widget.get(line_start, line_end)
+        Lexing starts from the cached state at the end of the line above
+        and continues past last_line for as long as the end-of-line states
+        differ from the cached ones (e.g. after typing an opening triple
+        quote). Beyond the viewport the rest is left to be redone when it
+        is scrolled into view.
+        """
+        if self.dirty:
+            first_line = min(first_line, self.dirty[0])
+            last_line = max(last_line, self.dirty[1])
+            self.dirty = None
+        lexer = get_lexer(self.language)
+        if lexer is None:
+            return
         
-        # Clear existing tags on this line
-        for tag in theme_manager.get_syntax_colors().keys():
-            self.text_widget.tag_remove(tag, line_start, line_end)
+        line_count = self.line_count()
+        first_line = max(1, min(first_line, line_count))
+        last_line = min(max(first_line, last_line), line_count)
+        if last_line - first_line > self.FULL_REHIGHLIGHT_LINES:
+            # Large changes (pastes, loads): only the viewport is highlighted now
+            del self.line_states[first_line - 1:]
+            self.highlighted.remove(first_line, line_count)
+            self.highlight_visible()
+            if line_count > self.BACKGROUND_MIN_LINES:
+                self.highlight_in_background()
+            return
         
-        # Apply patterns to this line
-        for tag, pattern in self.patterns[self.language]:
-            for match in re.finditer(pattern, line_content):
-                start_idx = f"{line_number}.{match.start()}"
-                end_idx = f"{line_number}.{match.end()}"
-                self.text_widget.tag_add(tag, start_idx, end_idx)
+        limit = max(last_line, self.visible_range()[1] + self.VIEWPORT_MARGIN)
+        state = self.start_state(first_line)
+        tokens = []
+        lines = []
+        offset = 0
+        line = first_line - 1
+        for line, text in enumerate(self.iter_lines(first_line, line_count), first_line):
+            line_tokens, state = lexer.lex_line(text, state)
+            tokens.extend((tag, offset + start, offset + end) for tag, start, end in line_tokens)
+            lines.append(text)
+            offset += len(text) + 1
+            
+            cached = self.line_states[line - 1] if line <= len(self.line_states) else UNKNOWN
+            self._store_state(line, state)
+            if line >= last_line and state == cached:
+                break  # the rest of the file is lexed as before
+            if line >= limit:
+                # Still diverging past the viewport: forget what follows
+                del self.line_states[line:]
+                self.highlighted.remove(line + 1, line_count)
+                break
+        self._retag(first_line, line, tokens, '\n'.join(lines))
     
-    def on_text_change(self, event=None):
-        """Handle text changes for incremental highlighting"""
-        # Get current line number
-        current_line = self.text_widget.index('insert').split('.')[0]
+    def on_edit(self, edit):
+        """Document listener: shift the caches and remember the lines to re-lex"""
+        start, removed, inserted = edit.start_line, edit.removed_lines, edit.inserted_lines
+        self.highlighted.on_edit(start, removed, inserted)
+        self._edited_from = min(self._edited_from, start)
         
-        # Highlight current line and surrounding lines for context
+        # The edited lines' end states are unknown; later lines keep theirs
+        # (shifted) so re-lexing can stop where they match again
+        if start <= len(self.line_states):
+            self.line_states[start - 1:start + removed] = [UNKNOWN] * (inserted + 1)
+            while self.line_states and self.line_states[-1] is UNKNOWN:
+                self.line_states.pop()
+        
+        if self.dirty:
+            first, last = self.dirty
+            if first > start + removed:
+                first += inserted - removed
+            elif first > start:
+                first = start
+            if last > start + removed:
+                last += inserted - removed
+            elif last >= start:
+                last = start + inserted
+            self.dirty = (min(first, start), max(last, start + inserted))
+        else:
+            self.dirty = (start, start + inserted)
+    
+    # Background tokenization
+    
+    def highlight_in_background(self):
+        """Tokenize a snapshot of the whole document on a worker thread.
+        
+        The worker only lexes; the tags it returns are applied block by
+        block from the scheduler so typing and scrolling stay responsive.
+        Returns False when there is no document, scheduler or lexer.
+        """
+        self.cancel_background()
+        lexer = get_lexer(self.language)
+        if lexer is None or self.document is None or self.scheduler is None:
+            return False
+        job = self._job
+        self._tokenizing = True
+        self._edited_from = self.document.line_count + 1
+        ui_queue.expect(self.text_widget)
+        thread = threading.Thread(
+            target=self._tokenize_snapshot,
+            args=(job, self.language, self.document.snapshot(), self.document.version),
+            daemon=True
+        )
+        thread.start()
+        return True
+    
+    def cancel_background(self):
+        """Drop a running background job and its unapplied tags"""
+        self._job += 1
+        self._tokenizing = False
+        self._pending_blocks.clear()
+    
+    def _tokenize_snapshot(self, job, language, spans, version):
+        """Worker: lex the snapshot into end states and per-tag index lists per block"""
+        result = None
         try:
-            line_num = int(current_line)
-            for i in range(max(1, line_num - 1), min(int(self.text_widget.index('end').split('.')[0]), line_num + 2)):
-                self.highlight_line(i)
-        except ValueError:
-            pass
+            text = join_snapshot(spans)
+            lines = text.split('\n')
+            if len(text) >= Config.PARALLEL_HIGHLIGHT_SIZE and len(lines) > self.PARALLEL_CHUNK_LINES:
+                try:
+                    result = self._tokenize_parallel(job, language, lines)
+                except Exception as e:
+                    print(f"Error tokenizing in parallel, falling back to one thread: {e}")
+            if result is None and job == self._job:
+                result = lex_blocks(get_lexer(language), lines, 1, None, self.BACKGROUND_BLOCK_LINES,
+                                    cancelled=lambda: job != self._job)
+            if result is not None:
+                states, blocks = result
+                ui_queue.post(lambda: self._on_tokens_ready(job, version, states, blocks))
+        except Exception as e:
+            result = None
+            print(f"Error tokenizing in background: {e}")
+        if result is None:
+            ui_queue.cancel()  # superseded or failed
     
-    def on_theme_change(self, theme_name):
-        """Handle theme change"""
-        self.configure_tags()
-        self.highlight_all()
-
-class CodeFolding:
-    """Code folding functionality"""
+    def split_chunks(self, lines):
+        """Split lines into (first, last) chunks for the process pool.
+        
+        Each chunk is lexed from the default state, so chunks preferably
+        start on an unindented line beginning with a letter (a top-level
+        statement, rarely inside a multi-line string or comment).
+        """
+        chunks = []
+        first = 1
+        while first <= len(lines):
+            last = min(len(lines), first + self.PARALLEL_CHUNK_LINES - 1)
+            for line in range(last + 1, min(len(lines), last + self.RESTART_SEARCH_LINES) + 1):
+                if lines[line - 1][:1].isalpha():
+                    last = line - 1
+                    break
+            chunks.append((first, last))
+            first = last + 1
+        return chunks
     
-    def __init__(self, text_widget):
-        self.text_widget = text_widget
-        self.folded_regions = {}
-        self.fold_markers = {}
-    
-    def add_fold_markers(self):
-        """Add fold markers to the text"""
-        # This is a simplified implementation
-        # In a full implementation, you'd parse the code structure
-        pass
-    
-    def toggle_fold(self, line_number):
-        """Toggle fold at a specific line"""
-        if line_number in self.folded_regions:
-            self.unfold_region(line_number)
+    def _tokenize_parallel(self, job, language, lines):
+        """Lex chunks in the process pool and stitch them, re-checking each boundary.
+        
+        A chunk whose real start state (the end state of the chunk above)
+        is not the default one is re-lexed here from that state, until its
+        states agree with the ones computed in the pool. Returns None if the
+        job is superseded.
+        """
+        lexer = get_lexer(language)
+        pool = get_process_pool()
+        chunks = self.split_chunks(lines)
+        futures = [pool.submit(lex_chunk, language, '\n'.join(lines[first - 1:last]), first, self.BACKGROUND_BLOCK_LINES)
+                   for first, last in chunks]
+        states = []
+        blocks = []
+        try:
+            for (first, last), future in zip(chunks, futures):
+                chunk_states, chunk_blocks = future.result()
+                if job != self._job:
+                    return None
+                if states and states[-1] is not None:
+                    # The chunk starts inside a multi-line token
+                    fixed_states, fixed_blocks = lex_blocks(lexer, lines[first - 1:last], first, states[-1],
+                                                            self.BACKGROUND_BLOCK_LINES, until=chunk_states)
+                    chunk_states[:len(fixed_states)] = fixed_states
+                    chunk_blocks[:len(fixed_blocks)] = fixed_blocks
+                states.extend(chunk_states)
+                blocks.extend(chunk_blocks)
+        finally:
+            for future in futures:
+                future.cancel()
+        return states, blocks
+    
+    def _on_tokens_ready(self, job, version, states, blocks):
+        """UI thread: keep the still valid part of a result and queue its tags"""
+        if job != self._job:
+            return
+        self._tokenizing = False
+        if version == self.document.version:
+            valid = len(states)
         else:
-            self.fold_region(line_number)
-    
-    def fold_region(self, start_line):
-        """Fold a region starting at the given line"""
-        # Simplified folding - in practice, you'd need to determine
-        # the end of the foldable region based on indentation or braces
-        end_line = start_line + 10  # Placeholder
-        
-        # Hide lines
-        for i in range(start_line + 1, end_line + 1):
-            self.text_widget.tag_add('folded', f"{i}.0", f"{i}.end+1c")
-        
-        self.text_widget.tag_config('folded', elide=True)
-        self.folded_regions[start_line] = end_line
-    
-    def unfold_region(self, start_line):
-        """Unfold a region"""
-        if start_line in self.folded_regions:
-            end_line = self.folded_regions[start_line]
-            self.text_widget.tag_remove('folded', f"{start_line + 1}.0", f"{end_line}.end+1c")
-            del self.folded_regions[start_line]
\ No newline at end of file
+            # Stale result: only the lines above the first edit still match
+            valid = self._edited_from - 1
+        if len(self.line_states) < valid:
+            self.line_states = states[:valid]
+        self._pending_blocks.extend(block for block in blocks if block[1] <= valid)
+        self.scheduler.defer(lambda: self.apply_tags_step(job))
+    
+    def apply_tags_step(self, job):
+        """Deferred job: tag the next block of background results not yet highlighted"""
+        while job == self._job and self._pending_blocks:
+            first, last, ranges = self._pending_blocks.popleft()
+            if last >= self._edited_from:
+                self._pending_blocks.clear()  # edited since the snapshot
+                break
+            if next(self.highlighted.missing(first, last), None) is None:
+                continue
+            for tag in theme_manager.get_syntax_colors().keys():
+                self.text_widget.tag_remove(tag, f"{first}.0", f"{last}.end")
+            self.add_ranges(ranges)
+            self.highlighted.add(first, last)
+            return bool(self._pending_blocks)
+        return False
+    
+    def on_theme_change(self, theme_name):
+        """Handle theme change: colors belong to the tags, so only restyle them.
+        
+        Only the foreground is set; passing the (unchanged) font as well
+        would make Tk lay out every tagged line again.
+        """
+        for tag, color in theme_manager.get_syntax_colors().items():
+            self.text_widget.tag_configure(tag, foreground=color)
@@ -0,0 +1,433 @@
+# Language registry: definitions are built on first use and shared by all tabs
+import keyword
+from collections.abc import Mapping
+from types import MappingProxyType
+from syntax.lexer import Lexer, STRING, NUMBER, OPERATOR, BRACKET, lex_blocks
+
+class Language:
+    """Read-only definition of a language, shared by every editor tab.
+    
+    rules and multiline are the Lexer's token rules (see syntax.lexer),
+    compiled the first time the lexer is asked for; keywords, builtins and
+    snippets feed auto-completion.
+    """
+    
+    def __init__(self, name, rules, multiline=(), keywords=(), builtins=(), snippets=None):
+        self.name = name
+        self.rules = tuple(rules)
+        self.multiline = tuple(multiline)
+        self.keywords = tuple(keywords)
+        self.builtins = tuple(builtins)
+        self.snippets = MappingProxyType(dict(snippets or {}))
+        self._lexer = None
+    
+    @property
+    def lexer(self):
+        """The compiled Lexer for this language"""
+        if self._lexer is None:
+            self._lexer = Lexer(self.rules, self.multiline)
+        return self._lexer
+
+def words(names):
+    """Regex matching any of the given words as a whole word"""
+    return r'\b(?:' + '|'.join(names) + r')\b'
+
+def c_like(name, keywords, builtins=(), snippets=None, definitions=('class',), extra_rules=(), multiline=()):
+    """Language with C-style comments, strings, numbers and operators"""
+    rules = [('comment', r'//[^\n]*'), ('string', STRING)]
+    rules.extend(extra_rules)
+    for definition in definitions:
+        rules.append(('class', r'\b(?P<keyword>' + definition + r')\s+(?P<class>\w+)'))
+    rules += [
+        ('keyword', words(keywords)),
+        ('builtin', words(builtins)) if builtins else None,
+        ('number', r'\b(?:0[xX][0-9a-fA-F]+|\d+\.?\d*(?:[eE][+-]?\d+)?)[fFlLuU]*\b'),
+        ('operator', OPERATOR),
+        ('bracket', BRACKET)
+    ]
+    multiline = [('comment', r'/\*', r'.*?\*/')] + list(multiline)
+    return Language(name, [rule for rule in rules if rule], multiline, keywords, builtins, snippets)
+
+# Definitions
+
+PYTHON_BUILTINS = (
+    'abs', 'all', 'any', 'ascii', 'bin', 'bool', 'bytearray', 'bytes', 'callable', 'chr', 'classmethod',
+    'compile', 'complex', 'delattr', 'dict', 'dir', 'divmod', 'enumerate', 'eval', 'exec', 'filter', 'float',
+    'format', 'frozenset', 'getattr', 'globals', 'hasattr', 'hash', 'help', 'hex', 'id', 'input', 'int',
+    'isinstance', 'issubclass', 'iter', 'len', 'list', 'locals', 'map', 'max', 'memoryview', 'min', 'next',
+    'object', 'oct', 'open', 'ord', 'pow', 'print', 'property', 'range', 'repr', 'reversed', 'round', 'set',
+    'setattr', 'slice', 'sorted', 'staticmethod', 'str', 'sum', 'super', 'tuple', 'type', 'vars', 'zip',
+    '__import__'
+)
+
+JAVASCRIPT_KEYWORDS = (
+    'abstract', 'await', 'boolean', 'break', 'byte', 'case', 'catch', 'char', 'class', 'const', 'continue',
+    'debugger', 'default', 'delete', 'do', 'double', 'else', 'enum', 'export', 'extends', 'false', 'final',
+    'finally', 'float', 'for', 'function', 'goto', 'if', 'implements', 'import', 'in', 'instanceof', 'int',
+    'interface', 'let', 'long', 'native', 'new', 'null', 'package', 'private', 'protected', 'public', 'return',
+    'short', 'static', 'super', 'switch', 'synchronized', 'this', 'throw', 'throws', 'transient', 'true', 'try',
+    'typeof', 'var', 'void', 'volatile', 'while', 'with', 'yield'
+)
+
+JAVASCRIPT_BUILTINS = (
+    'Array', 'Boolean', 'Date', 'Error', 'Function', 'JSON', 'Math', 'Number', 'Object', 'RegExp', 'String',
+    'console', 'document', 'window', 'undefined', 'NaN', 'Infinity'
+)
+
+C_KEYWORDS = (
+    'auto', 'break', 'case', 'char', 'const', 'continue', 'default', 'do', 'double', 'else', 'enum', 'extern',
+    'float', 'for', 'goto', 'if', 'inline', 'int', 'long', 'register', 'restrict', 'return', 'short', 'signed',
+    'sizeof', 'static', 'struct', 'switch', 'typedef', 'union', 'unsigned', 'void', 'volatile', 'while'
+)
+
+C_BUILTINS = (
+    'printf', 'scanf', 'malloc', 'free', 'sizeof', 'strlen', 'strcpy', 'strcmp', 'strcat', 'fopen', 'fclose',
+    'fread', 'fwrite'
+)
+
+CSS_PROPERTIES = (
+    'color', 'background', 'font-size', 'font-family', 'margin', 'padding', 'border', 'width', 'height',
+    'display', 'position', 'top', 'right', 'bottom', 'left', 'float', 'clear', 'text-align', 'font-weight',
+    'text-decoration', 'line-height', 'letter-spacing', 'word-spacing', 'vertical-align', 'white-space',
+    'list-style', 'cursor', 'overflow', 'visibility', 'z-index', 'opacity', 'transform', 'transition',
+    'animation', 'box-shadow', 'border-radius', 'flex', 'grid'
+)
+
+CSS_SNIPPETS = {
+    'flex': 'display: flex;\njustify-content: center;\nalign-items: center;',
+    'grid': 'display: grid;\ngrid-template-columns: repeat(auto-fit, minmax(200px, 1fr));\ngap: 1rem;',
+    'center': 'margin: 0 auto;\ntext-align: center;'
+}
+
+HTML_TAGS = (
+    'html', 'head', 'body', 'div', 'span', 'p', 'a', 'img', 'ul', 'ol', 'li', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'table', 'tr', 'td', 'th', 'form', 'input', 'button', 'select', 'option', 'textarea', 'script', 'style',
+    'link', 'meta', 'title'
+)
+
+def _python():
+    return Language(
+        'python',
+        rules=[
+            ('comment', r'#[^\n]*'),
+            ('string', r'(?:\b[rRbBuUfF]{1,2})?(?:' + STRING + ')'),
+            ('function', r'\b(?P<keyword>def)\s+(?P<function>\w+)'),
+            ('class', r'\b(?P<keyword>class)\s+(?P<class>\w+)'),
+            ('keyword', words(keyword.kwlist)),
+            ('builtin', words(PYTHON_BUILTINS)),
+            ('number', NUMBER),
+            ('operator', OPERATOR),
+            ('bracket', BRACKET)
+        ],
+        multiline=[
+            ('string', r'(?:\b[rRbBuUfF]{1,2})?"""', r'(?:[^\\]|\\.)*?"""'),
+            ('string', r"(?:\b[rRbBuUfF]{1,2})?'''", r"(?:[^\\]|\\.)*?'''")
+        ],
+        keywords=keyword.kwlist,
+        builtins=[name for name in PYTHON_BUILTINS if name != '__import__'],
+        snippets={
+            'def': 'def function_name():\n    pass',
+            'class': 'class ClassName:\n    def __init__(self):\n        pass',
+            'if': 'if condition:\n    pass',
+            'for': 'for item in iterable:\n    pass',
+            'while': 'while condition:\n    pass',
+            'try': 'try:\n    pass\nexcept Exception as e:\n    pass',
+            'with': 'with open("file.txt") as f:\n    pass'
+        }
+    )
+
+def _javascript(name='javascript', keywords=JAVASCRIPT_KEYWORDS, builtins=JAVASCRIPT_BUILTINS):
+    return Language(
+        name,
+        rules=[
+            ('comment', r'//[^\n]*'),
+            ('string', STRING),
+            ('function', r'\b(?P<keyword>function)\s+(?P<function>\w+)'),
+            ('class', r'\b(?P<keyword>class)\s+(?P<class>\w+)'),
+            ('keyword', words(keywords)),
+            ('builtin', words(builtins)),
+            ('number', NUMBER),
+            ('operator', OPERATOR),
+            ('bracket', BRACKET)
+        ],
+        multiline=[
+            ('comment', r'/\*', r'.*?\*/'),
+            ('string', r'`', r'(?:[^`\\]|\\.)*`')
+        ],
+        keywords=keywords,
+        builtins=builtins,
+        snippets={
+            'function': 'function functionName() {\n    \n}',
+            'if': 'if (condition) {\n    \n}',
+            'for': 'for (let i = 0; i < length; i++) {\n    \n}',
+            'while': 'while (condition) {\n    \n}',
+            'try': 'try {\n    \n} catch (error) {\n    \n}',
+            'class': 'class ClassName {\n    constructor() {\n        \n    }\n}'
+        }
+    )
+
+def _typescript():
+    return _javascript(
+        'typescript',
+        keywords=JAVASCRIPT_KEYWORDS + ('any', 'as', 'declare', 'is', 'keyof', 'module', 'namespace', 'never',
+                                        'of', 'readonly', 'type', 'unknown'),
+        builtins=JAVASCRIPT_BUILTINS + ('Map', 'Promise', 'Record', 'Partial', 'Set', 'number', 'string')
+    )
+
+def _html(name='html'):
+    return Language(
+        name,
+        rules=[
+            ('tag', r'</?[a-zA-Z][\w:-]*|<[!?][a-zA-Z]+|[/?]?>'),
+            ('attribute', r'\b[a-zA-Z-]+(?==)'),
+            ('string', STRING),
+            ('bracket', r'[<>]')
+        ],
+        multiline=[
+            ('comment', r'<!--', r'.*?-->'),
+            ('string', r'<!\[CDATA\[', r'.*?\]\]>')
+        ],
+        keywords=HTML_TAGS if name == 'html' else (),
+        snippets={
+            'html5': '<!DOCTYPE html>\n<html lang="en">\n<head>\n    <meta charset="UTF-8">\n    <meta name="viewport" content="width=device-width, initial-scale=1.0">\n    <title>Document</title>\n</head>\n<body>\n    \n</body>\n</html>',
+            'div': '<div>\n    \n</div>',
+            'form': '<form>\n    <input type="text" name="" id="">\n    <button type="submit">Submit</button>\n</form>'
+        } if name == 'html' else None
+    )
+
+def _css(name='css'):
+    rules = [
+        ('string', STRING),
+        ('css_property', r'\b[a-zA-Z-]+(?=\s*:)'),
+        ('css_value', r':\s*[^;{}\n]+'),
+        ('number', r'\b\d+(?:px|em|rem|%|vh|vw|pt|pc|in|cm|mm|ex|ch|vmin|vmax)?\b'),
+        ('bracket', r'[{}()[\]]'),
+        ('operator', r'[,:;]')
+    ]
+    if name != 'css':
+        # Sass and SCSS: line comments, variables and @-rules
+        rules[:0] = [('comment', r'//[^\n]*'), ('attribute', r'\$[\w-]+'), ('keyword', r'@[\w-]+')]
+    return Language(name, rules, [('comment', r'/\*', r'.*?\*/')], CSS_PROPERTIES, snippets=CSS_SNIPPETS)
+
+def _json():
+    return Language('json', [
+        ('string', STRING),
+        ('number', NUMBER),
+        ('keyword', r'\b(?:true|false|null)\b'),
+        ('bracket', r'[{}()[\]]'),
+        ('operator', r'[,:;]')
+    ])
+
+def _yaml():
+    return Language('yaml', [
+        ('comment', r'(?:^|(?<=\s))#[^\n]*'),
+        ('keyword', r'^(?:---|\.\.\.)(?=\s|$)'),
+        ('attribute', r'^\s*(?:-\s+)?(?P<attribute>[\w.$/-]+|' + STRING + r')\s*(?=:(?:\s|$))'),
+        ('string', STRING),
+        ('builtin', r'[&*][\w-]+|![\w!/-]*'),
+        ('keyword', words(('true', 'false', 'null', 'yes', 'no', 'on', 'off', 'True', 'False', 'Null'))),
+        ('number', NUMBER),
+        ('operator', r'^\s*-(?=\s)|[:|>]'),
+        ('bracket', r'[{}[\]]')
+    ], keywords=('true', 'false', 'null'))
+
+def _markdown():
+    return Language('markdown', [
+        ('keyword', r'^#{1,6}\s[^\n]*'),
+        ('comment', r'^\s*>[^\n]*'),
+        ('string', r'`[^`\n]+`'),
+        ('class', r'\*\*[^*\n]+\*\*|__[^_\n]+__'),
+        ('attribute', r'!?\[[^\]\n]*\]\([^)\n]*\)'),
+        ('operator', r'^\s*(?:[-*+]|\d+\.)(?=\s)')
+    ], multiline=[
+        ('string', r'^```', r'.*?```')
+    ])
+
+def _c():
+    return c_like('c', C_KEYWORDS, C_BUILTINS, definitions=())
+
+def _cpp():
+    keywords = C_KEYWORDS + (
+        'bool', 'catch', 'class', 'constexpr', 'const_cast', 'delete', 'dynamic_cast', 'explicit', 'false',
+        'friend', 'mutable', 'namespace', 'new', 'noexcept', 'nullptr', 'operator', 'override', 'private',
+        'protected', 'public', 'reinterpret_cast', 'static_cast', 'template', 'this', 'throw', 'true', 'try',
+        'typename', 'using', 'virtual'
+    )
+    builtins = C_BUILTINS + ('std', 'string', 'vector', 'map', 'cout', 'cin', 'endl', 'size_t')
+    return c_like('cpp', keywords, builtins, definitions=('class', 'struct', 'namespace'),
+                  extra_rules=[('keyword', r'^\s*#\s*\w+')])
+
+def _java():
+    keywords = (
+        'abstract', 'assert', 'boolean', 'break', 'byte', 'case', 'catch', 'char', 'class', 'const', 'continue',
+        'default', 'do', 'double', 'else', 'enum', 'extends', 'false', 'final', 'finally', 'float', 'for', 'if',
+        'implements', 'import', 'instanceof', 'int', 'interface', 'long', 'native', 'new', 'null', 'package',
+        'private', 'protected', 'public', 'return', 'short', 'static', 'super', 'switch', 'synchronized', 'this',
+        'throw', 'throws', 'transient', 'true', 'try', 'var', 'void', 'volatile', 'while'
+    )
+    builtins = ('String', 'Object', 'Integer', 'Long', 'Double', 'Boolean', 'List', 'Map', 'Set', 'ArrayList',
+                'HashMap', 'System', 'Math', 'Exception')
+    return c_like('java', keywords, builtins, definitions=('class', 'interface', 'enum'),
+                  extra_rules=[('builtin', r'@\w+')])
+
+def _go():
+    keywords = (
+        'break', 'case', 'chan', 'const', 'continue', 'default', 'defer', 'else', 'fallthrough', 'for', 'func',
+        'go', 'goto', 'if', 'import', 'interface', 'map', 'package', 'range', 'return', 'select', 'struct',
+        'switch', 'type', 'var', 'true', 'false', 'nil', 'iota'
+    )
+    builtins = (
+        'append', 'cap', 'close', 'complex', 'copy', 'delete', 'imag', 'len', 'make', 'new', 'panic', 'print',
+        'println', 'real', 'recover', 'bool', 'byte', 'error', 'float32', 'float64', 'int', 'int32', 'int64',
+        'rune', 'string', 'uint', 'uint8', 'uint64'
+    )
+    return c_like('go', keywords, builtins, definitions=('type',),
+                  extra_rules=[('function', r'\b(?P<keyword>func)\s+(?:\([^)]*\)\s*)?(?P<function>\w+)')],
+                  multiline=[('string', r'`', r'[^`]*`')])
+
+def _rust():
+    keywords = (
+        'as', 'async', 'await', 'break', 'const', 'continue', 'crate', 'dyn', 'else', 'enum', 'extern', 'false',
+        'fn', 'for', 'if', 'impl', 'in', 'let', 'loop', 'match', 'mod', 'move', 'mut', 'pub', 'ref', 'return',
+        'self', 'Self', 'static', 'struct', 'super', 'trait', 'true', 'type', 'unsafe', 'use', 'where', 'while'
+    )
+    builtins = ('Option', 'Some', 'None', 'Result', 'Ok', 'Err', 'Vec', 'String', 'Box', 'bool', 'char', 'str',
+                'i32', 'i64', 'u8', 'u32', 'u64', 'usize', 'f32', 'f64')
+    language = c_like('rust', keywords, builtins, definitions=('struct', 'enum', 'trait', 'impl'),
+                      extra_rules=[('function', r'\b(?P<keyword>fn)\s+(?P<function>\w+)'),
+                                   ('builtin', r'\b\w+!'),
+                                   ('attribute', r'#!?\[[^\]\n]*\]')])
+    # Single quotes start lifetimes as well as char literals
+    rules = [('string', r'"(?:[^"\\\n]|\\.)*"?|\'(?:[^\'\\\n]|\\.)\'') if rule == ('string', STRING) else rule
+             for rule in language.rules]
+    return Language('rust', rules, language.multiline, keywords, builtins)
+
+def _php():
+    keywords = (
+        'abstract', 'and', 'array', 'as', 'break', 'case', 'catch', 'class', 'clone', 'const', 'continue',
+        'declare', 'default', 'do', 'echo', 'else', 'elseif', 'empty', 'extends', 'final', 'finally', 'fn', 'for',
+        'foreach', 'function', 'global', 'if', 'implements', 'include', 'instanceof', 'interface', 'isset', 'list',
+        'match', 'namespace', 'new', 'null', 'or', 'print', 'private', 'protected', 'public', 'require', 'return',
+        'static', 'switch', 'throw', 'trait', 'true', 'false', 'try', 'unset', 'use', 'var', 'while', 'yield'
+    )
+    return c_like('php', keywords, definitions=('class', 'interface', 'trait'),
+                  extra_rules=[('comment', r'#(?!\[)[^\n]*'),
+                               ('tag', r'<\?(?:php|=)?|\?>'),
+                               ('attribute', r'\$\w+'),
+                               ('function', r'\b(?P<keyword>function)\s+(?P<function>\w+)')])
+
+def _ruby():
+    keywords = (
+        'BEGIN', 'END', 'alias', 'and', 'begin', 'break', 'case', 'class', 'def', 'defined', 'do', 'else',
+        'elsif', 'end', 'ensure', 'false', 'for', 'if', 'in', 'module', 'next', 'nil', 'not', 'or', 'redo',
+        'rescue', 'retry', 'return', 'self', 'super', 'then', 'true', 'undef', 'unless', 'until', 'when', 'while',
+        'yield'
+    )
+    builtins = ('puts', 'print', 'require', 'require_relative', 'attr_accessor', 'attr_reader', 'attr_writer',
+                'include', 'extend', 'raise', 'lambda', 'proc')
+    return Language('ruby', [
+        ('comment', r'#[^\n]*'),
+        ('string', STRING),
+        ('function', r'\b(?P<keyword>def)\s+(?P<function>[\w.]+[?!=]?)'),
+        ('class', r'\b(?P<keyword>class|module)\s+(?P<class>[\w:]+)'),
+        ('builtin', r'(?<!:):\w+'),
+        ('attribute', r'@{1,2}\w+'),
+        ('keyword', words(keywords)),
+        ('builtin', words(builtins)),
+        ('number', NUMBER),
+        ('operator', OPERATOR),
+        ('bracket', BRACKET)
+    ], [
+        ('comment', r'^=begin\b', r'=end\b.*')
+    ], keywords, builtins)
+
+def _sql():
+    keywords = (
+        'select', 'from', 'where', 'and', 'or', 'not', 'in', 'is', 'null', 'like', 'between', 'exists', 'as',
+        'join', 'inner', 'left', 'right', 'full', 'outer', 'cross', 'on', 'using', 'group', 'by', 'order', 'having',
+        'limit', 'offset', 'union', 'all', 'distinct', 'insert', 'into', 'values', 'update', 'set', 'delete',
+        'create', 'alter', 'drop', 'table', 'view', 'index', 'primary', 'key', 'foreign', 'references',
+        'constraint', 'unique', 'default', 'check', 'begin', 'commit', 'rollback', 'transaction', 'case', 'when',
+        'then', 'else', 'end', 'asc', 'desc', 'if', 'true', 'false'
+    )
+    builtins = ('count', 'sum', 'avg', 'min', 'max', 'coalesce', 'nullif', 'cast', 'now', 'lower', 'upper',
+                'length', 'substring', 'trim', 'round', 'integer', 'int', 'bigint', 'varchar', 'char', 'text',
+                'date', 'timestamp', 'boolean', 'decimal', 'numeric', 'float', 'real', 'serial')
+    return Language('sql', [
+        ('comment', r'--[^\n]*'),
+        ('string', r"'(?:[^'\n]|'')*'?|\"(?:[^\"\n])*\"?|`[^`\n]*`?"),
+        ('keyword', r'(?i:' + words(keywords) + ')'),
+        ('builtin', r'(?i:' + words(builtins) + ')'),
+        ('number', NUMBER),
+        ('operator', r'[+\-*/%=<>!|]'),
+        ('bracket', r'[()]')
+    ], [
+        ('comment', r'/\*', r'.*?\*/')
+    ], keywords, builtins)
+
+# Registry
+
+_loaders = {
+    'python': _python,
+    'javascript': _javascript,
+    'typescript': _typescript,
+    'html': _html,
+    'xml': lambda: _html('xml'),
+    'css': _css,
+    'scss': lambda: _css('scss'),
+    'sass': lambda: _css('sass'),
+    'json': _json,
+    'yaml': _yaml,
+    'markdown': _markdown,
+    'c': _c,
+    'cpp': _cpp,
+    'java': _java,
+    'go': _go,
+    'rust': _rust,
+    'php': _php,
+    'ruby': _ruby,
+    'sql': _sql
+}
+
+# Definitions built so far, shared read-only by every tab
+_languages = {}
+
+def get_language(name):
+    """Return the shared Language for a name, building it on first use, or None"""
+    language = _languages.get(name)
+    if language is None and name in _loaders:
+        language = _languages[name] = _loaders[name]()
+    return language
+
+def get_lexer(name):
+    """Return the shared Lexer for a language, or None if it is not defined"""
+    language = get_language(name)
+    return language.lexer if language is not None else None
+
+def language_names():
+    """Names of all defined languages"""
+    return list(_loaders)
+
+class RuleView(Mapping):
+    """{language: token rules} view that builds definitions only when read"""
+    
+    def __getitem__(self, name):
+        language = get_language(name)
+        if language is None:
+            raise KeyError(name)
+        return language.rules
+    
+    def __contains__(self, name):
+        return name in _loaders
+    
+    def __iter__(self):
+        return iter(_loaders)
+    
+    def __len__(self):
+        return len(_loaders)
+
+LANGUAGE_RULES = RuleView()
+
+def lex_chunk(language, text, first_line, block_lines):
+    """Process pool entry point: lex_blocks for a chunk, from the default state"""
+    return lex_blocks(get_lexer(language), text.split('\n'), first_line, None, block_lines)
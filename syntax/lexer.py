@@ -0,0 +1,147 @@
+# Single-pass tokenizer shared by all highlighters
+import re
+
+# Reusable token patterns (language definitions live in syntax.languages)
+STRING = r'"(?:[^"\\\n]|\\.)*"?|\'(?:[^\'\\\n]|\\.)*\'?'
+NUMBER = r'\b\d+\.?\d*\b'
+OPERATOR = r'[+\-*/%=<>!&|^~]'
+BRACKET = r'[(){}[\]]'
+
+_GROUP_NAME = re.compile(r'\(\?P<(\w+)>')
+
+class Lexer:
+    """Line-by-line tokenizer built on a single alternation regex.
+    
+    Every rule becomes one named alternative, tried in rule order at each
+    position; scanning resumes after the match, so tokens never overlap
+    (a keyword inside a string stays part of the string). A final catch-all
+    alternative skips whole words, so the engine does not retry the rules
+    at every character of an identifier.
+    
+    Lines are lexed from a state: None outside multi-line tokens, or the
+    name of the open multi-line rule. lex_line returns the state at the end
+    of the line, which lets the highlighter resume anywhere it has cached
+    one. scan_line only computes that state; it runs the same alternation,
+    since any rule (a CSS value, a Rust attribute) can swallow an opener.
+    """
+    
+    def __init__(self, rules, multiline=()):
+        self.rules = rules
+        self.groups = {}  # alternative name -> (tag, [(subgroup, tag), ...])
+        self.continuations = {}  # multi-line alternative name -> (tag, closer regex)
+        openers = []
+        for i, (tag, opener, closer) in enumerate(multiline):
+            name = f"m{i}"
+            openers.append(f"(?P<{name}>{opener})")
+            self.continuations[name] = (tag, re.compile(closer))
+        
+        alternatives = []
+        for i, (tag, pattern) in enumerate(rules):
+            name = f"r{i}"
+            subgroups = [(f"{name}_{sub}", sub) for sub in _GROUP_NAME.findall(pattern)]
+            pattern = _GROUP_NAME.sub(lambda m: f"(?P<{name}_{m.group(1)}>", pattern)
+            alternatives.append(f"(?P<{name}>{pattern})")
+            self.groups[name] = (tag, subgroups)
+        
+        self.regex = re.compile('|'.join(openers + alternatives + [r'(?P<word>\w+)']))
+    
+    def lex_line(self, line, state=None):
+        """Return ([(tag, start, end), ...], end_state) for one line"""
+        tokens = []
+        pos = 0
+        if state is not None:
+            tag, closer = self.continuations[state]
+            match = closer.match(line)
+            if match is None:
+                return ([(tag, 0, len(line))] if line else []), state
+            tokens.append((tag, 0, match.end()))
+            pos = match.end()
+        
+        search = self.regex.search
+        groups = self.groups
+        while True:
+            match = search(line, pos)
+            if match is None:
+                return tokens, None
+            name = match.lastgroup
+            start, pos = match.span()
+            if name == 'word':
+                continue
+            if name in self.continuations:
+                tag, closer = self.continuations[name]
+                end = closer.match(line, pos)
+                if end is None:
+                    tokens.append((tag, start, len(line)))
+                    return tokens, name
+                pos = end.end()
+                tokens.append((tag, start, pos))
+                continue
+            tag, subgroups = groups[name]
+            if not subgroups:
+                tokens.append((tag, start, pos))
+                continue
+            for group, sub_tag in subgroups:
+                sub_start, sub_end = match.span(group)
+                if sub_start != -1:
+                    tokens.append((sub_tag, sub_start, sub_end))
+    
+    def scan_line(self, line, state=None):
+        """Return the state at the end of a line without producing tokens"""
+        pos = 0
+        if state is not None:
+            match = self.continuations[state][1].match(line)
+            if match is None:
+                return state
+            pos = match.end()
+        if not self.continuations:
+            return None
+        search = self.regex.search
+        while True:
+            match = search(line, pos)
+            if match is None:
+                return None
+            name = match.lastgroup
+            pos = match.end()
+            if name in self.continuations:
+                end = self.continuations[name][1].match(line, pos)
+                if end is None:
+                    return name
+                pos = end.end()
+    
+    def tokens(self, text, state=None):
+        """Yield (tag, start, end) for each token of a multi-line text"""
+        offset = 0
+        for line in text.split('\n'):
+            line_tokens, state = self.lex_line(line, state)
+            for tag, start, end in line_tokens:
+                yield tag, offset + start, offset + end
+            offset += len(line) + 1
+
+def lex_blocks(lexer, lines, first_line=1, state=None, block_lines=500, until=None, cancelled=None):
+    """Lex lines into (end states, [(first, last, {tag: [start, end, ...]}), ...]).
+    
+    Tag ranges are grouped in blocks of block_lines lines, as Tk indices
+    ready for tag_add. With until (the end states expected for the same
+    lines), lexing stops at the first block end whose state matches: every
+    later line would be lexed the same. cancelled() is polled per block.
+    """
+    states = []
+    blocks = []
+    ranges = {}
+    block_first = first_line
+    for line, text in enumerate(lines, first_line):
+        line_tokens, state = lexer.lex_line(text, state)
+        states.append(state)
+        for tag, start, end in line_tokens:
+            ranges.setdefault(tag, []).extend((f"{line}.{start}", f"{line}.{end}"))
+        if line - block_first + 1 == block_lines:
+            blocks.append((block_first, line, ranges))
+            ranges = {}
+            block_first = line + 1
+            if until is not None and state == until[line - first_line]:
+                break
+            if cancelled is not None and cancelled():
+                return None
+    if block_first < first_line + len(states):
+        blocks.append((block_first, first_line + len(states) - 1, ranges))
+    return states, blocks
@@ -0,0 +1,249 @@
+# Completion ranking: fuzzy matching and frecency of accepted completions
+import heapq
+import json
+import math
+import os
+import re
+import time
+from functools import lru_cache
+
+from config import Config
+from core.save_service import write_atomic
+
+def char_mask(text):
+    """Bitmask of the (lowercase) characters of text, folded into 30 bits (one machine digit)"""
+    mask = 0
+    for char in set(text.lower()):
+        mask |= 1 << (ord(char) % 30)
+    return mask
+
+def lead_chars(word):
+    """Characters a gapless fuzzy match can take second in word, or None if unknown.
+    
+    FuzzyMatcher matches each query character at its first occurrence
+    after the previous one. A match that is not a prefix and has no gap
+    therefore takes its second character right after the first, or where
+    that character first occurs after it if that is a word boundary.
+    """
+    lower = word.lower()
+    if len(lower) != len(word):
+        return None  # lowercasing moved the positions
+    leads = {lower[1:2]}
+    if lower == word and '_' not in word and '-' not in word and '$' not in word:
+        return leads  # no boundaries
+    seen = set(leads)
+    previous = word[1:2]
+    for i in range(2, len(word)):
+        char = lower[i]
+        if char not in seen:
+            seen.add(char)
+            if previous in '_-$' or (word[i].isupper() and not previous.isupper()):
+                leads.add(char)
+        previous = word[i]
+    return leads
+
+@lru_cache(maxsize=8192)
+def word_entry(word):
+    """(lowercase, word, mask) entry of a word held outside a word index (keywords, snippets)"""
+    return word.lower(), word, char_mask(word)
+
+def stats_path():
+    """File keeping the completion statistics between sessions"""
+    return os.path.join(Config.CACHE_DIR, 'completion_stats.json')
+
+class CompletionStats:
+    """How often and how recently each completion was accepted.
+    
+    Each word keeps one decaying score: it halves every HALF_LIFE seconds
+    and every acceptance adds 1, so frequent and recent picks both count.
+    Only the MAX_ENTRIES best scores are kept.
+    """
+    
+    HALF_LIFE = 7 * 24 * 3600
+    MAX_ENTRIES = 2000
+    WEIGHT = 6  # ranking points for a score of 1
+    
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = None  # word -> [score, time of last acceptance], loaded on first use
+        self.changed = False
+    
+    def _table(self):
+        if self.entries is None:
+            self.entries = {}
+            try:
+                with open(self.path or stats_path(), encoding='utf-8') as f:
+                    data = json.load(f)
+                self.entries = {word: [float(score), float(then)] for word, score, then in data}
+            except (OSError, ValueError, TypeError):
+                pass
+        return self.entries
+    
+    def value(self, word, now=None):
+        """Decayed acceptance score of a word"""
+        entry = self._table().get(word)
+        if entry is None:
+            return 0.0
+        now = time.time() if now is None else now
+        return entry[0] * 0.5 ** (max(0.0, now - entry[1]) / self.HALF_LIFE)
+    
+    def boost(self, word, now=None):
+        """Ranking points earned by a word's acceptances"""
+        if word not in self._table():
+            return 0.0
+        return self.WEIGHT * math.log2(1 + self.value(word, now))
+    
+    def accept(self, word, now=None):
+        """Record that a completion was picked"""
+        now = time.time() if now is None else now
+        table = self._table()
+        table[word] = [self.value(word, now) + 1, now]
+        self.changed = True
+        if len(table) > self.MAX_ENTRIES * 5 // 4:
+            kept = sorted(table, key=lambda word: self.value(word, now), reverse=True)[:self.MAX_ENTRIES]
+            self.entries = {word: table[word] for word in kept}
+    
+    def save(self):
+        """Write the statistics to disk if they changed"""
+        if not self.changed:
+            return
+        path = self.path or stats_path()
+        data = [[word, round(score, 4), int(then)] for word, (score, then) in self._table().items()]
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_atomic(path, json.dumps(data, ensure_ascii=False).encode('utf-8'))
+            self.changed = False
+        except OSError as e:
+            print(f"Error saving completion statistics: {e}")
+
+class FuzzyMatcher:
+    """Rank words against a typed query, keeping the best few.
+    
+    A word matches when it starts with the query's first character and
+    contains the rest in order, ignoring case ("gcw" matches
+    get_current_word). Words missing any query character are rejected by
+    comparing character masks, prefix matches are scored without the
+    regex, and a fuzzy match is only scored in full when its best
+    possible score could still enter the top `limit`. Prefix matches
+    score highest, then matches landing on word boundaries (after _ or at
+    a capital); each word gets its acceptance boost.
+    
+    Candidates are fed with add() as (lowercase, word, mask) entries, from
+    any number of sources; best() returns the winners.
+    """
+    
+    PREFIX = 20
+    EXACT_CASE = 4
+    ADJACENT = 2
+    BOUNDARY = 2
+    GAP = -1
+    LENGTH = 0.05  # per extra character: shorter words first
+    
+    def __init__(self, query, stats=None, limit=10):
+        self.query = query
+        self.lower = query.lower()
+        self.first = self.lower[:1]
+        self.mask = char_mask(query)
+        self.stats = stats
+        self.boosted = stats._table() if stats is not None else {}  # words with acceptances
+        self.limit = limit
+        self.now = time.time()
+        self.pattern = re.compile(re.escape(query[:1]) + ''.join(f'(.*?){re.escape(char)}' for char in query[1:]),
+                                  re.IGNORECASE | re.DOTALL)
+        self.matches = []  # (score, word) that could be in the top
+        self.seen = set()
+        self._scores = []  # min-heap of the `limit` best scores so far
+        self._accepted = None
+    
+    def add(self, entries, exclude=None):
+        """Score (lowercase, word, mask) entries, skipping the word exclude"""
+        need, query, lower_query = self.mask, self.query, self.lower
+        n = len(query)
+        seen, scores, boosted, match_word = self.seen, self._scores, self.boosted, self.pattern.match
+        prefix_score = self.PREFIX + self.ADJACENT * (n - 1)
+        best_fuzzy = self.ADJACENT * (n - 1) + self.LENGTH * n  # before the length penalty
+        threshold = scores[0] if len(scores) >= self.limit else -math.inf
+        for lower, word, mask in entries:
+            if mask & need != need or word in seen or word == exclude:
+                continue
+            boost = self.stats.boost(word, self.now) if word in boosted else 0
+            if lower.startswith(lower_query):
+                score = prefix_score + self.LENGTH * n + (self.EXACT_CASE if word.startswith(query) else 0)
+            else:
+                bound = best_fuzzy + boost - self.LENGTH * len(word)
+                if bound < threshold:
+                    continue  # cannot make the top even with a perfect match
+                match = match_word(word)
+                if match is None:
+                    continue
+                score = self._fuzzy_score(word, match, bound - threshold)
+                if score is None:
+                    continue
+            score += boost - self.LENGTH * len(word)
+            if score >= threshold:
+                threshold = self._keep(score, word)
+    
+    def can_enter(self, length, prefix, gaps=0):
+        """Whether a word of this length without acceptances could still make the top.
+        
+        Scores only fall as words get longer, so a source holding its
+        words by length stops at the first length this rejects. With gaps,
+        a fuzzy match must make it despite that many gaps: when one gap is
+        too many, only the words in which the query's second character
+        can follow without one (see lead_chars) need to be read.
+        """
+        n = len(self.query)
+        if prefix:
+            best = self.PREFIX + self.ADJACENT * (n - 1) + self.LENGTH * n + self.EXACT_CASE - self.LENGTH * length
+        else:
+            best = self.ADJACENT * (n - 1 - gaps) + self.GAP * gaps - self.LENGTH * length
+        return len(self._scores) < self.limit or best >= self._scores[0]
+    
+    def accepted(self):
+        """Entries of the words with acceptances that can match (their boost beats the length cut-off)"""
+        if self._accepted is None:
+            self._accepted = [word_entry(word) for word in list(self.boosted) if word.lower()[:1] == self.first]
+        return self._accepted
+    
+    def merge(self, matches):
+        
+        """Add (score, word) pairs scored by another matcher of the same query"""
+        scores = self._scores
+        for score, word in matches:
+            if word not in self.seen and (len(scores) < self.limit or score >= scores[0]):
+                self._keep(score, word)
+    
+    def _keep(self, score, word):
+        """Record a match that can be in the top; returns the new entry threshold"""
+        scores = self._scores
+        self.seen.add(word)
+        self.matches.append((score, word))
+        if len(scores) < self.limit:
+            heapq.heappush(scores, score)
+        else:
+            heapq.heapreplace(scores, score)
+        return scores[0] if len(scores) >= self.limit else -math.inf
+    
+    def _fuzzy_score(self, word, match, slack):
+        """Points of a fuzzy match, or None once it loses more than slack to a perfect one"""
+        score = 0
+        for i in range(1, len(self.query)):
+            start, position = match.span(i)
+            if start == position:
+                score += self.ADJACENT
+            elif word[position - 1] in '_-$' or (word[position].isupper() and not word[position - 1].isupper()):
+                score += self.BOUNDARY
+            else:
+                score += self.GAP
+                slack -= self.ADJACENT - self.GAP
+                if slack < 0:
+                    return None
+        return score
+    
+    def best(self):
+        """The best words, highest score first (ties in case-insensitive order)"""
+        top = heapq.nsmallest(self.limit, self.matches, key=lambda match: (-match[0], match[1].lower(), match[1]))
+        return [word for score, word in top]
+
+# Global completion statistics instance
+completion_stats = CompletionStats()
@@ -0,0 +1,227 @@
+# Symbol index: per-line definitions for the outline and go-to-symbol
+import re
+import threading
+
+from core.document import join_snapshot
+from core.ui_queue import ui_queue
+from syntax.languages import get_lexer
+
+# Methods without a keyword (JavaScript/TypeScript class bodies); kept only inside a class
+_METHOD = re.compile(r'\s*(?:(?:static|async|get|set|public|private|protected|readonly)\s+)*\*?'
+                     r'(?!(?:if|for|while|switch|catch|function|return|with)\b)([A-Za-z_$][\w$]*)\s*\([^)]*\)\s*(?::[^{]*)?\{')
+_SELECTOR_LANGUAGES = ('css', 'scss')
+_METHOD_LANGUAGES = ('javascript', 'typescript')
+_CONTAINERS = ('class', 'function', 'method')
+_UNKNOWN = object()  # end state of an edited line that has not been re-lexed
+
+def line_symbols(language, lexer, text, state=None):
+    """Return ([(kind, name, column, indent), ...], end_state) for one line.
+    
+    Functions and classes come from the lexer's 'function' and 'class'
+    tokens, so definitions inside strings and comments are not listed.
+    """
+    tokens, end_state = lexer.lex_line(text, state)
+    symbols = []
+    indent = len(text[:len(text) - len(text.lstrip())].expandtabs(4))
+    for tag, start, end in tokens:
+        if tag in ('function', 'class'):
+            symbols.append((tag, text[start:end], start, indent))
+        elif (language == 'yaml' and tag == 'attribute') or \
+                (language == 'json' and tag == 'string' and text[end:].lstrip().startswith(':')):
+            symbols.append(('key', text[start:end].strip('"\''), start, indent))
+        elif language in _SELECTOR_LANGUAGES and tag == 'bracket' and text[start] == '{':
+            first = max(text.rfind(char, 0, start) for char in '{};') + 1
+            selector = text[first:start]
+            if selector.strip():
+                column = first + len(selector) - len(selector.lstrip())
+                symbols.append(('selector', ' '.join(selector.split()), column, indent))
+    if language in _METHOD_LANGUAGES and state is None and not symbols:
+        match = _METHOD.match(text)
+        if match:
+            symbols.append(('method', match.group(1), match.start(1), indent))
+    return symbols, end_state
+
+class SymbolIndex:
+    """Definitions of a document, one entry per line, kept in sync with its edits.
+    
+    The whole document is lexed once per language in a worker thread.
+    After that an edit re-lexes only the lines it touched, plus the lines
+    below as long as their start state changed (an opened multi-line
+    string); a change cascading further than RELEX_LIMIT lines goes back
+    to the worker. Edits made while the worker lexes are replayed on its
+    result, re-lexing the lines they touched. on_change is called when
+    the definitions changed.
+    """
+    
+    RELEX_LIMIT = 200
+    
+    def __init__(self, document, text_widget=None):
+        self.document = document
+        self.text_widget = text_widget  # None: build synchronously
+        self.language = None
+        self.lexer = None
+        self.states = []  # lexer state at the end of each line
+        self.symbols = []  # per line: tuple of (kind, name, column, indent)
+        self.ready = False
+        self.on_change = None
+        self._job = 0
+        self._edits = []  # (first line, removed lines, inserted lines) since the running build's snapshot
+        document.add_listener(self.on_edit)
+    
+    def set_language(self, language):
+        """Switch language and rebuild the index"""
+        self.language = language
+        self.lexer = get_lexer(language)
+        self.states = []
+        self.symbols = []
+        self.ready = False
+        self._job += 1
+        if self.lexer is not None:
+            self.build()
+        elif self.on_change:
+            self.on_change()
+    
+    def build(self):
+        """Lex the whole document (in a worker thread when there is a widget)"""
+        self._job += 1
+        self._edits = []
+        job = self._job
+        if self.text_widget is None:
+            self._install(job, *self._lex_lines(self.document.get_text().split('\n')))
+            return
+        spans = self.document.snapshot()
+        ui_queue.expect(self.text_widget)
+        threading.Thread(target=self._lex_snapshot, args=(job, spans), daemon=True).start()
+    
+    def _lex_lines(self, lines, state=None):
+        language, lexer = self.language, self.lexer
+        states = []
+        symbols = []
+        for text in lines:
+            found, state = line_symbols(language, lexer, text, state)
+            states.append(state)
+            symbols.append(tuple(found))
+        return states, symbols
+    
+    def _lex_snapshot(self, job, spans):
+        """Worker: lex a document snapshot"""
+        try:
+            states, symbols = self._lex_lines(join_snapshot(spans).split('\n'))
+            ui_queue.post(lambda: self._install(job, states, symbols))
+        except Exception as e:
+            ui_queue.cancel()
+            print(f"Error indexing symbols: {e}")
+    
+    def _install(self, job, states, symbols):
+        """Main thread: adopt a full lex, re-lexing the lines edited since its snapshot"""
+        if job != self._job:
+            return  # superseded
+        self.states = states
+        self.symbols = symbols
+        self.ready = True
+        
+        # Replay the edits on the line lists, keeping the range of lines they touched
+        first = last = None
+        for start, removed, inserted in self._edits:
+            end = start + removed
+            self.states[start:end + 1] = [_UNKNOWN] * (inserted + 1)
+            self.symbols[start:end + 1] = [()] * (inserted + 1)
+            if first is None:
+                first, last = start, start + inserted
+            else:
+                if last > end:
+                    last += inserted - removed
+                elif last >= start:
+                    last = start + inserted
+                first, last = min(first, start), max(last, start + inserted)
+        self._edits = []
+        if first is not None and self._relex(first, last, _UNKNOWN, None) is None:
+            return  # too much to re-lex here: built again
+        if self.on_change:
+            self.on_change()
+    
+    def on_edit(self, edit):
+        """Document listener: re-lex the edited lines and any lines whose start state changed"""
+        if self.lexer is None:
+            return
+        first = edit.start_line - 1
+        last = first + edit.removed_lines  # 0-based, inclusive
+        if not self.ready:
+            self._edits.append((first, edit.removed_lines, edit.inserted_lines))  # replayed on the running build
+            return
+        old_end_state = self.states[last]
+        old_symbols = self.symbols[first:last + 1]
+        self.states[first:last + 1] = [_UNKNOWN] * (edit.inserted_lines + 1)
+        self.symbols[first:last + 1] = [()] * (edit.inserted_lines + 1)
+        if self._relex(first, first + edit.inserted_lines, old_end_state, old_symbols) and self.on_change:
+            self.on_change()
+    
+    def _relex(self, first, last, old_end_state, old_symbols):
+        """Re-lex lines first..last (0-based) and the lines below until the old states line up again.
+        
+        old_end_state is the state line last ended in before, and
+        old_symbols the replaced definitions. Returns whether the
+        definitions changed, or None when the change cascaded past
+        RELEX_LIMIT lines and the document is lexed again.
+        """
+        lines = self.document.get_lines(first + 1, last + 1).split('\n')
+        states, symbols = self._lex_lines(lines, self.states[first - 1] if first else None)
+        self.states[first:last + 1] = states
+        self.symbols[first:last + 1] = symbols
+        changed = old_symbols != symbols
+        
+        # Follow a changed end state down until the old states line up again
+        line = last + 1
+        state = states[-1]
+        while state != old_end_state and line < len(self.states):
+            if line - last > self.RELEX_LIMIT:
+                self.ready = False  # the lines below are stale until the build arrives
+                self.build()
+                return None
+            old_end_state = self.states[line]
+            states, symbols = self._lex_lines([self.document.get_line(line + 1)], state)
+            state = states[0]
+            changed = changed or symbols[0] != self.symbols[line]
+            self.states[line] = state
+            self.symbols[line] = symbols[0]
+            line += 1
+        return changed
+    
+    def outline(self):
+        """Definitions in document order as (line, kind, name, column, depth).
+        
+        Nesting follows indentation: a function indented under a class is a
+        method. Only the least indented keys of JSON and YAML files are
+        listed.
+        """
+        key_indent = None
+        if self.language in ('json', 'yaml'):
+            key_indent = min((symbol[3] for symbols in self.symbols for symbol in symbols), default=0)
+        outline = []
+        stack = []  # (indent, kind) of the enclosing definitions
+        for line, symbols in enumerate(self.symbols, 1):
+            for kind, name, column, indent in symbols:
+                if kind == 'key' and indent > key_indent:
+                    continue
+                while stack and stack[-1][0] >= indent:
+                    stack.pop()
+                in_class = bool(stack) and stack[-1][1] == 'class'
+                if kind == 'function' and in_class:
+                    kind = 'method'
+                elif kind == 'method' and not in_class:
+                    continue  # a call followed by a block, not a definition
+                outline.append((line, kind, name, column, len(stack)))
+                if kind in _CONTAINERS:
+                    stack.append((indent, kind))
+        return outline
+    
+    def find(self, query, limit=200):
+        """Outline entries whose name contains query (case-insensitive), best first"""
+        query = query.lower()
+        matches = []
+        for entry in self.outline():
+            position = entry[2].lower().find(query)
+            if position != -1:
+                matches.append((position != 0, entry[0], entry))
+        matches.sort(key=lambda match: match[:2])
+        return [entry for _, _, entry in matches[:limit]]
@@ -0,0 +1,267 @@
+# Word index: reference-counted document words for completion
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+
+from core.document import join_snapshot
+from core.ui_queue import ui_queue
+from syntax.ranking import lead_chars, word_entry
+
+WORD = re.compile(r'\b\w{3,}\b')  # words with 3+ characters
+_HEAD = re.compile(r'\w*')
+_TAIL = re.compile(r'\w*\Z')
+
+class WordCounts:
+    """Words with their number of occurrences, sorted for prefix lookups.
+    
+    Words are kept in a list sorted case-insensitively, so the words
+    starting with a prefix are a contiguous run found by binary search and
+    the first few of them cost O(log n + k) however many words there are.
+    The same entries are also grouped by first character and length, in
+    the same order, so fuzzy matching can read the shortest words first,
+    and within those by the characters a gapless fuzzy match can take
+    second (see lead_chars), so it can read only the words it may match.
+    Each entry carries the word's character mask for the fuzzy matcher.
+    
+    snapshot() hands the sorted lists to another thread without copying
+    them: after it, update() copies a list before its first change.
+    """
+    
+    CHUNK = 4096  # entries fed to a matcher between checks for cancellation
+    
+    def __init__(self, counts=None):
+        self.counts = Counter(counts or ())
+        self.keys = sorted(word_entry(word) for word in self.counts)  # (lowercase, word, mask)
+        self.lengths = {}  # first character -> {word length: sorted entries}
+        self.leads = {}  # (first character, word length, lead character or None) -> sorted entries
+        self._owned = None  # ids of the groups not shared with a snapshot (None: all of them)
+        for key in self.keys:
+            for entries in self._buckets(key):
+                entries.append(key)
+    
+    def _buckets(self, key):
+        """Sorted entry lists holding key besides self.keys, safe to change"""
+        first, length = key[0][:1], len(key[1])
+        yield self._own(self.lengths.setdefault(first, {}), length)
+        for char in lead_chars(key[1]) or (None,):
+            yield self._own(self.leads, (first, length, char))
+    
+    def _own(self, groups, name):
+        """groups[name], copied first if a snapshot may be reading it"""
+        entries = groups.get(name)
+        if entries is None:
+            entries = groups[name] = []
+        elif self._owned is not None and id(entries) not in self._owned:
+            entries = groups[name] = entries[:]
+        if self._owned is not None:
+            self._owned.add(id(entries))
+        return entries
+    
+    def snapshot(self):
+        """The words as they are now, for complete() and fuzzy() on another thread.
+        
+        Only the thread calling update() may take snapshots; the view
+        does not count occurrences.
+        """
+        view = WordCounts()
+        view.keys = self.keys
+        view.lengths = {first: dict(groups) for first, groups in self.lengths.items()}
+        view.leads = dict(self.leads)
+        self._owned = set()
+        return view
+    
+    def update(self, delta):
+        """Apply {word: change in occurrences}, dropping the words no longer used"""
+        counts = self.counts
+        for word, change in delta.items():
+            if not change:
+                continue
+            count = counts.get(word, 0) + change
+            if count <= 0:
+                if word in counts:
+                    del counts[word]
+                    key = word_entry(word)
+                    for entries in (self._own(vars(self), 'keys'), *self._buckets(key)):
+                        i = bisect_left(entries, key)
+                        if i < len(entries) and entries[i] == key:
+                            del entries[i]
+            else:
+                if word not in counts:
+                    key = word_entry(word)
+                    for entries in (self._own(vars(self), 'keys'), *self._buckets(key)):
+                        insort(entries, key)
+                counts[word] = count
+    
+    def complete(self, prefix, limit=10, exclude=None):
+        """First words (case-insensitive order) starting with prefix, ignoring case"""
+        prefix = prefix.lower()
+        keys = self.keys
+        words = []
+        i = bisect_left(keys, (prefix,))
+        while i < len(keys) and len(words) < limit and keys[i][0].startswith(prefix):
+            if keys[i][1] != exclude:
+                words.append(keys[i][1])
+            i += 1
+        return words
+    
+    def fuzzy(self, matcher, exclude=None, cancelled=None):
+        """Feed a FuzzyMatcher the words that can match it.
+        
+        Matches start with the query's first character, so only the words
+        starting with it are read, shortest first as longer words score
+        less, in passes from the best matches down, each stopping at the
+        first length matcher.can_enter() rules out: the words starting
+        with the whole query, then those that may match without a gap
+        (see lead_chars), then the rest, which the first two passes have
+        usually ruled out already. Words with acceptances, whose boost can
+        outweigh their length, are scored last. When given, cancelled() is
+        polled every CHUNK words and stops the scan once it returns True.
+        """
+        first = matcher.first
+        lengths = self.lengths.get(first)
+        if not lengths:
+            return
+        start_key, stop_key = (matcher.lower,), (matcher.lower + '\U0010ffff',)
+        for prefix, gaps in ((True, 0), (False, 0), (False, 1)):
+            for length in sorted(lengths):
+                if not matcher.can_enter(length, prefix, gaps):
+                    break
+                entries = lengths[length]
+                start = bisect_left(entries, start_key)
+                stop = bisect_left(entries, stop_key, start)
+                if prefix:
+                    runs = [(entries, start, stop)]
+                elif not gaps:
+                    runs = [(leads, 0, len(leads)) for leads in (self.leads.get((first, length, matcher.lower[1:2])),
+                                                                 self.leads.get((first, length, None))) if leads]
+                else:
+                    runs = [(entries, 0, start), (entries, stop, len(entries))]
+                for entries, begin, end in runs:
+                    for i in range(begin, end, self.CHUNK):
+                        if cancelled is not None and cancelled():
+                            return
+                        matcher.add(entries[i:min(end, i + self.CHUNK)], exclude)
+        matcher.add([entry for entry in matcher.accepted() if self._holds(lengths, entry)], exclude)
+    
+    @staticmethod
+    def _holds(lengths, entry):
+        """Whether the groups of entry's first character hold it"""
+        entries = lengths.get(len(entry[1]), ())
+        i = bisect_left(entries, entry)
+        return i < len(entries) and entries[i] == entry
+    
+    def count(self, word):
+        """Number of occurrences of a word"""
+        return self.counts.get(word, 0)
+    
+    def __len__(self):
+        return len(self.keys)
+
+class WordIndex(WordCounts):
+    """Words of a document, kept in sync with its edits.
+    
+    An edit only recounts the words it touched: the text from the start of
+    the word before the edit to the end of the word after it is counted
+    against the same span before the edit (rebuilt from the removed text)
+    and only the difference is applied, so a keystroke in a huge minified
+    line costs no more than in a short one. The first count and edits
+    larger than REBUILD_SIZE go to a worker thread; the changes of the
+    edits made while it counts are kept aside and applied to its result.
+    """
+    
+    REBUILD_SIZE = 1024 * 1024
+    
+    def __init__(self, document, text_widget=None):
+        super().__init__()
+        self.document = document
+        self.text_widget = text_widget  # None: build synchronously
+        self.ready = False
+        self.paused = False  # edits are ignored until the next build()
+        self._job = 0
+        self._backlog = Counter()  # changes of the edits made since the running build's snapshot
+        document.add_listener(self.on_edit)
+        self.build()
+    
+    def build(self):
+        """Count the whole document (in a worker thread when there is a widget)"""
+        self._job += 1
+        self._backlog = Counter()
+        self.paused = False
+        job = self._job
+        if self.text_widget is None:
+            self._install(job, WordCounts(WORD.findall(self.document.get_text())))
+            return
+        spans = self.document.snapshot()
+        ui_queue.expect(self.text_widget)
+        threading.Thread(target=self._count_snapshot, args=(job, spans), daemon=True).start()
+    
+    def _count_snapshot(self, job, spans):
+        """Worker: count the words of a document snapshot"""
+        try:
+            counts = WordCounts(WORD.findall(join_snapshot(spans)))
+            ui_queue.post(lambda: self._install(job, counts))
+        except Exception as e:
+            ui_queue.cancel()
+            print(f"Error indexing words: {e}")
+    
+    def _install(self, job, counts):
+        """Main thread: adopt a full count, with the edits made since its snapshot"""
+        if job != self._job:
+            return  # superseded
+        self.counts, self.keys, self.lengths, self.leads = counts.counts, counts.keys, counts.lengths, counts.leads
+        self._owned = None  # a snapshot may still share the old groups, not these
+        self.update(self._backlog)
+        self._backlog = Counter()
+        self.ready = True
+    
+    def pause(self):
+        """Drop the counts and ignore edits until the next build() (a file streaming in)"""
+        self._job += 1
+        empty = WordCounts()
+        self.counts, self.keys, self.lengths, self.leads = empty.counts, empty.keys, empty.lengths, empty.leads
+        self._owned = None
+        self.paused = True
+        self.ready = False
+    
+    def on_edit(self, edit):
+        """Document listener: recount the words of the edited lines"""
+        if self.paused:
+            return
+        if len(edit.removed) + len(edit.inserted) > self.REBUILD_SIZE:
+            self.ready = False
+            self.build()
+            return
+        first, end = edit.offset, edit.offset + len(edit.inserted)
+        start = self._word_start(first)
+        stop = self._word_end(end)
+        before = self.document.get_text(start, first)
+        after = self.document.get_text(end, stop)
+        delta = Counter(WORD.findall(before + edit.inserted + after))
+        delta.subtract(WORD.findall(before + edit.removed + after))
+        if self.ready:
+            self.update(delta)
+        else:
+            self._backlog.update(delta)  # applied on top of the running build
+    
+    def _word_start(self, offset):
+        """Start of the run of word characters ending at offset"""
+        start = offset
+        while start > 0:
+            chunk = self.document.get_text(max(0, start - 64), start)
+            run = len(_TAIL.search(chunk).group())
+            start -= run
+            if run < len(chunk):
+                break
+        return start
+    
+    def _word_end(self, offset):
+        """End of the run of word characters starting at offset"""
+        end, length = offset, len(self.document)
+        while end < length:
+            chunk = self.document.get_text(end, min(length, end + 64))
+            run = _HEAD.match(chunk).end()
+            end += run
+            if run < len(chunk):
+                break
+        return end
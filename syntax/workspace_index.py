@@ -0,0 +1,212 @@
+# Workspace completion index: words of the files around the open ones
+import heapq
+import json
+import os
+import threading
+from collections import Counter
+
+from config import Config
+from core.save_service import write_atomic
+from syntax.word_index import WORD, WordCounts
+
+def workspace_cache_path():
+    """File caching the word counts of workspace files between sessions"""
+    return os.path.join(Config.CACHE_DIR, 'workspace_words.json')
+
+class WorkspaceIndex:
+    """Words of every source file under the workspace root, plus the open tabs.
+    
+    refresh() walks the root in a worker thread. Files whose mtime and
+    size match the cache are not read again, and the cache is written back
+    to disk, so a restart only reads the files changed since; a saved file
+    is recounted alone by update_file(). The workers keep the counts of
+    the root and publish a snapshot of them after each change, replacing
+    the published one in one assignment, so complete() never waits on the
+    worker: it answers from
+    the last finished scan and from the word indexes of the open tabs,
+    which are always current (the completion worker ranks snapshots of
+    those, see document_snapshots).
+    """
+    
+    SKIP_DIRS = {'node_modules', '__pycache__', 'venv', 'env', 'build', 'dist', 'target'}
+    
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+        self.root = None
+        self.words = WordCounts()  # published by the worker, read by complete()
+        self.documents = []  # WordIndex of each open tab
+        self._cache = None  # path -> [mtime, size, {word: count}], loaded by the worker
+        self._cache_changed = False
+        self._counts = None  # WordCounts of the last scanned root, changed by the workers only
+        self._counted = set()  # paths whose words are in _counts
+        self._counted_job = None  # refresh that _counts belongs to
+        self._job = 0
+        self._thread = None
+        self._lock = threading.Lock()  # one worker at a time touches the cache and the counts
+    
+    def add_document(self, word_index):
+        """Include an open tab's words in completions"""
+        self.documents.append(word_index)
+    
+    def remove_document(self, word_index):
+        """Stop completing from a closed tab"""
+        if word_index in self.documents:
+            self.documents.remove(word_index)
+    
+    def refresh(self, root):
+        """Rescan the files under root in the background.
+        
+        The home folder and the filesystem roots, where the file explorer
+        starts, are not workspaces: nothing is indexed until a project
+        folder is opened.
+        """
+        root = os.path.abspath(str(root))
+        self._job += 1
+        if root == os.path.expanduser('~') or os.path.dirname(root) == root:
+            self.root = None
+            self.words = WordCounts()
+            return
+        self.root = root
+        self._thread = threading.Thread(target=self._scan, args=(self._job, self.root), daemon=True)
+        self._thread.start()
+    
+    def update_file(self, path):
+        """Recount a saved file in the background, if it is part of the workspace"""
+        path = os.path.abspath(path)
+        if self.root is None or not path.startswith(os.path.join(self.root, '')):
+            return
+        if os.path.splitext(path)[1].lower() not in Config.LANGUAGE_EXTENSIONS:
+            return
+        self._thread = threading.Thread(target=self._update, args=(self._job, self.root, path), daemon=True)
+        self._thread.start()
+    
+    def complete(self, prefix, limit=10, exclude=None):
+        """First words starting with prefix in the workspace and the open tabs"""
+        words = set(self.words.complete(prefix, limit, exclude))
+        for document in list(self.documents):
+            words.update(document.complete(prefix, limit, exclude))
+        return heapq.nsmallest(limit, words, key=lambda word: (word.lower(), word))
+    
+    def document_snapshots(self, skip=None):
+        """Snapshots of the open tabs' words but skip's, for fuzzy() on the worker (UI thread only)"""
+        return [document.snapshot() for document in self.documents if document is not skip]
+    
+    def fuzzy_files(self, matcher, exclude=None, cancelled=None):
+        """Feed a FuzzyMatcher the words of the workspace files.
+        
+        Safe from any thread: a published scan is never modified.
+        """
+        self.words.fuzzy(matcher, exclude, cancelled)
+    
+    # Worker
+    
+    def _cache_file(self):
+        return self.cache_path or workspace_cache_path()
+    
+    def _load_cache(self):
+        try:
+            with open(self._cache_file(), encoding='utf-8') as f:
+                cache = json.load(f)
+            return cache if isinstance(cache, dict) else {}
+        except (OSError, ValueError):
+            return {}
+    
+    def _save_cache(self, root):
+        """Write the cache, keeping only the files under root"""
+        prefix = os.path.join(root, '')
+        for path in [path for path in self._cache if not path.startswith(prefix)]:
+            del self._cache[path]
+        try:
+            os.makedirs(os.path.dirname(self._cache_file()), exist_ok=True)
+            write_atomic(self._cache_file(), json.dumps(self._cache, ensure_ascii=False).encode('utf-8'))
+        except OSError as e:
+            print(f"Error saving workspace index: {e}")
+    
+    def _source_files(self, root):
+        """Indexable files under root (hidden and dependency directories skipped)"""
+        extensions = Config.LANGUAGE_EXTENSIONS
+        found = 0
+        for directory, dirs, files in os.walk(root):
+            dirs[:] = [d for d in dirs if not d.startswith('.') and d not in self.SKIP_DIRS]
+            for name in files:
+                if os.path.splitext(name)[1].lower() in extensions and not name.startswith('.'):
+                    yield os.path.join(directory, name)
+                    found += 1
+                    if found >= Config.WORKSPACE_MAX_FILES:
+                        return
+    
+    def _scan(self, job, root):
+        """Worker: count the words of every file under root, reusing cached counts"""
+        try:
+            with self._lock:
+                if self._cache is None:
+                    self._cache = self._load_cache()
+                cache = self._cache
+                total = Counter()
+                counted = set()
+                for path in self._source_files(root):
+                    if job != self._job:
+                        return  # superseded by a newer refresh
+                    try:
+                        stat = os.stat(path)
+                        entry = cache.get(path)
+                        if entry is None or entry[0] != stat.st_mtime or entry[1] != stat.st_size:
+                            if stat.st_size > Config.WORKSPACE_MAX_FILE_SIZE:
+                                continue
+                            with open(path, encoding='utf-8', errors='ignore') as f:
+                                entry = [stat.st_mtime, stat.st_size, Counter(WORD.findall(f.read()))]
+                            cache[path] = entry
+                            self._cache_changed = True
+                        total.update(entry[2])
+                        counted.add(path)
+                    except OSError:
+                        continue
+                
+                # Forget the files not counted: deleted, or outside root
+                for path in [path for path in cache if path not in counted]:
+                    del cache[path]
+                    self._cache_changed = True
+                
+                if job == self._job:
+                    self._counts, self._counted, self._counted_job = WordCounts(total), counted, job
+                    self.words = self._counts.snapshot()
+                if self._cache_changed:
+                    self._cache_changed = False
+                    self._save_cache(root)
+        except Exception as e:
+            print(f"Error indexing workspace: {e}")
+    
+    def _update(self, job, root, path):
+        """Worker: apply the change of one file's words to the counts of root"""
+        try:
+            with self._lock:
+                if job != self._job or job != self._counted_job:
+                    return  # another root, or its scan has not started and will read the file itself
+                entry = self._cache.get(path)
+                delta = Counter()
+                if entry is not None and path in self._counted:
+                    delta.subtract(entry[2])
+                    self._counted.discard(path)
+                try:
+                    stat = os.stat(path)
+                    if stat.st_size <= Config.WORKSPACE_MAX_FILE_SIZE:
+                        if entry is None or entry[0] != stat.st_mtime or entry[1] != stat.st_size:
+                            with open(path, encoding='utf-8', errors='ignore') as f:
+                                entry = [stat.st_mtime, stat.st_size, Counter(WORD.findall(f.read()))]
+                            self._cache[path] = entry
+                            self._cache_changed = True
+                        delta.update(entry[2])
+                        self._counted.add(path)
+                except OSError:
+                    pass
+                self._counts.update(delta)
+                if job == self._job:
+                    self.words = self._counts.snapshot()
+                if self._cache_changed:
+                    self._cache_changed = False
+                    self._save_cache(root)
+        except Exception as e:
+            print(f"Error indexing {path}: {e}")
+
+# Global workspace index instance
+workspace_index = WorkspaceIndex()
@@ -140,6 +140,1292 @@ def test_language_support():
         print(f"❌ Language support test failed: {e}")
         return False
 
+def test_document_model():
+    """Test the piece-table document model against a plain string"""
+    from core.document import PieceTable
+    
+    text = "def hello():\n    return 1\n"
+    table = PieceTable(text)
+    
+    table.insert(4, "say_")
+    text = text[:4] + "say_" + text[4:]
+    table.insert(len(text), "print(say_hello())\n")
+    text += "print(say_hello())\n"
+    start = text.index('return')
+    removed = table.delete(start, 7)
+    assert removed == "return "
+    text = text[:start] + text[start + 7:]
+    
+    assert table.get_text() == text
+    assert table.line_count == text.count('\n') + 1
+    assert table.get_line(2) == text.split('\n')[1]
+    assert table.offset_to_position(text.index('print')) == (3, 0)
+    assert table.line_start(3) == text.index('print')
+    assert table.find('say_hello') == text.find('say_hello')
+    print(f"✓ Piece table: {table.piece_count} pieces, {table.line_count} lines")
+    return True
+
+def test_line_index():
+    """Test the line start table against the text it follows"""
+    import random
+    from core.line_index import LineStartIndex
+    
+    text = "one\ntwo\n\nfour\n" * 20
+    lines = LineStartIndex(text)
+    random.seed(1)
+    for _ in range(300):
+        offset = random.randint(0, len(text))
+        removed = text[offset:offset + random.randint(0, 3)]
+        inserted = random.choice(["", "x", "\n", "ab\ncd\n"])
+        lines.update(offset, removed, inserted)
+        text = text[:offset] + inserted + text[offset + len(removed):]
+    
+    assert lines.line_count == text.count('\n') + 1
+    for offset in range(len(text) + 1):
+        line = text.count('\n', 0, offset) + 1
+        column = offset - (text.rfind('\n', 0, offset) + 1)
+        assert lines.index(offset) == f"{line}.{column}"
+        assert lines.offset(line, column) == offset
+    print(f"✓ Line index: {lines.line_count} lines after 300 edits")
+    return True
+
+def test_fold_index():
+    """Test indentation and bracket fold ranges and their edit updates"""
+    from core.document import TextDocument
+    from syntax.brackets import BracketIndex
+    from syntax.folding import FoldIndex
+    
+    document = TextDocument()
+    document.apply_edit(0, 0, "class A:\n    def f(self):\n        pass\n\n    x = 1\ny = 2\n")
+    folds = FoldIndex(document)
+    folds.set_language('python')
+    assert folds.fold_end(1) == 5 and folds.fold_end(2) == 3
+    assert folds.fold_end(3) is None and not folds.foldable(6)
+    
+    document.apply_edit(document.lines.line_start(6), 0, "    z = 3\n")
+    assert folds.fold_end(1) == 6
+    
+    document = TextDocument()
+    document.apply_edit(0, 0, '{\n  "a": [1,\n    2],\n  "b": "}"\n}\n')
+    folds = FoldIndex(document)
+    folds.set_language('json')
+    assert folds.fold_end(1) == 4  # the closing brace stays visible
+    assert folds.fold_end(2) is None  # closed on the next line
+    
+    # Brackets inside multi-line comments and template literals do not fold
+    document = TextDocument()
+    document.apply_edit(0, 0, 'f({\n  /* {\n  [ */\n  s = `{\n  (`,\n  g(1)\n});\n')
+    brackets = BracketIndex(document)
+    brackets.set_language('javascript')
+    folds = FoldIndex(document, brackets)
+    folds.set_language('javascript')
+    assert [line for line in range(1, 8) if folds.foldable(line)] == [1]
+    assert folds.summary(3) == (0, 0, 'm0') and folds.summary(5)[:2] == (0, 0)
+    
+    # Closing the comment earlier changes the state the lines below start in
+    document.apply_edit(document.lines.line_start(2) + 6, 0, '*/')
+    assert folds.foldable(2) is False and folds.summary(3)[:2] == (0, 1)
+    print("✓ Fold index: indentation and bracket ranges follow edits")
+    return True
+
+def test_bracket_index():
+    """Test bracket matching, enclosing pairs and depth across edits"""
+    import time
+    from core.document import TextDocument
+    from core.ui_queue import UiQueue
+    import syntax.brackets as brackets_module
+    from syntax.brackets import BracketIndex
+    
+    document = TextDocument()
+    document.apply_edit(0, 0, 'f(a, "(", [1, 2]) // )\n{ g(x) }\n')
+    brackets = BracketIndex(document)
+    brackets.BLOCK_SIZE = 2  # exercise the tree across several blocks
+    brackets.set_language('javascript')
+    text = document.get_text()
+    assert brackets.match(1) == text.index(')', 16) and brackets.match(text.index('[')) == text.index(']')
+    assert not brackets.is_bracket(text.index('"(') + 1)  # inside a string
+    assert brackets.enclosing(text.index('x')) == (text.index('g(') + 1, text.index('x)') + 1)
+    assert brackets.depth_at(text.index('x')) == 2 and brackets.depth_at(0) == 0
+    
+    # Opening a string hides the brackets after it on the line
+    document.apply_edit(text.index('[') - 1, 0, '"')
+    text = document.get_text()
+    assert brackets.match(1) is None and brackets.match(text.index('{')) == text.index('}')
+    document.apply_edit(len(document), 0, ')')
+    assert brackets.match(1) == len(document) - 1
+    
+    # Multi-line comments and template literals hide their brackets on every line
+    document = TextDocument()
+    document.apply_edit(0, 0, 'f(a, /* (\n [ */ b)\nlet s = `{\n)`;\n{ }\n')
+    brackets = BracketIndex(document)
+    brackets.set_language('javascript')
+    text = document.get_text()
+    assert brackets.match(1) == text.index('b)') + 1 and brackets.match(text.index('{ }')) == text.index('}', text.index('{ }'))
+    assert not brackets.is_bracket(text.index('[')) and not brackets.is_bracket(text.index('`{') + 1)
+    
+    # Opening a comment above hides the brackets below until it is closed
+    document.apply_edit(0, 0, '/*\n')
+    assert brackets.match(4) is None and not brackets.is_bracket(4)
+    document.apply_edit(text.index('b)') + 3, 0, '*/')
+    text = document.get_text()
+    assert brackets.match(text.index('{ }')) == text.index('{ }') + 2 and not brackets.is_bracket(4)
+    document.apply_edit(0, 3, '')
+    assert brackets.match(1) == document.get_text().index('b)') + 1
+    
+    # Brackets in a docstring are not code
+    document = TextDocument()
+    document.apply_edit(0, 0, 'def f(x):\n    """Return (x\n    [sic."""\n    return [x]\n')
+    brackets = BracketIndex(document)
+    brackets.set_language('python')
+    text = document.get_text()
+    assert not brackets.is_bracket(text.index('(x', 9)) and not brackets.is_bracket(text.index('[sic'))
+    assert brackets.match(text.index('[x')) == text.index('x]') + 1 and brackets.depth_at(text.index('x]')) == 1
+    
+    # Edits made while the worker scans are replayed on its result instead of starting over
+    class Widget:
+        def after(self, delay, callback):
+            return 'after#1'
+    
+    document = TextDocument()
+    document.apply_edit(0, 0, ''.join(f'f{i}(a, [b]);\n' for i in range(300)))
+    shared = brackets_module.ui_queue
+    brackets_module.ui_queue = queue = UiQueue()
+    try:
+        brackets = BracketIndex(document, Widget())
+        brackets.set_language('javascript')
+        document.apply_edit(document.lines.line_start(11), 0, '/* (\n')
+        document.apply_edit(document.lines.line_start(14), 0, '*/ {\n')
+        document.apply_edit(0, len('f0(a, '), '')
+        builds = brackets._job
+        while queue.pending:
+            time.sleep(0.001)
+            queue.poll()
+        assert brackets.ready and brackets._job == builds
+        expected = BracketIndex(document)
+        expected.set_language('javascript')
+        text = document.get_text()
+        assert [brackets.match(i) for i in range(len(text))] == [expected.match(i) for i in range(len(text))]
+        assert not brackets.is_bracket(text.index('/* (') + 3) and brackets.is_bracket(text.index('*/ {') + 3)
+    finally:
+        brackets_module.ui_queue = shared
+    print("✓ Bracket index: matches skip strings and comments, across lines too, and follow edits")
+    return True
+
+def test_symbol_index():
+    """Test the symbol outline and its incremental updates"""
+    import time
+    from core.document import TextDocument
+    from core.ui_queue import UiQueue
+    import syntax.symbols as symbols_module
+    from syntax.symbols import SymbolIndex
+    
+    document = TextDocument()
+    document.apply_edit(0, 0, 'class A:\n    def f(self):\n        """def hidden():"""\n\ndef g():\n    pass\n')
+    symbols = SymbolIndex(document)
+    symbols.set_language('python')
+    assert [entry[1:3] for entry in symbols.outline()] == [('class', 'A'), ('method', 'f'), ('function', 'g')]
+    
+    # Opening a string re-lexes the lines below it
+    changes = []
+    symbols.on_change = lambda: changes.append(True)
+    document.apply_edit(document.lines.line_start(4), 0, '"""\n')
+    assert [entry[2] for entry in symbols.outline()] == ['A', 'f'] and changes
+    document.apply_edit(document.lines.line_start(4), 4, '')
+    assert symbols.outline()[-1] == (5, 'function', 'g', 4, 0)
+    assert [entry[2] for entry in symbols.find('F')] == ['f']
+    
+    # Edits made while the worker lexes are replayed; a long cascade goes back to the worker
+    class Widget:
+        def after(self, delay, callback):
+            return 'after#1'
+    
+    def full_outline():
+        index = SymbolIndex(document)
+        index.set_language('python')
+        return index.outline()
+    
+    def finish():
+        while queue.pending:
+            time.sleep(0.001)
+            queue.poll()
+    
+    document = TextDocument()
+    document.apply_edit(0, 0, ''.join(f'def f{i}():\n    pass\n' for i in range(300)))
+    shared = symbols_module.ui_queue
+    symbols_module.ui_queue = queue = UiQueue()
+    try:
+        symbols = SymbolIndex(document, Widget())
+        symbols.set_language('python')
+        document.apply_edit(document.lines.line_start(11), 0, 'def g():\n"""\n')
+        document.apply_edit(document.lines.line_start(13), 0, '"""\n')
+        document.apply_edit(document.lines.line_start(3), len('def f1():\n'), '')
+        finish()
+        assert symbols.ready and symbols.outline() == full_outline()
+        assert [entry[2] for entry in symbols.outline()[:6]] == ['f0', 'f2', 'f3', 'f4', 'g', 'f5']
+        
+        document.apply_edit(document.lines.line_start(20), 0, '"""\n')
+        assert not symbols.ready
+        finish()
+        assert symbols.ready and symbols.outline() == full_outline() and len(symbols.outline()) == 9
+    finally:
+        symbols_module.ui_queue = shared
+    
+    document = TextDocument()
+    document.apply_edit(0, 0, '{\n  "name": "x",\n  "deps": {\n    "a": "1"\n  }\n}\n')
+    symbols = SymbolIndex(document)
+    symbols.set_language('json')
+    assert [entry[2] for entry in symbols.outline()] == ['name', 'deps']
+    print(f"✓ Symbol index: {len(symbols.outline())} top-level keys, Python outline follows edits")
+    return True
+
+def test_word_index():
+    """Test the completion word index against a full recount"""
+    import time
+    from collections import Counter
+    from core.document import TextDocument
+    from core.ui_queue import UiQueue
+    import syntax.word_index as word_index
+    from syntax.word_index import WORD, WordIndex
+    
+    document = TextDocument()
+    document.apply_edit(0, 0, "alpha beta Alpine\nalphabet beta\n")
+    words = WordIndex(document)
+    assert words.complete('al') == ['alpha', 'alphabet', 'Alpine']
+    assert words.complete('alpha', exclude='alpha') == ['alphabet'] and words.count('beta') == 2
+    
+    document.apply_edit(document.get_text().index('beta'), 4, "gamma")  # beta -> gamma
+    document.apply_edit(2, 0, "\n")  # splits alpha
+    document.apply_edit(len(document), 0, "alpha")
+    assert words.counts == Counter(WORD.findall(document.get_text()))
+    assert words.complete('al') == ['alpha', 'alphabet', 'Alpine'] and words.count('beta') == 1
+    
+    # Edits made while the worker counts are applied to its result
+    class Widget:
+        def after(self, delay, callback):
+            return 'after#1'
+    
+    shared = word_index.ui_queue
+    word_index.ui_queue = queue = UiQueue()
+    try:
+        background = WordIndex(document, Widget())
+        document.apply_edit(0, 0, "delta ")
+        document.apply_edit(document.get_text().index('gamma'), 5, "")
+        while queue.pending:
+            time.sleep(0.001)
+            queue.poll()
+    finally:
+        word_index.ui_queue = shared
+    assert background.ready and background.counts == Counter(WORD.findall(document.get_text()))
+    assert background.complete('de') == ['delta'] and background.count('gamma') == 0
+    
+    # Paused while a file streams in: chunks are not counted, build() counts them once
+    words.pause()
+    document.apply_edit(len(document), 0, " streamed")
+    assert not words.ready and not words.counts and words.complete('st') == []
+    words.build()
+    assert words.ready and words.counts == Counter(WORD.findall(document.get_text()))
+    print(f"✓ Word index: {len(words)} words follow edits, also during a background count")
+    return True
+
+def test_workspace_index():
+    """Test the workspace word index and its disk cache"""
+    import os
+    import tempfile
+    from core.document import TextDocument
+    from syntax.word_index import WordIndex
+    from syntax.workspace_index import WorkspaceIndex
+    
+    with tempfile.TemporaryDirectory() as root:
+        os.makedirs(os.path.join(root, 'pkg'))
+        os.makedirs(os.path.join(root, 'node_modules'))
+        with open(os.path.join(root, 'pkg', 'util.py'), 'w') as f:
+            f.write("def compute_total(): return compute_tax()\n")
+        with open(os.path.join(root, 'node_modules', 'lib.js'), 'w') as f:
+            f.write("compute_skipped\n")
+        cache_path = os.path.join(root, '.cache', 'words.json')  # hidden: not indexed itself
+        
+        workspace = WorkspaceIndex(cache_path)
+        document = TextDocument()
+        document.apply_edit(0, 0, "compute_open")
+        workspace.add_document(WordIndex(document))
+        workspace.refresh(root)
+        workspace._thread.join()
+        assert workspace.complete('comp') == ['compute_open', 'compute_tax', 'compute_total']
+        assert os.path.exists(cache_path)
+        
+        # A second session answers from the cache for unchanged files
+        restarted = WorkspaceIndex(cache_path)
+        restarted._cache = restarted._load_cache()
+        assert any(path.endswith('util.py') for path in restarted._cache)
+        restarted.refresh(root)
+        restarted._thread.join()
+        assert restarted.complete('compute_t') == ['compute_tax', 'compute_total']
+        
+        # A saved file is recounted alone; files outside the root leave the cache
+        with open(os.path.join(root, 'pkg', 'util.py'), 'w') as f:
+            f.write("def compute_totals(): return compute_vat()\n")
+        restarted._cache[os.path.join(os.path.dirname(root), 'elsewhere.py')] = [0, 0, {'compute_far': 1}]
+        restarted.update_file(os.path.join(root, 'pkg', 'util.py'))
+        restarted._thread.join()
+        assert restarted.complete('compute_t') == ['compute_totals'] and len(restarted.words) == 4
+        assert list(restarted._load_cache()) == [os.path.join(root, 'pkg', 'util.py')]
+        restarted.refresh(root)
+        restarted._thread.join()
+        assert restarted.complete('comp') == ['compute_totals', 'compute_vat']
+        
+        # The home folder the file explorer starts in is not indexed
+        restarted.refresh(os.path.expanduser('~'))
+        assert restarted.root is None and len(restarted.words) == 0
+    print(f"✓ Workspace index: {len(workspace.words)} words, cached across sessions, saved files recounted")
+    return True
+
+def test_completion_ranking():
+    """Test fuzzy matching and frecency ranking of completions"""
+    import os
+    import tempfile
+    from syntax.ranking import CompletionStats, FuzzyMatcher, word_entry
+    from syntax.word_index import WordCounts
+    
+    words = WordCounts(['get_current_word', 'getCursor', 'gcw_total', 'garbage_collect', 'legacy_words'])
+    matcher = FuzzyMatcher('gcw')
+    words.fuzzy(matcher)
+    assert matcher.best() == ['gcw_total', 'get_current_word']  # prefix first, then boundaries
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'stats.json')
+        stats = CompletionStats(path)
+        stats.accept('get_current_word')
+        matcher = FuzzyMatcher('get', stats)
+        words.fuzzy(matcher)
+        assert matcher.best()[:2] == ['get_current_word', 'getCursor']  # getCursor is shorter but never picked
+        
+        stats.accept('gcw_total', now=1000)
+        stats.accept('gcw_total', now=1000)
+        assert stats.value('gcw_total', now=1000 + CompletionStats.HALF_LIFE) == 1.0
+        stats.save()
+        assert CompletionStats(path).value('gcw_total', now=1000) == 2.0
+    
+    matcher = FuzzyMatcher('ge', limit=2)
+    matcher.add(map(word_entry, ['getattr', 'get', 'general']))
+    words.fuzzy(matcher, exclude='get')
+    assert matcher.best() == ['get', 'general']  # getattr ties with general, after it alphabetically
+    print("✓ Completion ranking: fuzzy matches ranked by quality and use")
+    return True
+
+def test_completion_ranking_speed():
+    """Test that ranking 100k words stays within a frame and matches a full scan"""
+    import random
+    import timeit
+    from syntax.ranking import CompletionStats, FuzzyMatcher
+    from syntax.word_index import WordCounts
+    
+    parts = ['get', 'set', 'list', 'text', 'line', 'count', 'total', 'item', 'node', 'value',
+             'index', 'tree', 'len', 'tag', 'title', 'to', 'it', 'lt', 'cnt', 'tmp']
+    generator = random.Random(7)
+    names = set()
+    while len(names) < 100000:
+        name = '_'.join(generator.choice(parts) for _ in range(generator.randint(1, 3)))
+        if generator.random() < 0.3:
+            name = name.title().replace('_', '')
+        names.add(name + generator.choice(['', str(generator.randint(0, 999))]))
+    names.add('list_total_line_node_value_index')
+    words = WordCounts(names)
+    stats = CompletionStats(os.devnull)
+    stats.entries = {}
+    stats.accept('list_total_line_node_value_index')  # long, but picked before
+    
+    def rank(query):
+        matcher = FuzzyMatcher(query, stats, limit=50)
+        words.fuzzy(matcher)
+        return matcher.best()
+    
+    frame = 1 / 60
+    for query in ['tt', 'cnt', 'ln', 'lt', 'li', 'l', 'gcw']:
+        elapsed = min(timeit.repeat(lambda: rank(query), number=1, repeat=5))  # without garbage collection
+        assert elapsed < frame, f"ranking '{query}' took {elapsed * 1000:.1f} ms"
+        
+        # The length cut-off must not change the result of scoring every word
+        full = FuzzyMatcher(query, stats, limit=50)
+        full.add(words.keys)
+        assert rank(query) == full.best(), query
+    
+    # An accepted word outranks shorter ones despite its length
+    assert rank('li')[0] == 'list_total_line_node_value_index'
+    print("✓ Completion ranking speed: 100k words ranked within a 60 Hz frame per query")
+    return True
+
+def test_completion_providers():
+    """Test ranking completion snapshots on the worker and dropping stale requests"""
+    from types import SimpleNamespace
+    from core.document import TextDocument
+    from core.ui_queue import UiQueue
+    import syntax.completion_providers as providers
+    from syntax.completion_providers import CompletionRequest, CompletionWorker, DocumentProvider, WorkspaceProvider
+    from syntax.word_index import WordCounts, WordIndex
+    from syntax.workspace_index import workspace_index
+    
+    document = TextDocument()
+    document.apply_edit(0, 0, "render_line render_text rename")
+    owner = SimpleNamespace(words=WordIndex(document))
+    request = CompletionRequest('ren', document.version, limit=5)
+    matcher = request.matcher()
+    DocumentProvider(owner).provide(request, matcher)
+    assert matcher.best() == ['rename', 'render_line', 'render_text']
+    
+    # A snapshot keeps the words it was taken with while the index changes
+    snapshot = DocumentProvider(owner).snapshot(request)
+    document.apply_edit(0, 0, "renal ")
+    document.apply_edit(6, len("render_line"), "")
+    later = request.matcher()
+    DocumentProvider(owner).rank(request, later, snapshot)
+    assert later.best() == ['rename', 'render_line', 'render_text']
+    later = request.matcher()
+    DocumentProvider(owner).provide(request, later)
+    assert later.best() == ['renal', 'rename', 'render_text']
+    
+    # Without a word index the document's words are a plain list, ranked by the default
+    plain = SimpleNamespace(words=None, get_document_words=lambda: ['ren', 'rent', 'apple'])
+    listed = request.matcher()
+    DocumentProvider(plain).provide(request, listed)
+    assert listed.best() == ['rent']
+    
+    # The workspace is matched on the worker; a cancelled request gets nothing
+    stale = CompletionRequest('ren')
+    stale.cancel()
+    results = []
+    published = workspace_index.words
+    workspace_index.words = WordCounts(['rendering', 'renew'])
+    try:
+        worker = CompletionWorker()
+        worker.submit(stale, [(WorkspaceProvider(), None)], None, lambda request, matches: results.append((request, matches)))
+        worker.submit(request, [(WorkspaceProvider(), None)], None, lambda request, matches: results.append((request, matches)))
+        worker.wait()
+    finally:
+        workspace_index.words = published
+    assert len(results) == 1 and results[0][0] is request
+    matcher.merge(results[0][1])
+    assert matcher.best() == ['renew', 'rename', 'rendering', 'render_line', 'render_text']
+    
+    # With a widget, results reach the callback only when the UI thread polls
+    class Widget:
+        def after(self, delay, callback):
+            polls.append(callback)
+            return 'after#%d' % len(polls)
+    
+    polls, results = [], []
+    shared = providers.ui_queue
+    providers.ui_queue = queue = UiQueue()
+    try:
+        worker.submit(stale, [(DocumentProvider(owner), snapshot)], Widget(), lambda *result: results.append(result))
+        worker.submit(request, [(DocumentProvider(owner), snapshot)], Widget(), lambda *result: results.append(result))
+        worker.wait()
+        assert not results and len(polls) == 1 and queue.pending == 2
+        polls.pop()()
+    finally:
+        providers.ui_queue = shared
+    assert len(results) == 1 and results[0][0] is request and queue.pending == 0 and not polls
+    print("✓ Completion providers: snapshots ranked on the worker, stale requests dropped")
+    return True
+
+def real_tkinter(*modules):
+    """The real tkinter (test_config installs a stand-in), also given to modules imported meanwhile"""
+    if not hasattr(sys.modules.get('tkinter'), 'Tcl'):
+        sys.modules.pop('tkinter', None)
+        sys.modules.pop('tkinter.font', None)
+    try:
+        import tkinter
+    except ImportError:
+        return None
+    for module in modules:
+        module.tk = tkinter
+    return tkinter
+
+def test_completion_popup():
+    """Test the popup's list windowing and selection, and that a click on it survives the FocusOut"""
+    from types import SimpleNamespace
+    if real_tkinter() is None:
+        print("⚠ Tk not available, skipped")
+        return True
+    from syntax.autocomplete import AutoComplete
+    from ui.completion_popup import CompletionList
+    
+    items = [f'item{i}' for i in range(20)]
+    completions = CompletionList(rows=8)
+    completions.set_items(items)
+    assert completions.view() == (items[:8], 0) and completions.selection() == 'item0'
+    completions.move(9)  # past the view: it follows the selection
+    assert completions.top == 2 and completions.view() == (items[2:10], 7)
+    completions.move(-100)
+    assert completions.selection() == 'item0' and completions.top == 0
+    completions.move(100)
+    assert completions.selection() == 'item19' and completions.view() == (items[12:], 7)
+    completions.scroll(-5)  # the selection may scroll out of view
+    assert completions.view() == (items[7:15], None) and completions.selection() == 'item19'
+    completions.scroll(100)
+    assert completions.top == 12
+    assert completions.item_at(3) == 'item15' and completions.selection() == 'item15'
+    assert completions.item_at(8) is None and completions.item_at(-1) is None
+    
+    # More results keep the selected item selected, wherever it moved
+    completions.set_items(['item15'] + items[:15], keep_selection=True)
+    assert completions.selection() == 'item15' and completions.selected == 0
+    completions.set_items(items[:3], keep_selection=True)
+    assert completions.selection() == 'item0' and completions.view() == (items[:3], 0)
+    completions.set_items([])
+    assert completions.selection() is None and completions.view() == ([], None)
+    completions.move(1)
+    
+    # FocusOut only hides the popup once the focus has gone elsewhere and the pointer is away
+    class Text:
+        def __init__(self):
+            self.idle = []
+            self.focus = None
+        
+        def after_idle(self, callback):
+            self.idle.append(callback)
+            return f'after#{len(self.idle)}'
+        
+        def focus_get(self):
+            return self.focus
+    
+    def focus_out(focus, pointer):
+        text = Text()
+        hidden = []
+        owner = SimpleNamespace(text_widget=text, _focus_check=None, hide_completion=lambda: hidden.append(True),
+                                popup=SimpleNamespace(visible=True, contains_pointer=lambda: pointer))
+        owner.check_focus = lambda: AutoComplete.check_focus(owner)
+        AutoComplete.on_focus_out(owner)
+        AutoComplete.on_focus_out(owner)  # one check at a time
+        assert len(text.idle) == 1 and not hidden
+        text.focus = text if focus == 'text' else focus
+        text.idle.pop()()
+        assert owner._focus_check is None
+        return bool(hidden)
+    
+    assert not focus_out(None, pointer=True)  # a click on the popup is on its way
+    assert not focus_out('text', pointer=False)  # the focus came back
+    assert focus_out(None, pointer=False)
+    assert focus_out(object(), pointer=False)
+    print("✓ Completion popup: windowed selection model, clicks survive FocusOut")
+    return True
+
+def test_document_widget_hook():
+    """Test that the wrapped widget command mirrors edits and keeps Tcl errors"""
+    import core.document
+    tkinter = real_tkinter(core.document)
+    if tkinter is None:
+        print("⚠ Tcl not available, skipped")
+        return True
+    
+    # A Tcl proc standing in for a text widget holding one line
+    interp = tkinter.Tcl()
+    interp.eval('''proc .text {operation args} {
+        switch -- $operation {
+            get {return "hello"}
+            cget {return normal}
+            compare {return 0}
+            index {
+                if {[lindex $args 0] eq "sel.first"} {
+                    error {text doesn't contain any characters tagged with "sel"}
+                }
+                return [lindex $args 0]
+            }
+            default {return ""}
+        }
+    }''')
+    reported = []
+    
+    class Widget:
+        _w = '.text'
+        tk = interp
+        _tclCommands = None
+        
+        def _report_exception(self):
+            reported.append(sys.exc_info()[1])
+    
+    document = core.document.TextDocument(Widget())
+    document.add_listener(lambda edit: 1 / 0)
+    interp.call('.text', 'insert', '1.5', ' world')
+    assert document.get_text() == "hello world"
+    assert len(reported) == 1 and isinstance(reported[0], ZeroDivisionError)
+    
+    assert interp.call('.text', 'index', '1.0') == '1.0'
+    try:
+        interp.call('.text', 'index', 'sel.first')
+        assert False, "the widget's error was swallowed"
+    except tkinter.TclError as e:
+        assert 'sel' in str(e)
+    assert interp.call('.text', 'index', '1.0') == '1.0'
+    interp.after(1, interp.quit)
+    interp.mainloop()  # nothing left over to be raised from the main loop
+    print("✓ Document hook: edits mirrored, widget errors raised to the caller")
+    return True
+
+def test_refresh_scheduler():
+    """Test flag coalescing and frame-budget deferral of the refresh scheduler"""
+    import time
+    from core.scheduler import RefreshScheduler
+    
+    class Widget:
+        def __init__(self):
+            self.idle = []
+        
+        def after_idle(self, callback):
+            self.idle.append(callback)
+            return f'after#{len(self.idle)}'
+    
+    def run_idle():
+        """Run the scheduled flushes until none is left; returns how many ran"""
+        count = 0
+        while widget.idle:
+            widget.idle.pop(0)()
+            count += 1
+        return count
+    
+    # Marks before a flush run each handler once, with their ranges merged
+    widget = Widget()
+    scheduler = RefreshScheduler(widget, budget=0.01)
+    calls = []
+    scheduler.register('highlight', lambda payload: calls.append(('highlight', payload)))
+    scheduler.register('status', lambda payload: calls.append(('status', payload)))
+    scheduler.mark('status')
+    scheduler.mark('highlight', (5, 6))
+    scheduler.mark('highlight', (1, 2))
+    scheduler.mark('status')
+    assert len(widget.idle) == 1
+    assert run_idle() == 1 and calls == [('highlight', (1, 6)), ('status', None)]
+    
+    # A handler overrunning the budget leaves the next one to the next idle cycle
+    calls = []
+    scheduler.register('highlight', lambda payload: (time.sleep(0.02), calls.append('highlight')))
+    scheduler.mark('status')
+    scheduler.mark('highlight')
+    widget.idle.pop(0)()
+    assert calls == ['highlight'] and 'status' in scheduler.dirty and len(widget.idle) == 1
+    assert run_idle() == 1 and calls == ['highlight', ('status', None)]
+    
+    # Chunked jobs run again while they return True, one budget per idle cycle
+    steps = []
+    
+    def step():
+        time.sleep(0.011)
+        steps.append(len(steps))
+        return len(steps) < 3
+    
+    scheduler.defer(step)
+    widget.idle.pop(0)()
+    assert steps == [0] and len(widget.idle) == 1
+    assert run_idle() == 2 and steps == [0, 1, 2] and not scheduler.deferred
+    print("✓ Refresh scheduler: marks coalesced, work past the frame budget deferred")
+    return True
+
+def test_gutter_visible_lines():
+    """Test that the gutter lists the logical lines starting on screen, across wraps and folds"""
+    from types import SimpleNamespace
+    if real_tkinter() is None:
+        print("⚠ Tk not available, skipped")
+        return True
+    from ui.gutter import LineNumberGutter
+    
+    class Text:
+        """Display lines as 'line.column' starts; `top` is the first one on screen"""
+        LINE_HEIGHT = 16
+        
+        def __init__(self, starts, top, rows):
+            self.starts = starts
+            self.top = top
+            self.rows = rows
+        
+        def winfo_height(self):
+            return self.rows * self.LINE_HEIGHT
+        
+        def index(self, index):
+            if index == '@0,0 display linestart':
+                return self.starts[self.top]
+            current = self.starts.index(index.split()[0])  # '<index> +1 display lines display linestart'
+            return self.starts[min(current + 1, len(self.starts) - 1)]
+        
+        def dlineinfo(self, index):
+            y = (self.starts.index(index) - self.top) * self.LINE_HEIGHT
+            return (0, y, 200, self.LINE_HEIGHT, 12) if 0 <= y < self.winfo_height() else None
+        
+        def compare(self, a, operator, b):
+            key = lambda index: tuple(map(int, index.split('.')))
+            return key(a) < key(b)
+    
+    def visible(starts, top, rows=10):
+        return list(LineNumberGutter.visible_lines(SimpleNamespace(text_widget=Text(starts, top, rows))))
+    
+    # Every line shown once, the partly visible last one included
+    starts = [f'{line}.0' for line in range(1, 101)]
+    assert visible(starts, 9) == [(line, (line - 10) * 16, 16) for line in range(10, 20)]
+    
+    # Wrapped lines get one number, folded (elided) lines none
+    starts = ['1.0', '2.0', '2.80', '2.160', '3.0'] + [f'{line}.0' for line in range(7, 30)]
+    assert [line for line, y, height in visible(starts, 0)] == [1, 2, 3, 7, 8, 9, 10, 11]
+    assert visible(starts, 0)[2] == (3, 64, 16)
+    
+    # Scrolled into a wrapped line: its number is not drawn again
+    assert [line for line, y, height in visible(starts, 2, rows=4)] == [3, 7]
+    
+    # The end of the document stops the walk
+    assert [line for line, y, height in visible(starts, len(starts) - 2)] == [28, 29]
+    print("✓ Gutter: visible lines follow scrolling, wraps and folds")
+    return True
+
+def test_document_statistics():
+    """Test incremental statistics against a full recount"""
+    from core.document import TextDocument
+    from core.statistics import DocumentStatistics
+    
+    document = TextDocument()
+    stats = DocumentStatistics(document)
+    document.apply_edit(0, 0, "first paragraph here\n\nsecond one\n")
+    document.apply_edit(6, 9, "")
+    document.apply_edit(len(document), 0, "\nthird")
+    
+    text = document.get_text()
+    assert stats.words == len(text.split())
+    assert stats.paragraphs == 3
+    assert stats.lines == text.count('\n') + 1
+    assert stats.selection_counts('1.0', '3.7') == (text.index('one'), 3)
+    print(f"✓ Statistics: {stats.words} words, {stats.paragraphs} paragraphs")
+    return True
+
+def test_large_file_index():
+    """Test the background line index and chunked search used by large-file mode"""
+    from core.large_file import LineIndex, find_bytes
+    
+    data = b"".join(b"line %d\n" % i for i in range(1, 201))
+    index = LineIndex(data, len(data))
+    index.BLOCK_SIZE = 16
+    index.start()
+    index._thread.join()
+    
+    assert index.complete and index.line_count == 201
+    for line in (1, 2, 57, 200):
+        offset = index.line_offset(line)
+        assert data[offset:].startswith(b"line %d\n" % line)
+        assert index.line_of_offset(offset) == line
+    
+    # Search goes chunk by chunk: matches across chunk edges are found, cancelling stops it
+    assert find_bytes(data, b"line 57\n", 0, len(data), chunk=16) == data.index(b"line 57\n")
+    assert find_bytes(data, b"line 12\n", 10, len(data), chunk=5) == data.index(b"line 12\n")
+    assert find_bytes(data, b"missing", 0, len(data), chunk=16) == -1
+    checks = []
+    assert find_bytes(data, b"line 200", 0, len(data), lambda: checks.append(1) or len(checks) > 3, chunk=16) == -1
+    assert len(checks) == 4
+    print(f"✓ Large-file index: {index.line_count} lines in {len(index.block_lines)} blocks")
+    return True
+
+def test_file_loader():
+    """Test streaming a file in chunks through the loader's queue, and cancelling it"""
+    import os
+    import tempfile
+    import time
+    from core.file_loader import FileLoader
+    
+    class Widget:
+        def __init__(self):
+            self.jobs = {}
+            self.count = 0
+        
+        def after(self, delay, callback):
+            self.count += 1
+            self.jobs[f'after#{self.count}'] = callback
+            return f'after#{self.count}'
+        
+        def after_cancel(self, job):
+            del self.jobs[job]
+        
+        def run(self, until, timeout=5):
+            """Call the scheduled callbacks (the UI thread's event loop) until until() holds"""
+            end = time.time() + timeout
+            while self.jobs and not until() and time.time() < end:
+                job = next(iter(self.jobs))
+                time.sleep(0.001)
+                self.jobs.pop(job)()
+    
+    # CRLF pairs and multi-byte characters split across chunk boundaries
+    content = 'première ligne\r\nzweite Zeile — ✓\r\n' * 50 + 'old mac\rend'
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'sample.txt')
+        with open(path, 'wb') as f:
+            f.write(content.encode('utf-8'))
+        
+        chunks, done = [], []
+        widget = Widget()
+        loader = FileLoader(widget, path, chunks.append, lambda: done.append(True), chunk_size=7)
+        loader.start()
+        widget.run(lambda: done)
+        assert done == [True] and loader.finished and loader.progress == 1.0
+        assert ''.join(chunks) == content.replace('\r\n', '\n').replace('\r', '\n')
+        assert len(chunks) > 1 and not widget.jobs
+        
+        # Cancelling stops the worker (blocked on the full queue) and the callbacks
+        chunks, done = [], []
+        widget = Widget()
+        loader = FileLoader(widget, path, chunks.append, lambda: done.append(True), chunk_size=1)
+        loader.start()
+        widget.run(lambda: chunks)
+        loader.cancel()
+        time.sleep(0.3)  # the worker notices within one put timeout
+        read = loader.bytes_read
+        time.sleep(0.2)
+        assert not widget.jobs and loader.bytes_read == read < loader.size
+        assert not done and not loader.finished and len(chunks) < loader.size
+    print(f"✓ File loader: {loader.size} bytes streamed in chunks, cancellation stops the worker")
+    return True
+
+def test_save_service():
+    """Test atomic background saves of document snapshots"""
+    import tempfile
+    import time
+    from core.document import TextDocument
+    from core.save_service import SaveService
+    
+    document = TextDocument()
+    document.apply_edit(0, 0, "saved text\n")
+    service = SaveService()
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "note.txt")
+        snapshot = document.snapshot()
+        document.apply_edit(0, 5, "")  # edits after the snapshot are not saved
+        service.save(path, snapshot, callback=lambda ok, message: results.append(message))
+        service.save(path, snapshot, callback=lambda ok, message: results.append(message))
+        service.wait()
+        
+        with open(path, encoding='utf-8') as f:
+            assert f.read() == "saved text\n"
+        assert results == ['saved', 'unchanged']
+        assert os.listdir(directory) == ["note.txt"]
+        
+        # With a widget the result waits for the UI thread to poll: wait() cannot deadlock
+        class Widget:
+            jobs = []
+            
+            def after(self, ms, callback):
+                self.jobs.append(callback)
+        
+        service.save(path, document.snapshot(), Widget(), lambda ok, message: results.append(message))
+        service.wait()
+        assert results == ['saved', 'unchanged']
+        for _ in range(200):  # the UI queue's polls
+            Widget.jobs.pop()()
+            if len(results) == 3:
+                break
+            time.sleep(0.01)
+        assert results == ['saved', 'unchanged', 'saved']
+        
+        # Closing a tab saves synchronously, after anything still queued
+        service.save(path, snapshot)
+        assert service.save_now(path, document.snapshot()) == (True, 'saved')
+        with open(path, encoding='utf-8') as f:
+            assert f.read() == " text\n"
+        ok, message = service.save_now(os.path.join(directory, "missing", "note.txt"), snapshot)
+        assert not ok and message
+    print("✓ Save service: atomic write, unchanged content skipped")
+    return True
+
+def test_edit_journal():
+    """Test replaying an edit journal after a simulated crash"""
+    import tempfile
+    from core.document import TextDocument
+    from core.journal import EditJournal, find_orphaned_journals, replay_journal
+    
+    class Widget:
+        def after(self, ms, callback):
+            return None
+        
+        def after_cancel(self, job):
+            pass
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "note.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("line one\nline two\n")
+        
+        document = TextDocument()
+        journal = EditJournal(document, Widget(), directory)
+        document.apply_edit(0, 0, "line one\nline two\n")
+        journal.rebase(path)
+        assert not os.path.exists(journal.path)  # clean buffers have no journal
+        
+        document.apply_edit(5, 3, "1")
+        document.apply_edit(len(document), 0, "line three")
+        journal.flush()
+        assert replay_journal(journal.path) == (path, document.get_text())
+        assert find_orphaned_journals(directory) == []  # this process's own journal
+        
+        orphan = os.path.join(directory, f"999999999-dead{os.path.splitext(journal.path)[1]}")
+        with open(orphan, 'w', encoding='utf-8') as f:
+            f.write("")
+        assert find_orphaned_journals(directory) == [orphan]
+        os.remove(orphan)
+        
+        journal.discard()
+        assert os.listdir(directory) == ["note.txt"]
+    print("✓ Edit journal: edits replayed on top of the saved file")
+    return True
+
+class HighlightText:
+    """Text widget stand-in for the highlighter: tags kept per character offset, `rows` lines shown from `top`"""
+    
+    LINE_HEIGHT = 16
+    
+    def __init__(self, document, rows=20):
+        self.document = document
+        self.rows = rows
+        self.top = 1
+        self.tags = {}  # tag -> {offset}
+        self.styles = {}  # tag -> options
+        self.calls = 0  # tag_add and tag_remove calls
+        document.add_listener(self.on_edit)  # before the highlighter's, as Tk is edited first
+    
+    def cget(self, option):
+        return 'Consolas 12'
+    
+    def tag_configure(self, tag, **options):
+        self.styles.setdefault(tag, {}).update(options)
+    
+    def winfo_height(self):
+        return self.rows * self.LINE_HEIGHT
+    
+    def after(self, delay, callback):
+        return 'after#1'  # ui_queue polling: the tests poll by hand
+    
+    def index(self, index):
+        y = int(index.split(',')[1])  # only '@x,y' is used
+        return f"{min(self.document.line_count, self.top + y // self.LINE_HEIGHT)}.0"
+    
+    def _offset(self, index):
+        if index == 'end':
+            return len(self.document)
+        line, column = index.split('.')
+        start = self.document.lines.line_start(int(line))
+        return start + (len(self.document.get_line(int(line))) if column == 'end' else int(column))
+    
+    def _span(self, start, end):
+        """Offsets of the characters from start to end, newlines left out"""
+        text = self.document.get_text()
+        return {offset for offset in range(self._offset(start), self._offset(end)) if text[offset] != '\n'}
+    
+    def tag_add(self, tag, *indices):
+        self.calls += 1
+        for i in range(0, len(indices), 2):
+            self.tags.setdefault(tag, set()).update(self._span(indices[i], indices[i + 1]))
+    
+    def tag_remove(self, tag, start, end):
+        self.calls += 1
+        self.tags.get(tag, set()).difference_update(self._span(start, end))
+    
+    def on_edit(self, edit):
+        """Tags stay on their characters: the removed ones go, later ones shift"""
+        stop, shift = edit.offset + len(edit.removed), len(edit.inserted) - len(edit.removed)
+        for tag, offsets in self.tags.items():
+            self.tags[tag] = {offset + shift if offset >= stop else offset
+                              for offset in offsets if offset < edit.offset or offset >= stop}
+    
+    def tagged(self, lines=None):
+        """{tag: offsets}, limited to the given line numbers"""
+        keep = None
+        if lines is not None:
+            keep = set()
+            for line in lines:
+                start = self.document.lines.line_start(line)
+                keep.update(range(start, start + len(self.document.get_line(line))))
+        return {tag: offsets if keep is None else offsets & keep for tag, offsets in self.tags.items()
+                if offsets and (keep is None or offsets & keep)}
+
+class ThemeStandIn:
+    """Theme manager stand-in with the real syntax colors"""
+    
+    def __init__(self):
+        from config import Config
+        self.colors = Config.SYNTAX_COLORS
+        self.current_theme = Config.DEFAULT_THEME
+        self.observers = []
+    
+    def add_observer(self, callback):
+        self.observers.append(callback)
+    
+    def get_syntax_colors(self):
+        return self.colors[self.current_theme]
+    
+    def set_theme(self, theme_name):
+        self.current_theme = theme_name
+        for callback in self.observers:
+            callback(theme_name)
+
+def lexed_tags(document, language, lines=None):
+    """{tag: character offsets} of a full lex of the document, limited to the given line numbers"""
+    from syntax.languages import get_lexer
+    lexer = get_lexer(language)
+    tags = {}
+    state = None
+    for line in range(1, document.line_count + 1):
+        text = document.get_line(line)
+        tokens, state = lexer.lex_line(text, state)
+        if lines is None or line in lines:
+            start = document.lines.line_start(line)
+            for tag, first, end in tokens:
+                tags.setdefault(tag, set()).update(range(start + first, start + end))
+    return tags
+
+def highlighted_lines(highlighter):
+    """Line numbers the highlighter has tagged"""
+    return {line for first, last in highlighter.highlighted.ranges for line in range(first, last + 1)}
+
+def test_viewport_highlighting():
+    """Test that only the viewport is highlighted, and the rest when scrolled into view"""
+    import syntax.highlighter as highlighter_module
+    from core.document import TextDocument
+    from syntax.highlighter import LineRangeSet, SyntaxHighlighter
+    
+    ranges = LineRangeSet()
+    ranges.add(10, 20)
+    ranges.add(30, 40)
+    ranges.add(21, 25)  # touches 10..20
+    assert ranges.ranges == [[10, 25], [30, 40]]
+    assert list(ranges.missing(1, 50)) == [(1, 9), (26, 29), (41, 50)]
+    ranges.remove(15, 32)
+    assert ranges.ranges == [[10, 14], [33, 40]] and list(ranges.missing(12, 35)) == [(15, 32)]
+    ranges.on_edit(12, 0, 3)  # line 12 edited, three lines inserted after it
+    assert ranges.ranges == [[10, 11], [16, 17], [36, 43]]
+    ranges.on_edit(5, 8, 0)  # lines 5..13 replaced by one
+    assert ranges.ranges == [[8, 9], [28, 35]]
+    
+    document = TextDocument()
+    document.apply_edit(0, 0, ''.join(f'def f{i}(x):\n    return "{i}"  # {i}\n' for i in range(300)))
+    document.apply_edit(document.lines.line_start(200), 0, 'x = """\nnot code: def g():\n"""\n')
+    shared = highlighter_module.theme_manager
+    highlighter_module.theme_manager = ThemeStandIn()
+    try:
+        text = HighlightText(document, rows=20)
+        highlighter = SyntaxHighlighter(text, document)
+        highlighter.set_language('python')
+        assert highlighter.highlighted.ranges == [[1, 21 + highlighter.VIEWPORT_MARGIN]]
+        assert text.tagged(highlighted_lines(highlighter)) == lexed_tags(document, 'python', highlighted_lines(highlighter))
+        
+        # Scrolling into the string highlights it from the state of the lines above
+        text.top = 201
+        highlighter.highlight_visible()
+        assert highlighter.highlighted.ranges == [[1, 221 + highlighter.VIEWPORT_MARGIN]]
+        assert text.tagged(highlighted_lines(highlighter)) == lexed_tags(document, 'python', highlighted_lines(highlighter))
+        assert 'function' not in text.tagged(range(201, 203))
+        
+        # Closing the string early re-lexes the viewport; the lines below are redone when shown
+        document.apply_edit(document.lines.line_start(201), 0, '"""\n')
+        highlighter.highlight_visible()
+        assert text.tagged(highlighted_lines(highlighter)) == lexed_tags(document, 'python', highlighted_lines(highlighter))
+        assert 'function' in text.tagged([202])
+        
+        # The string opened on line 203 now runs to the end
+        text.top = 500
+        highlighter.highlight_visible()
+        assert text.tagged(highlighted_lines(highlighter)) == lexed_tags(document, 'python', highlighted_lines(highlighter))
+        assert set(text.tagged(range(400, 521))) == {'string'}
+    finally:
+        highlighter_module.theme_manager = shared
+    print(f"✓ Viewport highlighting: {len(highlighted_lines(highlighter))} of {document.line_count} lines tagged")
+    return True
+
+def test_background_highlighting():
+    """Test tokenizing on a worker thread, with edits made before its tags are applied"""
+    import time
+    import syntax.highlighter as highlighter_module
+    from core.document import TextDocument
+    from core.ui_queue import UiQueue
+    from syntax.highlighter import SyntaxHighlighter
+    
+    class Scheduler:
+        def __init__(self):
+            self.deferred = []
+        
+        def defer(self, task):
+            self.deferred.append(task)
+        
+        def run(self):
+            while self.deferred:
+                task = self.deferred.pop(0)
+                if task():
+                    self.deferred.append(task)
+    
+    def finish():
+        while queue.pending:
+            time.sleep(0.001)
+            queue.poll()
+        scheduler.run()
+    
+    document = TextDocument()
+    document.apply_edit(0, 0, ''.join(f'def f{i}():\n    """doc\n    {i}"""\n' for i in range(400)))
+    shared = highlighter_module.theme_manager, highlighter_module.ui_queue
+    highlighter_module.theme_manager = ThemeStandIn()
+    highlighter_module.ui_queue = queue = UiQueue()
+    try:
+        text = HighlightText(document, rows=10)
+        scheduler = Scheduler()
+        highlighter = SyntaxHighlighter(text, document, scheduler)
+        highlighter.BACKGROUND_MIN_LINES = 100
+        highlighter.BACKGROUND_BLOCK_LINES = 50
+        highlighter.set_language('python')
+        assert queue.pending == 1 and highlighter._tokenizing
+        finish()
+        assert highlighter.highlighted.ranges == [[1, document.line_count]]
+        assert text.tagged() == lexed_tags(document, 'python')
+        
+        # Tags of a stale result are only applied above the first edit
+        highlighter.highlight_in_background()
+        document.apply_edit(document.lines.line_start(601), 0, '"""\n')
+        finish()
+        assert highlighter.highlighted.ranges[0] == [1, 600]
+        highlighter.highlight_visible()
+        lines = highlighted_lines(highlighter)
+        assert text.tagged(lines) == lexed_tags(document, 'python', lines)
+        
+        # A newer job supersedes the running one
+        highlighter.highlight_in_background()
+        highlighter.set_language('javascript')
+        finish()
+        assert queue.pending == 0 and highlighter.language == 'javascript' and not highlighter._tokenizing
+    finally:
+        highlighter_module.theme_manager, highlighter_module.ui_queue = shared
+    print(f"✓ Background highlighting: {document.line_count} lines tagged from a worker, stale blocks dropped")
+    return True
+
+def test_parallel_highlighting():
+    """Test splitting huge documents into chunks and stitching their lexes at the boundaries"""
+    import syntax.highlighter as highlighter_module
+    from core.document import TextDocument
+    from syntax.highlighter import SyntaxHighlighter
+    from syntax.lexer import lex_blocks
+    from syntax.languages import get_lexer
+    
+    # Unindented lines inside docstrings look like restart points but are not
+    document = TextDocument()
+    document.apply_edit(0, 0, ''.join(f'def f{i}():\n    """\nplain words {i}\n    """\n    return {i}\n' for i in range(60)))
+    lines = document.get_text().split('\n')
+    shared = highlighter_module.theme_manager
+    highlighter_module.theme_manager = ThemeStandIn()
+    try:
+        text = HighlightText(document)
+        highlighter = SyntaxHighlighter(text, document)
+        highlighter.language = 'python'
+        highlighter.PARALLEL_CHUNK_LINES = 42
+        highlighter.RESTART_SEARCH_LINES = 10
+        highlighter.BACKGROUND_BLOCK_LINES = 15
+        
+        chunks = highlighter.split_chunks(lines)
+        assert chunks[0][0] == 1 and chunks[-1][1] == len(lines)
+        assert all(last + 1 == first for (_, last), (first, _) in zip(chunks, chunks[1:]))
+        assert all(lines[first - 1][:1].isalpha() for first, _ in chunks)
+        assert any(lines[first - 1].startswith('plain') for first, _ in chunks)  # starts inside a string
+        
+        states, blocks = highlighter._tokenize_parallel(highlighter._job, 'python', lines)
+        assert states == lex_blocks(get_lexer('python'), lines)[0]
+        for first, last, ranges in blocks:
+            highlighter.add_ranges(ranges)
+        assert text.tagged() == lexed_tags(document, 'python')
+        assert highlighter._tokenize_parallel(highlighter._job - 1, 'python', lines) is None  # superseded
+    finally:
+        highlighter_module.theme_manager = shared
+    print(f"✓ Parallel highlighting: {len(chunks)} chunks stitched into a full lex")
+    return True
+
+def test_theme_restyle():
+    """Test that a theme switch restyles the syntax tags without re-tagging"""
+    import syntax.highlighter as highlighter_module
+    from core.document import TextDocument
+    from syntax.highlighter import SyntaxHighlighter
+    
+    document = TextDocument()
+    document.apply_edit(0, 0, 'def f(x):\n    return "x"  # x\n')
+    shared = highlighter_module.theme_manager
+    highlighter_module.theme_manager = themes = ThemeStandIn()
+    try:
+        text = HighlightText(document)
+        highlighter = SyntaxHighlighter(text, document)
+        highlighter.set_language('python')
+        tags, calls = text.tagged(), text.calls
+        fonts = {tag: options['font'] for tag, options in text.styles.items()}
+        
+        theme = next(name for name in themes.colors if name != themes.current_theme)
+        themes.set_theme(theme)
+        assert text.tagged() == tags and text.calls == calls  # no tag_add or tag_remove
+        assert {tag: options['foreground'] for tag, options in text.styles.items()} == themes.colors[theme]
+        assert {tag: options['font'] for tag, options in text.styles.items()} == fonts  # left alone
+    finally:
+        highlighter_module.theme_manager = shared
+    print(f"✓ Theme restyle: {len(tags)} tags recolored in place")
+    return True
+
+def test_tag_budget():
+    """Test range merging and low-value tag dropping"""
+    from syntax.highlighter import TagBudget, merge_ranges
+    
+    assert merge_ranges(['1.0', '1.1', '1.1', '1.2', '1.4', '1.5']) == ['1.0', '1.2', '1.4', '1.5']
+    
+    budget = TagBudget(size_limit=100)
+    ranges = {'keyword': ['1.0', '1.3'], 'bracket': ['1.3', '1.4', '1.4', '1.5']}
+    assert not budget.update(50)
+    assert budget.apply(ranges) == {'keyword': ['1.0', '1.3'], 'bracket': ['1.3', '1.5']}
+    assert budget.update(500) and budget.active
+    assert budget.apply(ranges) == {'keyword': ['1.0', '1.3']}
+    print("✓ Tag budget merges ranges and drops operators/brackets on large documents")
+    return True
+
+def test_lexer():
+    """Test the single-pass tokenizer"""
+    import random
+    from syntax.languages import get_lexer, language_names
+    
+    code = 'def f(x):\n    return "if # not a comment"  # if\n'
+    lexer = get_lexer('python')
+    tokens = [(tag, code[start:end]) for tag, start, end in lexer.tokens(code)]
+    assert ('function', 'f') in tokens
+    assert ('string', '"if # not a comment"') in tokens
+    assert ('comment', '# if') in tokens
+    assert ('keyword', 'if') not in tokens  # nothing is tagged twice
+    assert get_lexer('python') is lexer  # compiled once, shared by all tabs
+    
+    # Multi-line strings carry a state from one line to the next
+    line_tokens, state = lexer.lex_line('x = """doc', None)
+    assert state is not None and line_tokens[-1][0] == 'string'
+    line_tokens, state = lexer.lex_line('still doc""" + 1', state)
+    assert state is None and line_tokens[0] == ('string', 0, 12)
+    assert lexer.scan_line('s = "\"\"\"" # """', None) is None
+    
+    # The state-only scan ends every line in the state the full lexer does
+    rng = random.Random(11)
+    pieces = ['/*', '*/', '"""', "'''", '`', '"', "'", '#', '//', '<!--', '-->', '#[', ']', ': ', ';',
+              '{', '}', 'color', 'red', '=begin', '=end', '--', '\\', ' ', 'x']
+    lines = ['color: red /* start', '#[derive(Debug) /* x'] + [
+        ''.join(rng.choice(pieces) for _ in range(rng.randint(1, 8))) for _ in range(300)]
+    for name in language_names():
+        lexer = get_lexer(name)
+        for state in [None, *lexer.continuations]:
+            for line in lines:
+                assert lexer.scan_line(line, state) == lexer.lex_line(line, state)[1], (name, state, line)
+    print(f"✓ Lexer: {len(tokens)} non-overlapping tokens")
+    return True
+
+def test_language_registry():
+    """Test the shared, lazily built language definitions"""
+    from config import Config
+    from syntax.languages import get_language, get_lexer
+    
+    for language in set(Config.LANGUAGE_EXTENSIONS.values()) - {'text'}:
+        lexer = get_lexer(language)
+        assert lexer is not None, language
+        lexer.lex_line('x = "y"  # 1', None)
+    assert get_language('rust') is get_language('rust')  # shared by all tabs
+    assert 'SELECT'.lower() in get_language('sql').keywords
+    sql = get_lexer('sql')
+    assert ('keyword', 0, 6) in sql.lex_line('select 1', None)[0]
+    print(f"✓ Language registry: {len(set(Config.LANGUAGE_EXTENSIONS.values())) - 1} languages defined")
+    return True
+
 def main():
     """Main test function"""
     print("🧪 NoteSharp Pro - Core Functionality Test")
@@ -150,6 +1436,32 @@ def main():
         ("Configuration", test_config),
         ("Language Support", test_language_support),
         ("Syntax Highlighting", test_syntax_patterns),
+        ("Tag Budget", test_tag_budget),
+        ("Viewport Highlighting", test_viewport_highlighting),
+        ("Background Highlighting", test_background_highlighting),
+        ("Parallel Highlighting", test_parallel_highlighting),
+        ("Theme Restyle", test_theme_restyle),
+        ("Lexer", test_lexer),
+        ("Language Registry", test_language_registry),
+        ("Document Model", test_document_model),
+        ("Line Index", test_line_index),
+        ("Fold Index", test_fold_index),
+        ("Bracket Index", test_bracket_index),
+        ("Symbol Index", test_symbol_index),
+        ("Word Index", test_word_index),
+        ("Workspace Index", test_workspace_index),
+        ("Completion Ranking", test_completion_ranking),
+        ("Completion Ranking Speed", test_completion_ranking_speed),
+        ("Completion Providers", test_completion_providers),
+        ("Completion Popup", test_completion_popup),
+        ("Document Hook", test_document_widget_hook),
+        ("Refresh Scheduler", test_refresh_scheduler),
+        ("Gutter Visible Lines", test_gutter_visible_lines),
+        ("Document Statistics", test_document_statistics),
+        ("Large-File Index", test_large_file_index),
+        ("File Loader", test_file_loader),
+        ("Save Service", test_save_service),
+        ("Edit Journal", test_edit_journal),
     ]
     
     passed = 0
@@ -0,0 +1,196 @@
+# Completion popup: one reusable, virtualized list per editor
+import tkinter as tk
+from ui.themes import theme_manager
+
+class CompletionList:
+    """The items of a completion list, its selection and the window of `rows` items in view"""
+    
+    def __init__(self, rows):
+        self.rows = rows
+        self.items = []
+        self.top = 0  # index of the first item in view
+        self.selected = 0
+    
+    def set_items(self, items, keep_selection=False):
+        """Replace the items, selecting the first one or with keep_selection the one selected if still listed"""
+        current = self.selection() if keep_selection else None
+        self.items = items
+        self.top = 0
+        self.selected = 0
+        if current in items:
+            self.move(items.index(current))
+    
+    def move(self, delta):
+        """Move the selection by delta items, scrolling to keep it in view"""
+        if not self.items:
+            return
+        self.selected = max(0, min(len(self.items) - 1, self.selected + delta))
+        if self.selected < self.top:
+            self.top = self.selected
+        elif self.selected >= self.top + self.rows:
+            self.top = self.selected - self.rows + 1
+    
+    def scroll(self, delta):
+        """Scroll the view by delta items without moving the selection"""
+        self.top = max(0, min(len(self.items) - self.rows, self.top + delta))
+    
+    def selection(self):
+        """The selected item, or None when empty"""
+        return self.items[self.selected] if self.items else None
+    
+    def view(self):
+        """(items in view, row of the selection in view or None)"""
+        rows = self.items[self.top:self.top + self.rows]
+        row = self.selected - self.top
+        return rows, row if 0 <= row < len(rows) else None
+    
+    def item_at(self, row):
+        """Select and return the item shown in a row of the view, or None below the last one"""
+        index = self.top + row
+        if 0 <= row and index < len(self.items):
+            self.selected = index
+            return self.items[index]
+        return None
+
+class CompletionPopup:
+    """Completion list shown under the cursor, created once and reused.
+    
+    The window is withdrawn rather than destroyed when hidden, and shown
+    again by moving it. The listbox only holds the ROWS items in view of
+    its CompletionList: moving the selection or scrolling rewrites those
+    rows, so a long result list costs no more than a short one. The popup
+    never takes the focus; the owner forwards navigation keys with move().
+    """
+    
+    ROWS = 8
+    
+    def __init__(self, text_widget, on_accept):
+        self.text_widget = text_widget
+        self.on_accept = on_accept
+        self.list = CompletionList(self.ROWS)
+        self.visible = False
+        self.window = None  # created on first show
+        self._rows = None  # items currently in the listbox
+        self._size = None
+        self._position = None
+        self._theme = None
+    
+    def create_window(self):
+        """Create the (hidden) window and its listbox"""
+        self.window = tk.Toplevel(self.text_widget)
+        self.window.withdraw()
+        self.window.wm_overrideredirect(True)
+        self.window.configure(relief='solid', bd=1)
+        
+        self.listbox = tk.Listbox(
+            self.window,
+            height=self.ROWS,
+            font=('Consolas', 10),
+            activestyle='none',
+            exportselection=False,
+            takefocus=0,
+            highlightthickness=0,
+            bd=0
+        )
+        self.listbox.pack(fill='both', expand=True)
+        
+        # Class bindings would move the focus and the selection: handle clicks here
+        self.listbox.bind('<Button-1>', self.on_click)
+        self.listbox.bind('<B1-Motion>', lambda e: 'break')
+        self.listbox.bind('<MouseWheel>', lambda e: self.scroll(-1 if e.delta > 0 else 1))
+        self.listbox.bind('<Button-4>', lambda e: self.scroll(-1))
+        self.listbox.bind('<Button-5>', lambda e: self.scroll(1))
+    
+    def show(self, items, x, y, keep_selection=False):
+        """Show items with the top-left corner at screen x, y.
+        
+        The first item is selected, or with keep_selection the item already
+        selected if it is still listed (more results arrived).
+        """
+        if self.window is None:
+            self.create_window()
+        self.list.set_items(items, keep_selection and self.visible)
+        self.apply_theme()
+        
+        size = (max(15, max(map(len, items))), min(len(items), self.ROWS))
+        if size != self._size:
+            self.listbox.configure(width=size[0], height=size[1])
+            self._size = size
+        self.render()
+        
+        if (x, y) != self._position:
+            self.window.geometry(f"+{x}+{y}")
+            self._position = (x, y)
+        if not self.visible:
+            self.window.deiconify()
+            self.window.lift()
+            self.visible = True
+    
+    def hide(self):
+        """Withdraw the window, keeping it for the next show"""
+        if self.visible:
+            self.window.withdraw()
+            self.visible = False
+        self.list.set_items([])
+    
+    def move(self, delta):
+        """Move the selection by delta items, scrolling to keep it in view"""
+        self.list.move(delta)
+        self.render()
+    
+    def scroll(self, delta):
+        """Scroll the view by delta items without moving the selection"""
+        self.list.scroll(delta)
+        self.render()
+        return 'break'
+    
+    def selection(self):
+        """The selected item, or None when hidden"""
+        return self.list.selection() if self.visible else None
+    
+    def contains_pointer(self):
+        """Whether the mouse pointer is over the shown popup"""
+        if not self.visible:
+            return False
+        x, y = self.window.winfo_pointerxy()
+        left, top = self.window.winfo_rootx(), self.window.winfo_rooty()
+        return left <= x < left + self.window.winfo_width() and top <= y < top + self.window.winfo_height()
+    
+    def render(self):
+        """Fill the listbox with the items in view"""
+        rows, selected = self.list.view()
+        if rows != self._rows:
+            self.listbox.delete(0, 'end')
+            self.listbox.insert('end', *rows)
+            self._rows = rows
+        self.listbox.selection_clear(0, 'end')
+        if selected is not None:
+            self.listbox.selection_set(selected)
+    
+    def on_click(self, event):
+        """Accept the clicked item"""
+        item = self.list.item_at(self.listbox.nearest(event.y))
+        if item is not None:
+            self.on_accept(item)
+        return 'break'
+    
+    def apply_theme(self):
+        """Follow the current theme (checked on show, so hidden popups cost nothing)"""
+        theme = theme_manager.get_current_theme()
+        if theme == self._theme:
+            return
+        colors = theme_manager.get_colors()
+        self.listbox.configure(
+            bg=colors['bg'],
+            fg=colors['fg'],
+            selectbackground=colors['select_bg'],
+            selectforeground=colors['select_fg']
+        )
+        self._theme = theme
+    
+    def destroy(self):
+        """Destroy the window (the editor is closing)"""
+        if self.window is not None:
+            self.window.destroy()
+            self.window = None
+            self.visible = False
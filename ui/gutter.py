@@ -0,0 +1,139 @@
+# Line-number gutter for NoteSharp
+import tkinter as tk
+from tkinter import font as tkfont
+from ui.themes import theme_manager
+
+class LineNumberGutter:
+    """Canvas gutter that only draws the lines currently on screen.
+    
+    Layout, left to right: diff marker strip, line numbers, fold markers.
+    Marker dictionaries are keyed by 1-based line number and read during
+    the same render pass as the numbers.
+    """
+    
+    DIFF_WIDTH = 4
+    FOLD_WIDTH = 14
+    PADDING = 6
+    DIFF_COLORS = {
+        'added': '#2EA043',
+        'modified': '#1F6FEB',
+        'deleted': '#DA3633'
+    }
+    
+    def __init__(self, parent, text_widget, document, font_family, font_size, on_fold_click=None):
+        self.text_widget = text_widget
+        self.document = document
+        self.on_fold_click = on_fold_click
+        self.font = tkfont.Font(family=font_family, size=font_size)
+        self.diff_markers = {}
+        self.fold_markers = {}  # line -> True when folded, False when expanded
+        self.line_offset = 0  # added to drawn numbers; None hides them
+        self._digits = 0
+        
+        self.canvas = tk.Canvas(parent, width=self._required_width(), highlightthickness=0, bd=0, takefocus=0)
+        self.canvas.bind('<Configure>', lambda e: self.redraw())
+        self.canvas.bind('<Button-1>', self.on_click)
+        self.canvas.bind('<MouseWheel>', self.on_mouse_wheel)
+        self.canvas.bind('<Button-4>', lambda e: self.text_widget.yview_scroll(-3, 'units'))
+        self.canvas.bind('<Button-5>', lambda e: self.text_widget.yview_scroll(3, 'units'))
+        self.apply_theme()
+    
+    def pack(self, **kwargs):
+        self.canvas.pack(**kwargs)
+    
+    def pack_forget(self):
+        self.canvas.pack_forget()
+    
+    def set_font(self, family, size):
+        """Change the font used for line numbers"""
+        self.font.configure(family=family, size=size)
+        self._digits = 0
+        self.redraw()
+    
+    def set_diff_markers(self, markers):
+        """Set diff markers as {line: 'added' | 'modified' | 'deleted'}"""
+        self.diff_markers = dict(markers)
+        self.redraw()
+    
+    def set_fold_markers(self, markers):
+        """Set fold markers as {line: folded}"""
+        self.fold_markers = dict(markers)
+        self.redraw()
+    
+    def apply_theme(self):
+        """Apply the current theme colors"""
+        colors = theme_manager.get_colors()
+        self.number_color = colors['line_fg']
+        self.canvas.config(bg=colors['line_bg'])
+        self.redraw()
+    
+    def _last_number(self):
+        return self.document.line_count + (self.line_offset or 0)
+    
+    def _required_width(self):
+        digits = max(3, len(str(self._last_number())))
+        self._digits = digits
+        return self.DIFF_WIDTH + self.PADDING + self.font.measure('9' * digits) + self.PADDING + self.FOLD_WIDTH
+    
+    def visible_lines(self):
+        """Yield (line, y, height) for every logical line starting on screen"""
+        height = self.text_widget.winfo_height()
+        index = self.text_widget.index('@0,0 display linestart')
+        while True:
+            info = self.text_widget.dlineinfo(index)
+            if info is None or info[1] > height:
+                break
+            line, column = index.split('.')
+            if column == '0':
+                yield int(line), info[1], info[3]
+            next_index = self.text_widget.index(f"{index} +1 display lines display linestart")
+            if next_index == index or self.text_widget.compare(next_index, '<', index):
+                break
+            index = next_index
+    
+    def redraw(self):
+        """Render numbers and markers for the visible lines only"""
+        if len(str(self._last_number())) > self._digits or self._digits == 0:
+            self.canvas.config(width=self._required_width())
+        self.canvas.delete('all')
+        
+        width = int(self.canvas.cget('width'))
+        number_right = width - self.FOLD_WIDTH - self.PADDING
+        fold_center = width - self.FOLD_WIDTH // 2
+        for line, y, line_height in self.visible_lines():
+            diff = self.diff_markers.get(line)
+            if diff:
+                self.canvas.create_rectangle(
+                    0, y, self.DIFF_WIDTH, y + line_height,
+                    fill=self.DIFF_COLORS.get(diff, self.number_color), width=0
+                )
+            if self.line_offset is not None:
+                self.canvas.create_text(
+                    number_right, y, anchor='ne', text=str(line + self.line_offset),
+                    font=self.font, fill=self.number_color
+                )
+            if line in self.fold_markers:
+                self.canvas.create_text(
+                    fold_center, y, anchor='n', text='▸' if self.fold_markers[line] else '▾',
+                    font=self.font, fill=self.number_color
+                )
+    
+    def line_at(self, y):
+        """Return the logical line drawn at canvas height y"""
+        return int(self.text_widget.index(f"@0,{y}").split('.')[0])
+    
+    def on_click(self, event):
+        """Select a line, or toggle its fold when clicking the fold column"""
+        line = self.line_at(event.y)
+        if event.x >= int(self.canvas.cget('width')) - self.FOLD_WIDTH:
+            if line in self.fold_markers and self.on_fold_click:
+                self.on_fold_click(line)
+            return
+        self.text_widget.mark_set(tk.INSERT, f"{line}.0")
+        self.text_widget.tag_remove(tk.SEL, '1.0', tk.END)
+        self.text_widget.tag_add(tk.SEL, f"{line}.0", f"{line}.0+1line")
+        self.text_widget.focus_set()
+    
+    def on_mouse_wheel(self, event):
+        """Scroll the text when the wheel is used over the gutter"""
+        self.text_widget.yview_scroll(int(-event.delta / 120) or (-1 if event.delta > 0 else 1), 'units')
@@ -0,0 +1,96 @@
+# Outline panel: the definitions of the current document
+import tkinter as tk
+from tkinter import ttk
+from ui.themes import theme_manager
+from config import Config
+
+class OutlinePanel:
+    """Side panel listing the symbols of the current editor as a tree"""
+    
+    ICONS = {
+        'class': '◆',
+        'function': 'ƒ',
+        'method': '•',
+        'selector': '#',
+        'key': '∙'
+    }
+    
+    def __init__(self, parent, on_symbol_select=None):
+        self.parent = parent
+        self.on_symbol_select = on_symbol_select
+        self.entries = []  # (line, kind, name, column, depth) shown, by item id
+        self._shown = None  # what the tree currently draws, to skip identical redraws
+        self.visible = False
+        
+        self.create_panel()
+        theme_manager.add_observer(self.on_theme_change)
+    
+    def create_panel(self):
+        """Create the panel (packed by toggle_visibility)"""
+        colors = theme_manager.get_colors()
+        
+        self.panel_frame = tk.Frame(self.parent, bg=colors['sidebar_bg'], width=Config.SIDEBAR_WIDTH)
+        self.panel_frame.pack_propagate(False)
+        
+        self.title_label = tk.Label(
+            self.panel_frame,
+            text="☰ Outline",
+            bg=colors['sidebar_bg'],
+            fg=colors['sidebar_fg'],
+            font=('Segoe UI', 10, 'bold')
+        )
+        self.title_label.pack(fill='x', padx=5, pady=5, anchor='w')
+        
+        self.tree_frame = tk.Frame(self.panel_frame, bg=colors['sidebar_bg'])
+        self.tree_frame.pack(fill='both', expand=True, padx=5, pady=5)
+        
+        self.tree = ttk.Treeview(self.tree_frame, show='tree', selectmode='browse')
+        scrollbar = ttk.Scrollbar(self.tree_frame, orient='vertical', command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side='right', fill='y')
+        self.tree.pack(fill='both', expand=True)
+        
+        self.tree.bind('<ButtonRelease-1>', self.on_select)
+        self.tree.bind('<Return>', self.on_select)
+    
+    def show_outline(self, outline):
+        """Show (line, kind, name, column, depth) entries; an unchanged tree is not redrawn"""
+        self.entries = outline
+        shown = [(kind, name, depth) for line, kind, name, column, depth in outline]
+        if shown == self._shown:
+            return  # only line numbers moved: items are looked up by position
+        self._shown = shown
+        
+        self.tree.delete(*self.tree.get_children())
+        parents = ['']  # item id of the last entry at each depth
+        for i, (kind, name, depth) in enumerate(shown):
+            depth = min(depth, len(parents) - 1)
+            item = self.tree.insert(parents[depth], 'end', iid=str(i),
+                                    text=f"{self.ICONS.get(kind, '·')} {name}", open=True)
+            del parents[depth + 1:]
+            parents.append(item)
+    
+    def on_select(self, event=None):
+        """Jump to the selected symbol"""
+        item = self.tree.focus()
+        if item and self.on_symbol_select:
+            line, kind, name, column, depth = self.entries[int(item)]
+            self.on_symbol_select(line, column)
+    
+    def toggle_visibility(self, before=None):
+        """Show or hide the panel (packed on the right, before the given widget)"""
+        if self.visible:
+            self.panel_frame.pack_forget()
+            self.visible = False
+        else:
+            options = {'before': before} if before is not None else {}
+            self.panel_frame.pack(side='right', fill='y', **options)
+            self.visible = True
+        return self.visible
+    
+    def on_theme_change(self, theme_name):
+        """Handle theme change"""
+        colors = theme_manager.get_colors()
+        self.panel_frame.configure(bg=colors['sidebar_bg'])
+        self.tree_frame.configure(bg=colors['sidebar_bg'])
+        self.title_label.configure(bg=colors['sidebar_bg'], fg=colors['sidebar_fg'])
@@ -9,9 +9,10 @@ from config import Config
 class FileExplorer:
     """File explorer sidebar with tree view"""
     
-    def __init__(self, parent, on_file_select=None):
+    def __init__(self, parent, on_file_select=None, on_directory_change=None):
         self.parent = parent
         self.on_file_select = on_file_select
+        self.on_directory_change = on_directory_change
         self.sidebar_frame = None
         self.tree = None
         self.current_path = Path.home()
@@ -166,6 +167,9 @@ class FileExplorer:
         
         except Exception as e:
             print(f"Error populating tree: {e}")
+        
+        if self.on_directory_change:
+            self.on_directory_change(self.current_path)
     
     def get_file_icon(self, extension):
         """Get icon for file based on extension"""